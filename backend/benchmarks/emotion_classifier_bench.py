@@ -0,0 +1,144 @@
+"""Accuracy vs latency benchmark for the emotion classifier modes on a fixed corpus.
+
+Usage (from backend/):
+  python benchmarks/emotion_classifier_bench.py                 # local, llm, hybrid
+  python benchmarks/emotion_classifier_bench.py --modes local   # no Ollama needed
+  python benchmarks/emotion_classifier_bench.py --json out.json
+
+The llm and hybrid modes call the Ollama host/model from vtuber.config.json (or LLM_HOST).
+A prediction counts as correct when it is one of the corpus entry's acceptable labels.
+The corpus is held out: it was written and labelled without reference to EMOTION_LEXICON,
+so do not tune the lexicon against it. For local mode, "confident" shows correct/total
+among replies scored at or above --threshold (the ones hybrid mode would not send to the LLM).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from emotion_classifier import (  # noqa: E402
+    EmotionClassifier,
+    HybridEmotionClassifier,
+    LLMEmotionClassifier,
+    LexiconEmotionClassifier,
+)
+from http_clients import http_clients  # noqa: E402
+from server import ROOT_CONFIG_PATH, load_llm_config  # noqa: E402
+
+CORPUS_PATH = Path(__file__).resolve().parent / "emotion_corpus.json"
+
+
+class _CountingClassifier(EmotionClassifier):
+    """Wraps the LLM classifier to count how often hybrid mode falls back to it."""
+
+    def __init__(self, inner: EmotionClassifier) -> None:
+        self.inner = inner
+        self.calls = 0
+
+    async def classify(self, last_user: str, assistant: str, allowed: List[str]) -> str:
+        self.calls += 1
+        return await self.inner.classify(last_user, assistant, allowed)
+
+
+def _allowed_by_model() -> Dict[str, List[str]]:
+    with open(ROOT_CONFIG_PATH, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+    return {key: list((entry.get("emotions") or {}).keys()) for key, entry in (cfg.get("models") or {}).items()}
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+async def run_mode(mode: str, corpus: List[Dict[str, Any]], allowed: Dict[str, List[str]], threshold: float) -> Dict[str, Any]:
+    cfg = load_llm_config()
+    counter = _CountingClassifier(LLMEmotionClassifier(cfg["host"], cfg["model"]))
+    if mode == "local":
+        classifier: EmotionClassifier = LexiconEmotionClassifier()
+    elif mode == "llm":
+        classifier = counter
+    elif mode == "hybrid":
+        classifier = HybridEmotionClassifier(LexiconEmotionClassifier(), counter, threshold=threshold)
+    else:
+        raise ValueError(f"Unknown mode: {mode}")
+
+    latencies: List[float] = []
+    correct = 0
+    confident = confident_correct = 0
+    misses: List[Dict[str, str]] = []
+    for item in corpus:
+        t0 = time.perf_counter()
+        emotion = await classifier.classify(item["user"], item["assistant"], allowed[item["model"]])
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+        if isinstance(classifier, LexiconEmotionClassifier):
+            # Scored again outside the timing: classify() does not expose the confidence
+            if classifier.score(item["user"], item["assistant"], allowed[item["model"]])[1] >= threshold:
+                confident += 1
+                confident_correct += emotion in item["expected"]
+        if emotion in item["expected"]:
+            correct += 1
+        else:
+            misses.append({"assistant": item["assistant"], "got": emotion, "expected": "/".join(item["expected"])})
+    return {
+        "mode": mode,
+        "n": len(corpus),
+        "accuracy": correct / len(corpus) if corpus else 0.0,
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "mean_ms": statistics.fmean(latencies) if latencies else 0.0,
+        "llm_calls": counter.calls,
+        "confident": confident if mode == "local" else None,
+        "confident_correct": confident_correct if mode == "local" else None,
+        "misses": misses,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="local,llm,hybrid")
+    parser.add_argument("--threshold", type=float, default=0.5, help="hybrid confidence threshold")
+    parser.add_argument("--json", dest="json_out", default="", help="write results to this file")
+    parser.add_argument("--verbose", action="store_true", help="print misclassified examples")
+    args = parser.parse_args()
+
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    allowed = _allowed_by_model()
+
+    results = []
+    try:
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            try:
+                results.append(await run_mode(mode, corpus, allowed, args.threshold))
+            except Exception as e:
+                print(f"{mode:<8} skipped: {e}")
+    finally:
+        await http_clients.aclose()
+
+    print(f"{'mode':<8} {'accuracy':>9} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9} {'llm calls':>10} {'confident':>10}")
+    for r in results:
+        conf = "-" if r["confident"] is None else f"{r['confident_correct']}/{r['confident']}"
+        print(f"{r['mode']:<8} {r['accuracy']:>9.1%} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['mean_ms']:>9.3f} {r['llm_calls']:>10} {conf:>10}")
+        if args.verbose:
+            for miss in r["misses"]:
+                print(f"    got {miss['got']:<12} want {miss['expected']:<24} {miss['assistant']}")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
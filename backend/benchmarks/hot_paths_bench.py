@@ -0,0 +1,482 @@
+"""Micro-benchmarks for the backend hot paths.
+
+Usage (from backend/):
+  python benchmarks/hot_paths_bench.py                           # all cases, print table
+  python benchmarks/hot_paths_bench.py --only parser,emoji       # substring filter on case names
+  python benchmarks/hot_paths_bench.py --json results/HEAD.json  # save results
+  python benchmarks/hot_paths_bench.py --compare results/base.json --tolerance 0.15
+
+Inputs are generated from a fixed seed so runs are comparable across commits:
+- LLM tokens follow a typical BPE size mix (mostly 2-6 chars, word-leading spaces, some
+  punctuation/newlines) with occasional [Tag] brackets and emojis
+- Histories are 200 messages of 40-400 chars
+- Audio clips are 24-256 KiB (a sentence to a full turn of mp3)
+
+Each case reports ops/s (one op = one token, line, prompt or clip) as the best of --repeat
+timed runs, plus a separate tracemalloc pass: peak bytes during the run and bytes still
+allocated afterwards, both per op. --compare exits with status 1 when any case is slower than
+the baseline by more than --tolerance.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from chat_streamer import ChatStreamer  # noqa: E402
+from conversation_store import ConversationStore  # noqa: E402
+from emotion_parser import EmotionTagParser  # noqa: E402
+from llm_transport import LLMTransport  # noqa: E402
+from ollama_stream import OllamaStreamDecoder  # noqa: E402
+from prompt_factory import PromptFactory  # noqa: E402
+from stream_text_parser import StreamTextParser  # noqa: E402
+from token_filter import FusedTokenFilter  # noqa: E402
+from ws_protocol import send_audio  # noqa: E402
+
+SEED = 1234
+EMOTIONS = ["Happy", "Sad", "Angry", "Surprised", "Gaming", "Thinking"]
+PERSONA = "You are Mao, a cheerful VTuber who loves games, cats and late-night streams."
+WORDS = (
+    "the a to and of you I it is that in for on this was with my me so just but have what "
+    "game stream today really think know like going play chat love fun night cat maybe "
+    "yeah okay sure let's well right actually probably something anything everyone"
+).split()
+
+# (weight, generator) for one streamed token
+TOKEN_MIX: List[Tuple[int, Callable[[random.Random], str]]] = [
+    (70, lambda r: " " + r.choice(WORDS)),
+    (10, lambda r: r.choice(WORDS)[: r.randint(1, 4)]),
+    (10, lambda r: r.choice([".", ",", "!", "?", "'s", "'m"])),
+    (4, lambda r: "\n"),
+    (3, lambda r: " [" + r.choice(EMOTIONS + ["laughs", "sighs"]) + "]"),
+    (2, lambda r: " " + r.choice(["\U0001F600", "❤", "⭐", "\U0001F3AE"])),
+    (1, lambda r: r.choice(["[", "Happy", "]"])),
+]
+
+Setup = Callable[[], Tuple[Callable[[], None], int]]
+
+
+def make_tokens(rng: random.Random, n: int) -> List[str]:
+    weights = [w for w, _ in TOKEN_MIX]
+    gens = [g for _, g in TOKEN_MIX]
+    return [rng.choices(gens, weights)[0](rng) for _ in range(n)]
+
+
+def make_sentence(rng: random.Random, lo: int, hi: int) -> str:
+    target = rng.randint(lo, hi)
+    parts: List[str] = []
+    size = 0
+    while size < target:
+        word = rng.choice(WORDS)
+        parts.append(word)
+        size += len(word) + 1
+    return " ".join(parts).capitalize() + "."
+
+
+def make_history(rng: random.Random, messages: int) -> List[Dict[str, str]]:
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": make_sentence(rng, 40, 400)}
+        for i in range(messages)
+    ]
+
+
+def make_ndjson(tokens: List[str]) -> bytes:
+    # Compact separators, as Ollama (Go encoding/json) writes them
+    lines = [
+        json.dumps(
+            {"model": "llama3", "created_at": "2024-01-01T00:00:00.000000Z", "response": tok, "done": False},
+            separators=(",", ":"),
+        )
+        for tok in tokens
+    ]
+    lines.append(
+        json.dumps(
+            {
+                "model": "llama3",
+                "created_at": "2024-01-01T00:00:01.000000Z",
+                "response": "",
+                "done": True,
+                "context": list(range(2048)),
+                "total_duration": 1234567890,
+                "eval_count": len(tokens),
+            },
+            separators=(",", ":"),
+        )
+    )
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _NullWebSocket:
+    """Accepts frames like a WebSocket and drops them, so only framing cost is measured."""
+
+    def __init__(self) -> None:
+        self.frames = 0
+
+    async def send_text(self, data: str) -> None:
+        self.frames += 1
+
+    async def send_bytes(self, data: bytes) -> None:
+        self.frames += 1
+
+
+# ---- cases ----------------------------------------------------------------------------------
+# Each setup builds its inputs outside the timed region and returns (run, ops_per_run).
+
+
+def case_stream_text_parser() -> Tuple[Callable[[], None], int]:
+    tokens = make_tokens(random.Random(SEED), 4000)
+
+    def run() -> None:
+        parser = StreamTextParser(allowed_tags=None, strip_non_english=True)
+        for tok in tokens:
+            parser.process_chunk(tok)
+        parser.finish()
+
+    return run, len(tokens)
+
+
+def case_emotion_tag_parser() -> Tuple[Callable[[], None], int]:
+    tokens = make_tokens(random.Random(SEED), 4000)
+
+    def run() -> None:
+        parser = EmotionTagParser(EMOTIONS, "Happy")
+        for tok in tokens:
+            parser.process_chunk(tok)
+        parser.finish()
+
+    return run, len(tokens)
+
+
+def case_remove_emojis() -> Tuple[Callable[[], None], int]:
+    tokens = make_tokens(random.Random(SEED), 4000)
+    streamer = ChatStreamer("", "", "ollama", EMOTIONS, PromptFactory(PERSONA, EMOTIONS))
+
+    def run() -> None:
+        for tok in tokens:
+            streamer._remove_emojis(tok)
+
+    return run, len(tokens)
+
+
+def case_chat_token_path_reference() -> Tuple[Callable[[], None], int]:
+    """_remove_emojis + StreamTextParser, the per-token path ChatStreamer used before FusedTokenFilter."""
+    tokens = make_tokens(random.Random(SEED), 4000)
+    streamer = ChatStreamer("", "", "ollama", EMOTIONS, PromptFactory(PERSONA, EMOTIONS))
+
+    def run() -> None:
+        parser = StreamTextParser(allowed_tags=None, strip_non_english=True)
+        for tok in tokens:
+            tok = streamer._remove_emojis(tok)
+            if tok:
+                parser.process_chunk(tok)
+        parser.finish()
+
+    return run, len(tokens)
+
+
+def case_chat_token_path_fused() -> Tuple[Callable[[], None], int]:
+    tokens = make_tokens(random.Random(SEED), 4000)
+
+    def run() -> None:
+        parser = FusedTokenFilter()
+        for tok in tokens:
+            parser.process_chunk(tok)
+        parser.finish()
+
+    return run, len(tokens)
+
+
+def case_build_final_prompt_list() -> Tuple[Callable[[], None], int]:
+    factory = PromptFactory(PERSONA, EMOTIONS)
+    history = make_history(random.Random(SEED), 200)
+    user_text = "What game should we play tonight?"
+
+    def run() -> None:
+        for _ in range(50):
+            factory.build_final_prompt(user_text, history=history, max_turns=8, max_chars=4000)
+
+    return run, 50
+
+
+def case_build_final_prompt_store() -> Tuple[Callable[[], None], int]:
+    """One new turn per prompt, so the store's window cache is invalidated every time (as in a session)."""
+    rng = random.Random(SEED)
+    factory = PromptFactory(PERSONA, EMOTIONS)
+    history = make_history(rng, 200)
+    extra = make_history(rng, 100)
+    user_text = "What game should we play tonight?"
+
+    def run() -> None:
+        store = ConversationStore(capacity=100, max_content_chars=4000)
+        for item in history:
+            store.append(item)
+        for i in range(0, len(extra), 2):
+            store.add_user(extra[i]["content"])
+            store.add_assistant(extra[i + 1]["content"])
+            factory.build_final_prompt(user_text, history=store, max_turns=8, max_chars=4000)
+
+    return run, len(extra) // 2
+
+
+def case_ndjson_decode() -> Tuple[Callable[[], None], int]:
+    """The former per-line json.loads loop of LLMTransport._stream_ollama, without HTTP."""
+    lines = make_ndjson(make_tokens(random.Random(SEED), 4000)).decode("utf-8").splitlines()
+
+    def run() -> None:
+        for line in lines:
+            if not line:
+                continue
+            data = json.loads(line)
+            data.get("response")
+            if data.get("done") is True:
+                break
+
+    return run, len(lines)
+
+
+def case_ndjson_decode_stream() -> Tuple[Callable[[], None], int]:
+    """OllamaStreamDecoder over 16 KiB body chunks (line splitting included), without HTTP."""
+    body = make_ndjson(make_tokens(random.Random(SEED), 4000))
+    size = 16 * 1024
+    chunks = [body[i : i + size] for i in range(0, len(body), size)]
+
+    def run() -> None:
+        decoder = OllamaStreamDecoder()
+        for chunk in chunks:
+            decoder.feed(chunk)
+        decoder.flush()
+
+    return run, body.count(b"\n")
+
+
+def _mock_llm_client(tokens: List[str]) -> Callable[[], httpx.AsyncClient]:
+    body = make_ndjson(tokens)
+    chunk = 16 * 1024
+
+    async def stream_body():
+        for i in range(0, len(body), chunk):
+            yield body[i : i + chunk]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=stream_body())
+
+    return lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def case_llm_transport_stream() -> Tuple[Callable[[], None], int]:
+    """LLMTransport._stream_ollama end to end over an in-process httpx transport (line splitting included)."""
+    tokens = make_tokens(random.Random(SEED), 4000)
+    make_client = _mock_llm_client(tokens)
+
+    async def consume() -> None:
+        async with make_client() as client:
+            transport = LLMTransport("http://llm.invalid", "llama3", "ollama", client=client)
+            async for _ in transport._stream_ollama("prompt"):
+                pass
+
+    def run() -> None:
+        asyncio.run(consume())
+
+    return run, len(tokens) + 1
+
+
+def case_llm_transport_stream_reference() -> Tuple[Callable[[], None], int]:
+    """The former transport read loop (aiter_lines + json.loads per line) over the same mock."""
+    tokens = make_tokens(random.Random(SEED), 4000)
+    make_client = _mock_llm_client(tokens)
+
+    async def consume() -> None:
+        async with make_client() as client:
+            async with client.stream("POST", "http://llm.invalid/api/generate", json={}) as resp:
+                async for line in resp.aiter_lines():
+                    if not line:
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    data.get("response")
+                    if data.get("done") is True:
+                        break
+
+    def run() -> None:
+        asyncio.run(consume())
+
+    return run, len(tokens) + 1
+
+
+def _audio_case(binary: bool) -> Tuple[Callable[[], None], int]:
+    rng = random.Random(SEED)
+    clips = [rng.randbytes(rng.randint(24 * 1024, 256 * 1024)) for _ in range(24)]
+    ws = _NullWebSocket()
+
+    async def send_all() -> None:
+        for seq, clip in enumerate(clips):
+            await send_audio(ws, clip, fmt="mp3", binary=binary, seq=seq)
+
+    def run() -> None:
+        asyncio.run(send_all())
+
+    return run, len(clips)
+
+
+def case_audio_frame_base64() -> Tuple[Callable[[], None], int]:
+    return _audio_case(binary=False)
+
+
+def case_audio_frame_binary() -> Tuple[Callable[[], None], int]:
+    return _audio_case(binary=True)
+
+
+CASES: Dict[str, Setup] = {
+    "stream_text_parser": case_stream_text_parser,
+    "emotion_tag_parser": case_emotion_tag_parser,
+    "remove_emojis": case_remove_emojis,
+    "chat_token_path_reference": case_chat_token_path_reference,
+    "chat_token_path_fused": case_chat_token_path_fused,
+    "build_final_prompt_list": case_build_final_prompt_list,
+    "build_final_prompt_store": case_build_final_prompt_store,
+    "ndjson_decode": case_ndjson_decode,
+    "ndjson_decode_stream": case_ndjson_decode_stream,
+    "llm_transport_stream_reference": case_llm_transport_stream_reference,
+    "llm_transport_stream": case_llm_transport_stream,
+    "audio_frame_base64": case_audio_frame_base64,
+    "audio_frame_binary": case_audio_frame_binary,
+}
+
+
+# ---- runner ---------------------------------------------------------------------------------
+
+
+def measure(setup: Setup, repeat: int, min_time: float) -> Dict[str, Any]:
+    run, ops = setup()
+    run()  # warmup
+
+    # Scale the number of inner runs so each timed sample lasts at least min_time
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            run()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time or loops >= 1 << 16:
+            break
+        loops *= 2
+
+    samples = [elapsed]
+    for _ in range(repeat - 1):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            run()
+        samples.append(time.perf_counter() - t0)
+    best = min(samples)
+    total_ops = ops * loops
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        run()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "ops_per_run": ops,
+        "loops": loops,
+        "ops_per_sec": total_ops / best if best > 0 else 0.0,
+        "ns_per_op": best / total_ops * 1e9 if total_ops else 0.0,
+        "spread": (max(samples) - best) / best if best > 0 else 0.0,
+        "peak_bytes_per_op": (peak - before) / ops if ops else 0.0,
+        "retained_bytes_per_op": (after - before) / ops if ops else 0.0,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=5
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline_path: str, tolerance: float) -> bool:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f).get("cases") or {}
+    ok = True
+    print(f"\nvs {baseline_path} (tolerance {tolerance:.0%})")
+    for name, res in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("ops_per_sec"):
+            print(f"  {name:<32} (no baseline)")
+            continue
+        ratio = res["ops_per_sec"] / base["ops_per_sec"]
+        flag = ""
+        if ratio < 1.0 - tolerance:
+            flag = "  REGRESSION"
+            ok = False
+        print(f"  {name:<32} {ratio:6.2f}x{flag}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default="", help="Comma-separated substrings of case names to run")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed samples per case (best is reported)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per timed sample")
+    parser.add_argument("--json", default="", help="Write results to this path")
+    parser.add_argument("--compare", default="", help="Baseline JSON from a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed slowdown vs baseline")
+    args = parser.parse_args()
+
+    filters = [f.strip() for f in args.only.split(",") if f.strip()]
+    selected = {n: s for n, s in CASES.items() if not filters or any(f in n for f in filters)}
+    if not selected:
+        print(f"No cases match {args.only!r}; available: {', '.join(CASES)}")
+        sys.exit(2)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    print(f"{'case':<32} {'ops/s':>12} {'ns/op':>10} {'spread':>7} {'peak B/op':>10} {'kept B/op':>10}")
+    for name, setup in selected.items():
+        res = measure(setup, max(1, args.repeat), args.min_time)
+        results[name] = res
+        print(
+            f"{name:<32} {res['ops_per_sec']:>12,.0f} {res['ns_per_op']:>10,.0f} {res['spread']:>6.1%} "
+            f"{res['peak_bytes_per_op']:>10,.1f} {res['retained_bytes_per_op']:>10,.1f}"
+        )
+
+    if args.json:
+        out = {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": SEED,
+            "cases": results,
+        }
+        path = Path(args.json)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(out, indent=2), encoding="utf-8")
+        print(f"\nWrote {path}")
+
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Differential fuzz check: FusedTokenFilter vs the parsers it replaces.
+
+Usage (from backend/):
+  python benchmarks/token_filter_fuzz.py                  # 20000 cases
+  python benchmarks/token_filter_fuzz.py --cases 200000 --seed 7
+
+For random texts (brackets, allowed/unknown tags, emojis, non-ASCII, control characters)
+split at random chunk boundaries, every per-chunk output, tag list and finish() result must
+be identical to:
+  - ChatStreamer._remove_emojis + StreamTextParser(allowed_tags=None)  (ChatStreamer's path)
+  - EmotionTagParser(allowed, default)
+Exits non-zero and prints the first mismatch otherwise.
+tests/test_token_filter.py runs a short seeded version of this check on every test run.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chat_streamer import ChatStreamer  # noqa: E402
+from emotion_parser import EmotionTagParser  # noqa: E402
+from prompt_factory import PromptFactory  # noqa: E402
+from stream_text_parser import StreamTextParser  # noqa: E402
+from token_filter import FusedTokenFilter  # noqa: E402
+
+ALLOWED = ["Happy", "Sad", "Gaming", "Mouth Move"]
+PIECES = [
+    "[", "]", "[Happy]", "[Sad]", "[ Gaming ]", "[Mouth Move]", "[laughs]", "[", "]", "[[", "]]",
+    "Hello", " ", "world", ".", "\n", "\t", "\r", "\x00", "\x1b", "\x7f", "café", "ü",
+    "\U0001F600", "❤", "⭐", "⌚", "\U0001F1FA\U0001F1F8", "你好", "Happy",
+    "!", "?", "a", "b", "  ",
+]
+
+
+def random_text(rng: random.Random) -> str:
+    return "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 30)))
+
+
+def random_chunks(rng: random.Random, text: str) -> List[str]:
+    chunks = []
+    i = 0
+    while i < len(text):
+        step = rng.randint(1, 8)
+        chunks.append(text[i : i + step])
+        i += step
+    return chunks
+
+
+def check_chat_path(streamer: ChatStreamer, chunks: List[str]) -> str:
+    ref = StreamTextParser(allowed_tags=None, strip_non_english=True)
+    fused = FusedTokenFilter()
+    for chunk in chunks:
+        token = streamer._remove_emojis(chunk)
+        # ChatStreamer skips tokens that are empty after emoji removal
+        expected = ref.process_chunk(token) if token else ("", [])
+        got = fused.process_chunk(chunk)
+        if expected != got:
+            return f"chunk {chunk!r}: expected {expected!r}, got {got!r}"
+    if ref.finish() != fused.finish():
+        return "finish() differs"
+    return ""
+
+
+def check_emotion_path(chunks: List[str]) -> str:
+    ref = EmotionTagParser(ALLOWED, "Happy")
+    fused = FusedTokenFilter(ALLOWED, strip_non_english=False, strip_emojis=False, keep_unknown_brackets=True)
+    for chunk in chunks:
+        expected = ref.process_chunk(chunk)
+        got = fused.process_chunk(chunk)
+        if expected != got:
+            return f"chunk {chunk!r}: expected {expected!r}, got {got!r}"
+    expected_tail, _ = ref.finish()
+    got_tail, _ = fused.finish()
+    if expected_tail != got_tail:
+        return f"finish() expected {expected_tail!r}, got {got_tail!r}"
+    return ""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    streamer = ChatStreamer("", "", "ollama", ALLOWED, PromptFactory("", ALLOWED))
+    for case in range(args.cases):
+        text = random_text(rng)
+        chunks = random_chunks(rng, text)
+        for name, error in (
+            ("chat path", check_chat_path(streamer, chunks)),
+            ("emotion path", check_emotion_path(chunks)),
+        ):
+            if error:
+                print(f"case {case} ({name}) mismatch for chunks {chunks!r}\n  {error}")
+                sys.exit(1)
+    print(f"ok: {args.cases} cases, both paths identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
 from __future__ import annotations
 
 import re
+import time
 from typing import AsyncGenerator, List, Optional, Dict, Any
 
-from prompt_factory import PromptFactory
-from stream_text_parser import StreamTextParser
+import httpx
+
+from conversation_store import ConversationStore
+from prompt_factory import History, PromptFactory
+from token_filter import FusedTokenFilter
 from llm_transport import LLMTransport
+from metrics import LLM_TOKENS_PER_SECOND, record_phase, span
 
 
 class ChatStreamer:
@@ -14,6 +19,11 @@ class ChatStreamer:
     - Builds final prompts using PromptFactory and conversation history
     - Streams clean plain-English text tokens (no emojis) via LLMTransport
     - Emits events of shape {"type": "text", "data": str}
+    - With emotion_tags, also emits {"type": "emotion", "emotion": str} once, as soon as the
+      first bracketed tag naming an allowed emotion (case-insensitive) has streamed in
+    - With reuse_context, keeps Ollama's KV `context` between turns and sends only the new
+      user turn; falls back to the full prompt when the context has grown a full memory window
+      past the last full prompt (history truncation) or a turn was missed
     """
 
     def __init__(
@@ -24,12 +34,28 @@ class ChatStreamer:
         allowed_emotions: List[str],
         prompt_factory: PromptFactory,
         default_emotion: Optional[str] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        reuse_context: bool = False,
+        keep_alive: Optional[str] = None,
+        emotion_tags: bool = False,
     ) -> None:
         self.host = host.rstrip("/") if host else "http://127.0.0.1:11434"
         self.model = model
         self.provider = provider
+        self.client = client
+        self.reuse_context = reuse_context
+        self.keep_alive = keep_alive
+        self.emotion_tags = emotion_tags
+        # Cached Ollama context plus what it covers: turns/chars since the last full prompt,
+        # and the history length it was synced to
+        self._context: Optional[List[int]] = None
+        self._context_turns = 0
+        self._context_chars = 0
+        self._context_history_len = -1
+        self._last_core: Optional[LLMTransport] = None
         self.prompt_factory = prompt_factory
         self.allowed_emotions = [e for e in (allowed_emotions or []) if isinstance(e, str) and e.strip()]
+        self._emotion_lookup = {e.strip().lower(): e for e in self.allowed_emotions}
         allowed_set = set(self.allowed_emotions)
         if default_emotion and default_emotion in allowed_set:
             self.default_emotion = default_emotion
@@ -55,38 +81,100 @@ class ChatStreamer:
         )
 
     def _remove_emojis(self, text: str) -> str:
+        # Reference implementation; stream() uses FusedTokenFilter, which matches this +
+        # StreamTextParser (see benchmarks/token_filter_fuzz.py)
         return self._emoji_pattern.sub("", text)
 
-    async def _stream_core(self, prompt: str) -> AsyncGenerator[str, None]:
-        core = LLMTransport(self.host, self.model, self.provider)
-        async for tok in core.stream(prompt):
+    async def _stream_core(self, prompt: str, context: Optional[List[int]] = None) -> AsyncGenerator[str, None]:
+        core = LLMTransport(self.host, self.model, self.provider, client=self.client, keep_alive=self.keep_alive)
+        self._last_core = core
+        async for tok in core.stream(prompt, context=context):
             yield tok
 
+    @staticmethod
+    def _history_mark(history: History) -> int:
+        """Position in the conversation; grows by 2 per completed exchange for both history shapes."""
+        if isinstance(history, ConversationStore):
+            return 2 * history.completed_turns
+        return len(history or [])
+
+    def _can_continue(
+        self,
+        history: History,
+        max_turns: int,
+        max_chars: int,
+    ) -> bool:
+        if not self.reuse_context or not self._context or history is None:
+            return False
+        # Exactly one completed turn (the reply the context ends with) since the last sync
+        if self._history_mark(history) != self._context_history_len + 2:
+            return False
+        # The context may grow by one memory window past the last full prompt; after that,
+        # re-anchor with a fresh (truncated) full prompt so the KV state stays bounded
+        if max_turns > 0 and self._context_turns >= max_turns:
+            return False
+        if max_chars > 0 and self._context_chars >= max_chars:
+            return False
+        return True
+
     async def stream(
         self,
         user_text: str,
-        history: Optional[List[Dict[str, str]]] = None,
+        history: History = None,
         max_turns: int = 8,
         max_chars: int = 4000,
+        max_tokens: int = 0,
     ) -> AsyncGenerator[Dict[str, Any], None]:
-        final_prompt = self.prompt_factory.build_final_prompt(
-            user_text,
-            history=history,
-            max_turns=max_turns,
-            max_chars=max_chars,
-        )
+        context: Optional[List[int]] = None
+        with span("prompt_build"):
+            if self._can_continue(history, max_turns, max_chars):
+                context = self._context
+                final_prompt = self.prompt_factory.build_continuation_prompt(user_text)
+            else:
+                final_prompt = self.prompt_factory.build_final_prompt(
+                    user_text,
+                    history=history,
+                    max_turns=max_turns,
+                    max_chars=max_chars,
+                    max_tokens=max_tokens,
+                )
+                self._context_turns = 0
+                self._context_chars = 0
+        # Invalid until this stream completes; an aborted turn forces a full prompt next time
+        self._context = None
 
         if self.provider != "ollama":
             raise RuntimeError(f"Unsupported provider: {self.provider}")
 
-        parser = StreamTextParser(allowed_tags=None, strip_non_english=True)
-
-        async for raw_token in self._stream_core(final_prompt):
-            token = self._remove_emojis(raw_token)
-            if not token:
-                continue
-
-            text_out, _ = parser.process_chunk(token)
+        # Emoji removal, non-English filtering and bracket stripping in one pass per token.
+        # Without allowed_tags the filter reports every bracket's content as a tag; the text
+        # is the same either way, inline emotion tags are validated here.
+        parser = FusedTokenFilter()
+        emotion_sent = not self.emotion_tags
+        # The space after a leading tag is not part of the reply
+        at_start = self.emotion_tags
+        reply_chars = 0
+        token_count = 0
+        started = time.perf_counter()
+        first_token_at: Optional[float] = None
+
+        async for raw_token in self._stream_core(final_prompt, context=context):
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                record_phase("llm_ttft", first_token_at - started)
+            token_count += 1
+            reply_chars += len(raw_token)
+            text_out, tags = parser.process_chunk(raw_token)
+            if tags and not emotion_sent:
+                for tag in tags:
+                    emotion = self._emotion_lookup.get(tag.strip().lower())
+                    if emotion:
+                        emotion_sent = True
+                        yield {"type": "emotion", "emotion": emotion}
+                        break
+            if at_start and text_out:
+                text_out = text_out.lstrip()
+                at_start = not text_out
             if text_out:
                 yield {"type": "text", "data": text_out}
 
@@ -94,4 +182,13 @@ class ChatStreamer:
         if tail_text:
             yield {"type": "text", "data": tail_text}
 
+        finished = time.perf_counter()
+        record_phase("llm_generation", finished - started)
+        if first_token_at is not None and token_count > 1 and finished > first_token_at:
+            LLM_TOKENS_PER_SECOND.observe((token_count - 1) / (finished - first_token_at))
 
+        if self.reuse_context and self._last_core is not None:
+            self._context = self._last_core.last_context
+            self._context_turns += 1
+            self._context_chars += len(user_text or "") + reply_chars
+            self._context_history_len = self._history_mark(history) if history is not None else -1
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+def _shorten(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[: max(0, limit - 3)].rstrip() + "..." if limit > 3 else text[:limit]
+
+
+class TurnRecord:
+    """One completed user/assistant exchange with its prompt text and size cached."""
+
+    __slots__ = ("seq", "user", "assistant", "text", "chars", "tokens")
+
+    def __init__(self, seq: int, user: str, assistant: str) -> None:
+        self.seq = seq
+        self.user = user
+        self.assistant = assistant
+        self.text = f"User: {user}\nAssistant: {assistant}"
+        self.chars = len(self.text)
+        self.tokens = estimate_tokens(self.text)
+
+
+class ConversationStore:
+    """Bounded per-connection conversation history.
+
+    - Completed turns live in a ring buffer (deque with maxlen), so memory per connection is
+      bounded by `capacity` turns of at most `max_content_chars` per message
+    - The in-progress user message is held separately and never appears in the history window
+      (it is the final "User:" line of the prompt)
+    - window() walks back from the newest turn until a turn/char/token budget is hit and drops
+      whole turns, except that the newest turn is always kept (clipped if it alone is over
+      budget); the formatted result is cached until the next append
+    - Optionally keeps a rolling `summary` of turns that left the window (see history_compactor.py):
+      compactable_turns() lists them and apply_summary() records how far the summary reaches
+    `append({"role", "content"})` is accepted for compatibility with the old list of dicts.
+    """
+
+    def __init__(self, capacity: int = 32, max_content_chars: int = 0) -> None:
+        self.capacity = max(1, int(capacity))
+        self.max_content_chars = max(0, int(max_content_chars))
+        self._turns: Deque[TurnRecord] = deque(maxlen=self.capacity)
+        self._pending_user: Optional[str] = None
+        # Number of turns ever completed; TurnRecord.seq is assigned from it
+        self.completed_turns = 0
+        self._window_cache: Optional[Tuple[Tuple[int, int, int, int], str]] = None
+        # Rolling summary of older turns and the first turn seq it does not cover yet
+        self.summary = ""
+        self.summarized_upto = 0
+        self.track_evictions = False
+        # Turns pushed out of the ring buffer before they were summarized
+        self._evicted: List[TurnRecord] = []
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def _clip(self, text: str) -> str:
+        text = (text or "").strip()
+        if self.max_content_chars and len(text) > self.max_content_chars:
+            cut = text.rfind(" ", 0, self.max_content_chars)
+            text = text[: cut if cut > 0 else self.max_content_chars].rstrip() + "..."
+        return text
+
+    @property
+    def pending_user(self) -> Optional[str]:
+        return self._pending_user
+
+    def add_user(self, content: str) -> None:
+        content = self._clip(content)
+        if content:
+            self._pending_user = content
+
+    def add_assistant(self, content: str) -> Optional[TurnRecord]:
+        content = self._clip(content)
+        if not content:
+            return None
+        record = TurnRecord(self.completed_turns, self._pending_user or "", content)
+        self._pending_user = None
+        if self.track_evictions and len(self._turns) == self.capacity:
+            oldest = self._turns[0]
+            if oldest.seq >= self.summarized_upto:
+                self._evicted.append(oldest)
+                # Bounded too: if summaries keep failing, the oldest evictions are simply lost
+                del self._evicted[: -self.capacity]
+        self._turns.append(record)
+        self.completed_turns += 1
+        self._window_cache = None
+        return record
+
+    def discard_pending(self) -> None:
+        self._pending_user = None
+
+    def append(self, item: Dict[str, str]) -> None:
+        role = (item.get("role") or "").strip().lower()
+        if role == "user":
+            self.add_user(item.get("content") or "")
+        elif role == "assistant":
+            self.add_assistant(item.get("content") or "")
+
+    def turns(self) -> List[TurnRecord]:
+        return list(self._turns)
+
+    @staticmethod
+    def _clipped(record: TurnRecord, max_chars: int, max_tokens: int) -> TurnRecord:
+        """Copy of `record` shortened to fit the budgets; the user message gets at most half."""
+        limits = [n for n in (max_chars, 4 * max_tokens) if n > 0]
+        room = max(0, min(limits) - len(TurnRecord(0, "", "").text))
+        user = _shorten(record.user, max(room // 2, room - len(record.assistant)))
+        return TurnRecord(record.seq, user, _shorten(record.assistant, room - len(user)))
+
+    def window(self, max_turns: int = 8, max_chars: int = 4000, max_tokens: int = 0) -> List[TurnRecord]:
+        """Most recent whole turns that fit every budget (0 disables a budget), oldest first.
+
+        The newest turn is always included; if it alone is over budget it is clipped to fit.
+        """
+        out: List[TurnRecord] = []
+        chars = 0
+        tokens = 0
+        for record in reversed(self._turns):
+            if max_turns > 0 and len(out) >= max_turns:
+                break
+            # +1 for the newline joining this turn to the next
+            next_chars = chars + record.chars + (1 if out else 0)
+            next_tokens = tokens + record.tokens
+            if (max_chars > 0 and next_chars > max_chars) or (max_tokens > 0 and next_tokens > max_tokens):
+                if not out:
+                    out.append(self._clipped(record, max_chars, max_tokens))
+                break
+            out.append(record)
+            chars = next_chars
+            tokens = next_tokens
+        out.reverse()
+        return out
+
+    def format_window(self, max_turns: int = 8, max_chars: int = 4000, max_tokens: int = 0) -> str:
+        key = (self.completed_turns, max_turns, max_chars, max_tokens)
+        if self._window_cache is not None and self._window_cache[0] == key:
+            return self._window_cache[1]
+        text = "\n".join(r.text for r in self.window(max_turns, max_chars, max_tokens))
+        self._window_cache = (key, text)
+        return text
+
+    def compactable_turns(self, max_turns: int = 8, max_chars: int = 4000, max_tokens: int = 0) -> List[TurnRecord]:
+        """Turns older than the current prompt window that the summary does not cover yet."""
+        window = self.window(max_turns, max_chars, max_tokens)
+        first_in_window = window[0].seq if window else self.completed_turns
+        older = [r for r in self._evicted if r.seq >= self.summarized_upto]
+        older.extend(r for r in self._turns if self.summarized_upto <= r.seq < first_in_window)
+        return older
+
+    def apply_summary(self, summary: str, upto_seq: int) -> None:
+        self.summary = (summary or "").strip()
+        self.summarized_upto = max(self.summarized_upto, upto_seq)
+        self._evicted = [r for r in self._evicted if r.seq >= self.summarized_upto]
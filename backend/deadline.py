@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Optional, TypeVar
+
+from metrics import Counter, registry
+
+T = TypeVar("T")
+
+TURN_DEADLINE_MISSES = registry.register(Counter(
+    "vtuber_turn_deadline_misses_total",
+    "Upstream results dropped because the turn's deadline passed, by stage.",
+    labelnames=("stage",),
+))
+
+
+class TurnDeadline:
+    """Time budget of one chat turn, counted from when the turn started.
+
+    Waits for optional outputs (emotion, audio) go through run(); once the budget is spent
+    they give up with asyncio.TimeoutError so the reply text is still delivered. `missed`
+    records that something was dropped. A budget of 0 means no deadline.
+    """
+
+    __slots__ = ("at", "missed")
+
+    def __init__(self, seconds: float = 0.0) -> None:
+        self.at: Optional[float] = time.monotonic() + seconds if seconds > 0 else None
+        self.missed = False
+
+    def remaining(self) -> Optional[float]:
+        return None if self.at is None else max(0.0, self.at - time.monotonic())
+
+    async def run(self, aw: Awaitable[T], stage: str) -> T:
+        """Await `aw` within the budget; on expiry it is cancelled and TimeoutError raised."""
+        if self.at is None:
+            return await aw
+        try:
+            return await asyncio.wait_for(aw, self.remaining())
+        except asyncio.TimeoutError:
+            self.missed = True
+            TURN_DEADLINE_MISSES.inc(stage=stage)
+            raise
+
+    async def first_chunk(self, chunks: AsyncIterator[bytes], stage: str = "audio") -> AsyncIterator[bytes]:
+        """Pass `chunks` through, giving up if the first one is not there in time.
+
+        Audio that has started playing is not cut off; later stalls are left to the
+        HTTP read timeout.
+        """
+        iterator = chunks.__aiter__()
+        try:
+            first = await self.run(iterator.__anext__(), stage)
+        except StopAsyncIteration:
+            return
+        yield first
+        async for chunk in iterator:
+            yield chunk
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import re
+from typing import Dict, List, Optional
+
+import httpx
+
+from emotion_classifier import EmotionClassifier, classify_emotion_llm, match_allowed_emotion
+from http_clients import http_clients
+from llm_transport import LLMTransport
+from metrics import Histogram, registry
+from upstream_scheduler import Priority, current_session
+
+# "3: Happy", "#3 - Happy", "3) Happy"
+_ANSWER_RE = re.compile(r"^\s*#?\s*(\d+)\s*[:.)\-]\s*(.+?)\s*$")
+# Per-item text is clipped so one long reply cannot blow up the shared prompt
+_MAX_ITEM_CHARS = 600
+# Scheduler / LLM pool session key of a shared multi-session prompt
+BATCH_SESSION = "emotion-batch"
+
+EMOTION_BATCH_SIZE = registry.register(Histogram(
+    "vtuber_emotion_batch_size",
+    "Classification requests sent to the LLM in one batched prompt.",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+))
+
+
+class _Item:
+    __slots__ = ("last_user", "assistant", "allowed", "future", "session")
+
+    def __init__(self, last_user: str, assistant: str, allowed: List[str], future: asyncio.Future, session: str) -> None:
+        self.last_user = last_user
+        self.assistant = assistant
+        self.allowed = allowed
+        self.future = future
+        self.session = session
+
+
+def _clip(text: str) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= _MAX_ITEM_CHARS else text[:_MAX_ITEM_CHARS].rstrip() + "..."
+
+
+class EmotionBatcher(EmotionClassifier):
+    """LLM emotion classification, micro-batched across concurrent sessions.
+
+    Requests arriving within `window_ms` of the first one (or until `max_batch` are queued)
+    are sent as a single numbered prompt; the answer lines are parsed and each item is
+    validated against its own allowed list. A batch of one uses the normal single-item
+    prompt. Items the model skipped or answered with a non-allowed emotion are retried one
+    by one, so callers always get an allowed emotion (or the error of their own request).
+    """
+
+    mode = "llm"
+
+    def __init__(
+        self,
+        host: str,
+        model: str,
+        client: Optional[httpx.AsyncClient] = None,
+        window_ms: float = 5.0,
+        max_batch: int = 16,
+    ) -> None:
+        self.host = host
+        self.model = model
+        self.client = client
+        self.window = max(0.0, float(window_ms)) / 1000.0
+        self.max_batch = max(1, int(max_batch))
+        self._pending: List[_Item] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: "set[asyncio.Task]" = set()
+
+    async def classify(self, last_user: str, assistant: str, allowed: List[str]) -> str:
+        allowed_clean = [e for e in (allowed or []) if isinstance(e, str) and e.strip()]
+        loop = asyncio.get_running_loop()
+        item = _Item(last_user or "", assistant or "", allowed_clean, loop.create_future(), current_session.get())
+        self._pending.append(item)
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await item.future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Callers that gave up (barge-in, disconnect) are not sent upstream
+        batch = [it for it in self._pending if not it.future.done()]
+        self._pending = []
+        if not batch:
+            return
+        # Started in an empty context: the batch must not inherit the session (or turn trace) of
+        # whichever caller happened to trigger the flush
+        task = contextvars.Context().run(asyncio.create_task, self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def build_prompt(self, batch: List[_Item]) -> str:
+        parts = [
+            "You are an emotion selector for a VTuber.\n"
+            "For each numbered item below, pick exactly one emotion from that item's Allowed list "
+            "that best matches the assistant's tone.\n"
+            'Answer with one line per item in the form "<number>: <Emotion>" (the emotion exactly as '
+            "listed), in order, and nothing else.\n"
+        ]
+        for n, item in enumerate(batch, 1):
+            allowed_line = ", ".join(item.allowed) if item.allowed else "Happy, Sad, Excited, Thinking, Annoyed"
+            parts.append(
+                f"#{n}\n"
+                f"Allowed: {allowed_line}\n"
+                f"User: {_clip(item.last_user)}\n"
+                f"Assistant: {_clip(item.assistant)}\n"
+            )
+        parts.append(f"Items: {len(batch)}. Answer:")
+        return "\n".join(parts)
+
+    @staticmethod
+    def parse_answers(text: str, count: int) -> Dict[int, str]:
+        answers: Dict[int, str] = {}
+        for line in (text or "").splitlines():
+            m = _ANSWER_RE.match(line)
+            if not m:
+                continue
+            n = int(m.group(1))
+            if 1 <= n <= count and n not in answers:
+                answers[n] = m.group(2)
+        return answers
+
+    async def _classify_one(self, item: _Item) -> None:
+        # Charged to the item's own session (retries are gathered as tasks, so each has its own context)
+        current_session.set(item.session)
+        client = self.client or http_clients.get("llm")
+        try:
+            emotion = await classify_emotion_llm(
+                client, self.host, self.model, item.last_user, item.assistant, item.allowed
+            )
+        except Exception as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+            return
+        if not item.future.done():
+            item.future.set_result(emotion)
+
+    async def _run(self, batch: List[_Item]) -> None:
+        EMOTION_BATCH_SIZE.observe(len(batch))
+        if len(batch) == 1:
+            await self._classify_one(batch[0])
+            return
+
+        current_session.set(BATCH_SESSION)
+        core = LLMTransport(self.host, self.model, "ollama", client=self.client, priority=Priority.CLASSIFY)
+        try:
+            text = await core.generate(self.build_prompt(batch))
+        except Exception as e:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        answers = self.parse_answers(text, len(batch))
+        retry: List[_Item] = []
+        for n, item in enumerate(batch, 1):
+            if item.future.done():
+                continue
+            emotion = match_allowed_emotion(answers.get(n, ""), item.allowed) if item.allowed else None
+            if emotion:
+                item.future.set_result(emotion)
+            else:
+                retry.append(item)
+        if retry:
+            await asyncio.gather(*(self._classify_one(item) for item in retry))
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import difflib
+import re
+import warnings
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from http_clients import http_clients
+from llm_transport import LLMTransport
+from upstream_scheduler import Priority
+
+
+async def classify_emotion_llm(
+    client: httpx.AsyncClient,
+    host: str,
+    model: str,
+    last_user: str,
+    assistant: str,
+    allowed: List[str],
+) -> str:
+    """Call the LLM to choose exactly one emotion from the allowed list.
+
+    The model must return only the emotion word, nothing else.
+    """
+    allowed_clean = [e for e in (allowed or []) if isinstance(e, str) and e.strip()]
+    allowed_line = ", ".join(allowed_clean) if allowed_clean else "Happy, Sad, Excited, Thinking, Annoyed"
+    prompt = (
+        "You are an emotion selector for a VTuber.\n"
+        "Given the user's message and the assistant's reply, pick exactly one emotion from the allowed list that best matches the assistant's tone.\n"
+        f"Allowed emotions (choose exactly one, return only the word): {allowed_line}.\n\n"
+        f"User: {last_user or ''}\n"
+        f"Assistant: {assistant or ''}\n\n"
+        "Answer with only the emotion word (must be exactly as listed in Allowed)."
+    )
+
+    # Use core LLM for logging and generation, over the caller's pooled client; queued
+    # behind interactive chat but ahead of background work
+    core = LLMTransport(host, model, "ollama", client=client, priority=Priority.CLASSIFY)
+    text = await core.generate(prompt)
+    emotion = match_allowed_emotion(text, allowed_clean)
+    if emotion:
+        return emotion
+    return allowed_clean[0] if allowed_clean else "Neutral"
+
+
+def match_allowed_emotion(text: str, allowed: List[str]) -> Optional[str]:
+    """Map a model answer to one of the allowed emotions, or None if it names none of them."""
+    # Keep ASCII letters and spaces only
+    text = re.sub(r"[^A-Za-z\s]", " ", text or "").strip()
+    # Try exact match first
+    allowed_map = {e.lower(): e for e in allowed}
+    parts = [p for p in text.split() if p]
+    for p in parts:
+        key = p.lower()
+        if key in allowed_map:
+            return allowed_map[key]
+    # Fallback: scan full text for any allowed word
+    for e in allowed:
+        if re.search(rf"(?i)(?<![A-Za-z]){re.escape(e)}(?![A-Za-z])", text):
+            return e
+    return None
+
+
+# Weighted unigram/bigram cues per emotion name (lowercase). Configured emotion names are
+# matched to these keys by lexicon_key(); names with no entry only match on their own name.
+EMOTION_LEXICON: Dict[str, Dict[str, float]] = {
+    "happy": {
+        "glad": 1.5, "happy": 1.5, "great": 1.0, "nice": 1.0, "awesome": 1.0, "love": 1.0,
+        "fun": 1.0, "thanks": 0.8, "thank you": 1.0, "sure": 0.5, "good": 0.8, "enjoy": 1.0,
+        "hi": 0.6, "hello": 0.8, "hey": 0.6, "welcome": 1.0, "cool": 0.8, "sounds good": 1.2,
+        "haha": 1.0, "lol": 0.8, ":)": 1.0, "yay": 1.2,
+    },
+    "neutral": {"okay": 0.8, "ok": 0.8, "got it": 1.0, "noted": 1.0, "alright": 0.8},
+    "excited": {
+        "excited": 2.0, "amazing": 1.5, "wow": 1.5, "incredible": 1.5, "can't wait": 2.0,
+        "let's go": 2.0, "epic": 1.5, "hype": 1.5, "!": 0.6, "omg": 1.5, "so cool": 1.5,
+        "yes": 0.6, "fantastic": 1.5, "awesome": 0.8,
+    },
+    "sad": {
+        "sad": 2.0, "sorry": 1.2, "unfortunately": 1.5, "miss": 1.0, "lost": 1.0, "cry": 1.5,
+        "tough": 1.0, "hard time": 1.5, "lonely": 1.5, "down": 0.8, "rip": 1.5, "sucks": 1.0,
+        "not happy": 1.5, "died": 1.5, "hurts": 1.2,
+    },
+    "concerned": {
+        "careful": 1.5, "worried": 1.8, "concern": 1.5, "hope you're": 1.2, "you okay": 2.0,
+        "be safe": 1.5, "take care": 1.2, "risky": 1.2, "sorry to": 1.2, "rest": 0.6,
+        "doctor": 1.0, "sick": 1.2,
+    },
+    "thinking": {
+        "think": 1.2, "hmm": 1.8, "maybe": 1.0, "perhaps": 1.0, "let me": 1.0, "consider": 1.2,
+        "depends": 1.5, "probably": 0.8, "not sure": 1.5, "wonder": 1.2, "?": 0.4, "guess": 0.8,
+        "idea": 0.8,
+    },
+    "searching": {
+        "search": 1.5, "looking": 1.2, "look up": 1.5, "find": 1.2, "check": 1.0, "where": 0.6,
+        "lookup": 1.2, "google": 1.5,
+    },
+    "concentrating": {
+        "focus": 1.5, "concentrate": 2.0, "step": 0.8, "carefully": 1.0, "precise": 1.2,
+        "first": 0.5, "then": 0.4, "calculate": 1.5,
+    },
+    "gaming": {
+        "game": 1.5, "games": 1.5, "play": 1.0, "playing": 1.2, "level": 1.0, "boss": 1.2,
+        "speedrun": 2.0, "controller": 1.5, "gg": 2.0, "respawn": 1.5, "loot": 1.5, "minecraft": 1.5,
+        "elden ring": 2.0, "cheat": 1.2, "cheat code": 1.5, "fps": 1.2, "rpg": 1.5, "xp": 1.2,
+        "noob": 1.2, "quest": 1.0, "build": 0.6,
+    },
+    "nerd": {
+        "actually": 1.2, "technically": 2.0, "algorithm": 1.5, "code": 1.0, "python": 1.2,
+        "science": 1.2, "physics": 1.5, "math": 1.2, "fun fact": 2.0, "data": 0.8, "function": 1.0,
+        "theory": 1.2, "frame data": 1.5,
+    },
+    "cunning": {"trick": 1.5, "sneaky": 1.8, "clever": 1.2, "exploit": 1.5, "loophole": 2.0, "smart move": 1.5},
+    "lying": {"trust me": 2.0, "definitely not": 1.8, "totally": 1.0, "honest": 1.0, "i swear": 1.8},
+    "evil": {"evil": 2.0, "mwahaha": 2.5, "destroy": 1.5, "doom": 1.5, "muahaha": 2.5, "chaos": 1.2},
+    "scheming": {"plan": 1.2, "scheme": 2.0, "plot": 1.2, "secret": 1.2, "just wait": 1.5, "heh": 1.2},
+    "blushing": {
+        "blush": 2.0, "cute": 1.5, "flattered": 2.0, "aww": 1.5, "compliment": 1.2, "sweet": 1.0,
+        "too kind": 2.0, "stop it": 1.2, "like you": 1.0,
+    },
+    "embarrassed": {
+        "embarrassed": 2.0, "embarrassing": 2.0, "oops": 1.5, "my bad": 1.8, "awkward": 1.5,
+        "whoops": 1.5, "mistake": 1.0, "forgot": 1.0, "ashamed": 1.5,
+    },
+    "shocked": {
+        "what": 0.6, "no way": 2.0, "shocked": 2.0, "seriously": 1.2, "whoa": 1.5, "unbelievable": 1.8,
+        "can't believe": 1.8, "really?": 1.0, "wait what": 2.0, "surprised": 1.5,
+    },
+    "flustered": {"um": 1.2, "uh": 1.0, "flustered": 2.0, "well i": 1.0, "i mean": 1.0, "nervous": 1.5},
+    "annoyed": {
+        "ugh": 2.0, "annoying": 1.8, "again": 0.8, "seriously": 0.8, "whatever": 1.5, "fine": 0.8,
+        "already told": 1.8, "stop": 1.0, "tired of": 1.5, "really": 0.4, "sigh": 1.5,
+    },
+    "mad": {
+        "mad": 2.0, "angry": 2.0, "furious": 2.0, "hate": 1.5, "unacceptable": 1.8, "rage": 1.5,
+        "stupid": 1.2, "shut up": 1.8, "ridiculous": 1.5,
+    },
+}
+
+def lexicon_key(name: str) -> Optional[str]:
+    """The EMOTION_LEXICON key for a configured emotion name, or None if it has no entry.
+
+    Case and surrounding spaces are ignored, and a near-identical spelling ("Embarassed")
+    still finds its entry.
+    """
+    lower = (name or "").strip().lower()
+    if lower in EMOTION_LEXICON:
+        return lower
+    close = difflib.get_close_matches(lower, EMOTION_LEXICON.keys(), n=1, cutoff=0.85)
+    return close[0] if close else None
+
+
+# Emotions that are not a tone of voice and must never be picked by the classifier
+NON_EMOTIONS = {"mouth move"}
+
+_WORD_RE = re.compile(r"[a-z']+|[!?]|:\)")
+
+
+def _features(text: str) -> List[str]:
+    """Lowercase unigram + bigram features, including '!'/'?' punctuation cues."""
+    tokens = _WORD_RE.findall((text or "").lower())
+    feats = list(tokens)
+    feats.extend(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    # Bigrams like "really?" combine a word with trailing punctuation
+    feats.extend(f"{a}{b}" for a, b in zip(tokens, tokens[1:]) if b in ("!", "?"))
+    return feats
+
+
+class EmotionClassifier(ABC):
+    """Interface for emotion backends. classify() returns exactly one allowed emotion."""
+
+    mode = "base"
+
+    @abstractmethod
+    async def classify(self, last_user: str, assistant: str, allowed: List[str]) -> str:
+        """Pick one emotion from `allowed` for the assistant's reply."""
+
+
+class LLMEmotionClassifier(EmotionClassifier):
+    """Asks the LLM to pick the emotion (one extra generation per turn)."""
+
+    mode = "llm"
+
+    def __init__(self, host: str, model: str, client: Optional[httpx.AsyncClient] = None) -> None:
+        self.host = host
+        self.model = model
+        self.client = client
+
+    async def classify(self, last_user: str, assistant: str, allowed: List[str]) -> str:
+        client = self.client or http_clients.get("llm")
+        return await classify_emotion_llm(client, self.host, self.model, last_user, assistant, allowed)
+
+
+class LexiconEmotionClassifier(EmotionClassifier):
+    """In-process classifier: weighted lexicon / n-gram scores, vectorized with NumPy.
+
+    For each allowed-emotion list a (vocabulary x emotions) weight matrix is built once and
+    cached. Scoring a reply is a feature lookup plus one row-sum over that matrix.
+    """
+
+    mode = "local"
+
+    def __init__(self, user_weight: float = 0.35, prior: float = 1.0) -> None:
+        self.user_weight = user_weight
+        # Pseudo-count added to the denominator so weak evidence yields low confidence
+        self.prior = prior
+        self._tables: Dict[Tuple[str, ...], Tuple[Dict[str, int], np.ndarray, List[str], str]] = {}
+
+    def _table(self, allowed: List[str]) -> Tuple[Dict[str, int], np.ndarray, List[str], str]:
+        key = tuple(allowed)
+        table = self._tables.get(key)
+        if table is not None:
+            return table
+        candidates = [e for e in allowed if e.strip().lower() not in NON_EMOTIONS]
+        vocab: Dict[str, int] = {}
+        entries: List[Tuple[int, int, float]] = []
+        unmatched: List[str] = []
+        for col, name in enumerate(candidates):
+            lower = name.strip().lower()
+            entry = lexicon_key(name)
+            if entry is None:
+                unmatched.append(name)
+            terms = dict(EMOTION_LEXICON.get(entry or "", {}))
+            # The emotion's own name (as configured and as spelled in the lexicon) is a strong cue
+            terms.setdefault(lower, 2.0)
+            if entry:
+                terms.setdefault(entry, 2.0)
+            for term, weight in terms.items():
+                row = vocab.setdefault(term, len(vocab))
+                entries.append((row, col, weight))
+        weights = np.zeros((max(1, len(vocab)), max(1, len(candidates))), dtype=np.float32)
+        for row, col, weight in entries:
+            weights[row, col] = weight
+        if unmatched:
+            warnings.warn(
+                "Local emotion classifier has no lexicon cues for " + ", ".join(unmatched)
+                + "; these emotions only match on their own name (add them to EMOTION_LEXICON)",
+                stacklevel=2,
+            )
+        lowered = {c.lower(): c for c in candidates}
+        default = lowered.get("happy") or lowered.get("neutral") or (candidates[0] if candidates else (allowed[0] if allowed else "Neutral"))
+        table = (vocab, weights, candidates, default)
+        self._tables[key] = table
+        return table
+
+    def _scores(self, text: str, vocab: Dict[str, int], weights: np.ndarray) -> np.ndarray:
+        idx = [vocab[f] for f in _features(text) if f in vocab]
+        if not idx:
+            return np.zeros(weights.shape[1], dtype=np.float32)
+        return weights[np.asarray(idx, dtype=np.intp)].sum(axis=0)
+
+    def score(self, last_user: str, assistant: str, allowed: List[str]) -> Tuple[str, float]:
+        """Return (emotion, confidence in [0, 1)) without any I/O."""
+        allowed_clean = [e for e in (allowed or []) if isinstance(e, str) and e.strip()]
+        vocab, weights, candidates, default = self._table(allowed_clean)
+        if not candidates:
+            return default, 0.0
+        scores = self._scores(assistant, vocab, weights)
+        if last_user and self.user_weight:
+            scores = scores + self.user_weight * self._scores(last_user, vocab, weights)
+        best = int(np.argmax(scores))
+        top = float(scores[best])
+        if top <= 0.0:
+            return default, 0.0
+        confidence = top / (float(scores.sum()) + self.prior)
+        return candidates[best], confidence
+
+    async def classify(self, last_user: str, assistant: str, allowed: List[str]) -> str:
+        return self.score(last_user, assistant, allowed)[0]
+
+
+class HybridEmotionClassifier(EmotionClassifier):
+    """Local classifier first; falls back to the LLM only when local confidence is low."""
+
+    mode = "hybrid"
+
+    def __init__(self, local: LexiconEmotionClassifier, llm: EmotionClassifier, threshold: float = 0.5) -> None:
+        self.local = local
+        self.llm = llm
+        self.threshold = threshold
+
+    async def classify(self, last_user: str, assistant: str, allowed: List[str]) -> str:
+        emotion, confidence = self.local.score(last_user, assistant, allowed)
+        if confidence >= self.threshold:
+            return emotion
+        try:
+            return await self.llm.classify(last_user, assistant, allowed)
+        except Exception:
+            return emotion
+
+
+def build_emotion_classifier(
+    mode: str,
+    *,
+    host: str,
+    model: str,
+    threshold: float = 0.5,
+    batch_window_ms: float = 0.0,
+    batch_max: int = 16,
+) -> EmotionClassifier:
+    """Create the classifier for EMOTION_CLASSIFIER=llm|local|hybrid (unknown values mean llm).
+
+    With batch_window_ms > 0 the LLM part micro-batches concurrent requests (emotion_batcher.py).
+    """
+    mode = (mode or "llm").strip().lower()
+    if mode == "local":
+        return LexiconEmotionClassifier()
+    llm: EmotionClassifier
+    if batch_window_ms > 0:
+        # Imported here: emotion_batcher builds on this module
+        from emotion_batcher import EmotionBatcher
+
+        llm = EmotionBatcher(host, model, window_ms=batch_window_ms, max_batch=batch_max)
+    else:
+        llm = LLMEmotionClassifier(host, model)
+    if mode == "hybrid":
+        return HybridEmotionClassifier(LexiconEmotionClassifier(), llm, threshold=threshold)
+    return llm
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+from typing import List, Optional
+
+import httpx
+
+from conversation_store import ConversationStore, TurnRecord
+from llm_transport import LLMTransport
+from upstream_scheduler import Priority
+
+
+class HistoryCompactor:
+    """Folds turns that fall out of the prompt window into the store's rolling summary.
+
+    schedule() is called after a reply has been delivered. It starts at most one background
+    task per connection, so summarization runs between turns and never blocks a reply. The
+    prompt then carries the summary instead of the dropped turns, keeping its length roughly
+    constant however long the session runs.
+    """
+
+    def __init__(
+        self,
+        store: ConversationStore,
+        *,
+        host: str,
+        model: str,
+        client: Optional[httpx.AsyncClient] = None,
+        max_turns: int = 8,
+        max_chars: int = 4000,
+        max_tokens: int = 0,
+        max_summary_chars: int = 1200,
+    ) -> None:
+        self.store = store
+        self.store.track_evictions = True
+        self.host = host
+        self.model = model
+        self.client = client
+        self.max_turns = max_turns
+        self.max_chars = max_chars
+        self.max_tokens = max_tokens
+        self.max_summary_chars = max(200, int(max_summary_chars))
+        self._task: Optional[asyncio.Task] = None
+
+    def build_prompt(self, summary: str, turns: List[TurnRecord]) -> str:
+        new_turns = "\n".join(r.text for r in turns)
+        return (
+            "You maintain a running summary of a conversation between a user and a VTuber assistant.\n"
+            "Merge the new turns into the current summary. Keep names, facts about the user, preferences, "
+            "promises and open questions; drop small talk. Write plain sentences, no lists, "
+            f"at most {self.max_summary_chars // 6} words.\n\n"
+            f"Current summary:\n{summary or '(empty)'}\n\n"
+            f"New turns:\n{new_turns}\n\n"
+            "Updated summary:"
+        )
+
+    def _clip(self, text: str) -> str:
+        text = " ".join((text or "").split())
+        if len(text) <= self.max_summary_chars:
+            return text
+        cut = text.rfind(". ", 0, self.max_summary_chars)
+        return text[: cut + 1] if cut > 0 else text[: self.max_summary_chars]
+
+    async def _run(self) -> None:
+        while True:
+            turns = self.store.compactable_turns(self.max_turns, self.max_chars, self.max_tokens)
+            if not turns:
+                return
+            core = LLMTransport(self.host, self.model, "ollama", client=self.client, priority=Priority.BACKGROUND)
+            summary = await core.generate(self.build_prompt(self.store.summary, turns))
+            summary = self._clip(summary)
+            if not summary:
+                return
+            self.store.apply_summary(summary, turns[-1].seq + 1)
+
+    def schedule(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        if not self.store.compactable_turns(self.max_turns, self.max_chars, self.max_tokens):
+            return
+        self._task = asyncio.create_task(self._guarded_run())
+
+    async def _guarded_run(self) -> None:
+        try:
+            await self._run()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # A failed (or rejected as busy) summary only means older turns stay dropped;
+            # retry after the next turn
+            pass
+
+    def close(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
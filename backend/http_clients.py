@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import importlib.util
+import os
+from typing import Dict, Optional
+
+import httpx
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class HTTPClientRegistry:
+    """Application-scoped registry of pooled httpx clients, one per upstream.
+
+    - "llm": Ollama traffic (long read timeout, the model may need to load)
+    - "tts": speech synthesis traffic
+    Clients keep connections alive across turns and WebSocket sessions, so each turn
+    no longer pays new TCP/TLS handshakes. HTTP/2 is used when the `h2` package is installed.
+
+    Tuning (env):
+      HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE, HTTP_KEEPALIVE_EXPIRY,
+      HTTP_CONNECT_TIMEOUT, HTTP_WRITE_TIMEOUT, HTTP_POOL_TIMEOUT,
+      LLM_READ_TIMEOUT, TTS_READ_TIMEOUT, HTTP2=0 to disable HTTP/2
+    """
+
+    def __init__(self) -> None:
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    @staticmethod
+    def http2_available() -> bool:
+        return bool(int(os.getenv("HTTP2", "1"))) and importlib.util.find_spec("h2") is not None
+
+    @staticmethod
+    def _limits() -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=_env_int("HTTP_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=_env_int("HTTP_MAX_KEEPALIVE", 20),
+            keepalive_expiry=_env_float("HTTP_KEEPALIVE_EXPIRY", 30.0),
+        )
+
+    @staticmethod
+    def _timeout(read: float) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=_env_float("HTTP_CONNECT_TIMEOUT", 5.0),
+            read=read,
+            write=_env_float("HTTP_WRITE_TIMEOUT", 10.0),
+            pool=_env_float("HTTP_POOL_TIMEOUT", 10.0),
+        )
+
+    def _read_timeout(self, name: str) -> float:
+        if name == "llm":
+            # Read timeout applies between streamed chunks; the first one may wait for a model load
+            return _env_float("LLM_READ_TIMEOUT", 300.0)
+        if name == "tts":
+            return _env_float("TTS_READ_TIMEOUT", 60.0)
+        return _env_float("HTTP_READ_TIMEOUT", 60.0)
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            limits=self._limits(),
+            timeout=self._timeout(self._read_timeout(name)),
+            http2=self.http2_available(),
+        )
+
+    async def start(self, names: Optional[list] = None) -> None:
+        for name in names or ["llm", "tts"]:
+            self.get(name)
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Return the shared client for an upstream, creating it lazily."""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._create(name)
+            self._clients[name] = client
+        return client
+
+    async def aclose(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception:
+                pass
+
+
+# Process-wide registry; server.py opens and closes it in the FastAPI lifespan hook
+http_clients = HTTPClientRegistry()
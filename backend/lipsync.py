@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import base64
+import io
+import wave
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+# Below this RMS (full scale = 1.0) a frame is treated as silence, whatever the clip's level
+_SILENCE_RMS = 0.01
+# Frames under this fraction of the clip's speaking level close the mouth (breaths, room tone)
+_GATE = 0.12
+
+
+class MouthEnvelope:
+    """Mouth opening per fixed-length audio frame, quantized to one byte (0 closed .. 255 open)."""
+
+    __slots__ = ("frame_ms", "values")
+
+    def __init__(self, frame_ms: int, values: bytes) -> None:
+        self.frame_ms = frame_ms
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def to_message(self, seq: Optional[int] = None) -> Dict[str, Any]:
+        """{ "type": "mouth", "frame_ms": 20, "encoding": "u8", "data": "<base64>", "seq"?: n }"""
+        msg: Dict[str, Any] = {
+            "type": "mouth",
+            "frame_ms": self.frame_ms,
+            "encoding": "u8",
+            "data": base64.b64encode(self.values).decode("ascii"),
+        }
+        if seq is not None:
+            msg["seq"] = seq
+        return msg
+
+
+def _scan_data_chunk(audio: bytes) -> Optional[bytes]:
+    # Streamed WAVs may carry a placeholder data size; take everything after the "data" tag
+    pos = audio.find(b"data", 12, 512)
+    if pos < 0 or len(audio) < pos + 8:
+        return None
+    return audio[pos + 8:]
+
+
+def read_wav_pcm(audio: bytes) -> Optional[Tuple[np.ndarray, int]]:
+    """Decode a PCM WAV into (mono float32 samples in [-1, 1], sample rate), or None."""
+    try:
+        with wave.open(io.BytesIO(audio), "rb") as wf:
+            channels = wf.getnchannels()
+            width = wf.getsampwidth()
+            rate = wf.getframerate()
+            frames = wf.readframes(wf.getnframes())
+    except (wave.Error, EOFError):
+        return None
+    if not frames:
+        frames = _scan_data_chunk(audio) or b""
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(frames[: len(frames) // 2 * 2], dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 4:
+        samples = np.frombuffer(frames[: len(frames) // 4 * 4], dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        return None
+    if channels > 1:
+        samples = samples[: len(samples) // channels * channels].reshape(-1, channels).mean(axis=1)
+    if rate <= 0 or samples.size == 0:
+        return None
+    return samples, rate
+
+
+def compute_envelope(audio: bytes, fmt: str = "wav", frame_ms: int = 20) -> Optional[MouthEnvelope]:
+    """RMS energy of each `frame_ms` window, normalized to the clip's speaking level.
+
+    Only WAV input is decoded (other formats return None). The level reference is the 95th
+    percentile of non-silent frames, so quiet and loud voices both use the full mouth range
+    and a single plosive does not squash the rest of the clip.
+    """
+    if fmt != "wav" or frame_ms <= 0 or not audio:
+        return None
+    decoded = read_wav_pcm(audio)
+    if decoded is None:
+        return None
+    samples, rate = decoded
+    hop = max(1, int(rate * frame_ms / 1000))
+    count = -(-samples.size // hop)
+    padded = np.zeros(count * hop, dtype=np.float32)
+    padded[: samples.size] = samples
+    rms = np.sqrt(np.mean(np.square(padded.reshape(count, hop)), axis=1))
+
+    voiced = rms[rms > _SILENCE_RMS]
+    if voiced.size == 0:
+        return MouthEnvelope(frame_ms, bytes(count))
+    level = np.clip(rms / max(float(np.percentile(voiced, 95)), _SILENCE_RMS), 0.0, 1.0)
+    level[level < _GATE] = 0.0
+    return MouthEnvelope(frame_ms, np.round(level * 255.0).astype(np.uint8).tobytes())
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import httpx
+
+from http_clients import http_clients
+from metrics import Gauge, registry
+from upstream_scheduler import current_session
+
+LLM_HOST_HEALTHY = registry.register(Gauge(
+    "vtuber_llm_host_healthy",
+    "1 while an LLM host passes health probes and requests, else 0.",
+    labelnames=("host",),
+))
+LLM_HOST_INFLIGHT = registry.register(Gauge(
+    "vtuber_llm_host_inflight_requests",
+    "Requests in flight to each LLM host.",
+    labelnames=("host",),
+))
+
+# Assumed time to first token before any host has served a request
+_DEFAULT_TTFT = 0.5
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def normalize_hosts(value: object) -> List[str]:
+    """Host list from a config value: a list of URLs or one string (comma-separated allowed)."""
+    items = value if isinstance(value, (list, tuple)) else str(value or "").split(",")
+    hosts: List[str] = []
+    for item in items:
+        host = str(item or "").strip().rstrip("/")
+        if host and host not in hosts:
+            hosts.append(host)
+    return hosts
+
+
+class LLMHost:
+    """Routing state of one Ollama endpoint."""
+
+    __slots__ = ("url", "healthy", "inflight", "ttft", "failures", "last_error")
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.healthy = True
+        self.inflight = 0
+        # Exponential moving average of time to first token, seconds (None until measured)
+        self.ttft: Optional[float] = None
+        self.failures = 0
+        self.last_error = ""
+
+    def load(self, default_ttft: float = _DEFAULT_TTFT) -> float:
+        """Expected wait for a new request: queue depth times typical first-token latency."""
+        return (self.inflight + 1) * (self.ttft if self.ttft is not None else default_ttft)
+
+
+class LLMHostPool:
+    """Routes LLM requests across several Ollama hosts serving the same model.
+
+    - A session (upstream_scheduler.current_session) stays on the host it was first routed
+      to while that host is healthy, so Ollama's KV cache for the conversation stays warm
+    - Otherwise the healthy host with the lowest (in-flight + 1) x recent TTFT is chosen
+    - A host that fails a request or a health probe is skipped until a probe succeeds again;
+      its sessions move to another host on their next request
+    - With every host down, the one with the fewest consecutive failures is still tried
+    Tuning (env): LLM_PROBE_INTERVAL seconds (default 10), LLM_PROBE_TIMEOUT (default 2),
+    LLM_MAX_PINNED_SESSIONS (default 10000).
+    """
+
+    def __init__(self, hosts: Sequence[str] = (), ttft_alpha: float = 0.3) -> None:
+        self.ttft_alpha = ttft_alpha
+        self.hosts: Dict[str, LLMHost] = {}
+        self._pins: "OrderedDict[str, str]" = OrderedDict()
+        self._max_pins = int(_env_float("LLM_MAX_PINNED_SESSIONS", 10000))
+        self._probe_task: Optional[asyncio.Task] = None
+        self.configure(hosts)
+
+    def configure(self, hosts: Sequence[str]) -> None:
+        self.hosts = {url: self.hosts.get(url) or LLMHost(url) for url in normalize_hosts(list(hosts))}
+        self._pins.clear()
+        for host in self.hosts.values():
+            LLM_HOST_HEALTHY.set(1 if host.healthy else 0, host=host.url)
+            LLM_HOST_INFLIGHT.set(host.inflight, host=host.url)
+
+    def __len__(self) -> int:
+        return len(self.hosts)
+
+    def routes(self, url: str) -> bool:
+        """True when requests for `url` are routed by this pool (it is one of the configured hosts)."""
+        return bool(url) and url.rstrip("/") in self.hosts
+
+    def urls(self) -> List[str]:
+        return list(self.hosts)
+
+    # ---- routing ----
+
+    def pick(self, session: Optional[str] = None, exclude: Sequence[str] = ()) -> str:
+        key = current_session.get() if session is None else session
+        candidates = [h for h in self.hosts.values() if h.url not in exclude]
+        if not candidates:
+            raise RuntimeError("No LLM host left to try")
+        pinned = self.hosts.get(self._pins.get(key, "")) if key else None
+        if pinned is not None and pinned.healthy and pinned.url not in exclude:
+            self._pins.move_to_end(key)
+            return pinned.url
+        # A host without measurements (just added) is assumed as fast as the fastest known one
+        known = [h.ttft for h in self.hosts.values() if h.ttft is not None]
+        default_ttft = min(known) if known else _DEFAULT_TTFT
+        healthy = [h for h in candidates if h.healthy]
+        if healthy:
+            chosen = min(healthy, key=lambda h: h.load(default_ttft))
+        else:
+            chosen = min(candidates, key=lambda h: (h.failures, h.load(default_ttft)))
+        if key:
+            self._pins[key] = chosen.url
+            self._pins.move_to_end(key)
+            while len(self._pins) > self._max_pins:
+                self._pins.popitem(last=False)
+        return chosen.url
+
+    def unpin(self, session: str) -> None:
+        self._pins.pop(session, None)
+
+    @contextmanager
+    def track(self, url: str) -> Iterator[None]:
+        host = self.hosts.get(url)
+        if host is None:
+            yield
+            return
+        host.inflight += 1
+        LLM_HOST_INFLIGHT.inc(host=url)
+        try:
+            yield
+        finally:
+            host.inflight -= 1
+            LLM_HOST_INFLIGHT.dec(host=url)
+
+    def record_ttft(self, url: str, seconds: float) -> None:
+        host = self.hosts.get(url)
+        if host is None:
+            return
+        host.ttft = seconds if host.ttft is None else host.ttft + self.ttft_alpha * (seconds - host.ttft)
+
+    def mark_ok(self, url: str) -> None:
+        host = self.hosts.get(url)
+        if host is None:
+            return
+        host.failures = 0
+        host.last_error = ""
+        if not host.healthy:
+            host.healthy = True
+            LLM_HOST_HEALTHY.set(1, host=url)
+
+    def mark_failed(self, url: str, error: BaseException) -> None:
+        host = self.hosts.get(url)
+        if host is None:
+            return
+        host.failures += 1
+        host.last_error = f"{type(error).__name__}: {error}"[:200]
+        if host.healthy:
+            host.healthy = False
+            LLM_HOST_HEALTHY.set(0, host=url)
+
+    # ---- health probes ----
+
+    async def probe(self, url: str, client: Optional[httpx.AsyncClient] = None) -> bool:
+        client = client or http_clients.get("llm")
+        try:
+            resp = await client.get(f"{url}/api/version", timeout=_env_float("LLM_PROBE_TIMEOUT", 2.0))
+            resp.raise_for_status()
+        except Exception as e:
+            self.mark_failed(url, e)
+            return False
+        self.mark_ok(url)
+        return True
+
+    async def probe_all(self) -> None:
+        await asyncio.gather(*(self.probe(url) for url in self.urls()))
+
+    async def _probe_loop(self, interval: float) -> None:
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(interval)
+
+    def start(self, interval: Optional[float] = None) -> None:
+        """Probe every host periodically (only useful with more than one host)."""
+        interval = _env_float("LLM_PROBE_INTERVAL", 10.0) if interval is None else interval
+        if self._probe_task is None and len(self.hosts) > 1 and interval > 0:
+            self._probe_task = asyncio.create_task(self._probe_loop(interval))
+
+    async def stop(self) -> None:
+        task, self._probe_task = self._probe_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def status(self) -> List[Dict[str, object]]:
+        return [
+            {
+                "host": h.url,
+                "healthy": h.healthy,
+                "inflight": h.inflight,
+                "ttft_ms": round(h.ttft * 1000.0, 1) if h.ttft is not None else None,
+                "last_error": h.last_error,
+            }
+            for h in self.hosts.values()
+        ]
+
+
+# Configured by server.py from llm.host / LLM_HOST; LLMTransport routes through it
+llm_pool = LLMHostPool()
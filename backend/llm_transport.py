@@ -1,11 +1,17 @@
 from __future__ import annotations
 
-import json
 import os
-from typing import AsyncGenerator
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional
 
 import httpx
 
+from http_clients import http_clients
+from llm_pool import llm_pool
+from metrics import UPSTREAM_INFLIGHT
+from ollama_stream import OllamaStreamDecoder
+from upstream_scheduler import Priority, schedulers
+
 
 class LLMTransport:
     """Low-level LLM transport for streaming and full text generation.
@@ -13,42 +19,101 @@ class LLMTransport:
     Currently supports the Ollama HTTP API. Provides:
     - stream(prompt): async token generator
     - generate(prompt): async full text
+    Requests go through the shared pooled "llm" client unless a client is passed in, and
+    wait for a slot from the "llm" upstream scheduler at the given priority.
+
+    When `host` is one of the configured LLM hosts (llm_pool), each request is routed by the
+    pool instead (session pinning, least-loaded, health). A request that fails to connect
+    or gets a 5xx before its first token is retried on the next host; once tokens have been
+    yielded the error is raised, and the failed host is skipped from the next request on.
+
+    Session reuse: pass the `context` array returned by a previous /api/generate call to
+    continue from Ollama's KV state instead of re-sending the conversation. After a stream
+    completes, `last_context` holds the new array to pass on the next turn and `last_stats`
+    Ollama's final counters (eval_count, eval_duration, ...; see ollama_stream.STAT_FIELDS).
     """
 
-    def __init__(self, host: str, model: str, provider: str) -> None:
+    def __init__(
+        self,
+        host: str,
+        model: str,
+        provider: str,
+        client: Optional[httpx.AsyncClient] = None,
+        keep_alive: Optional[str] = None,
+        priority: Priority = Priority.CHAT,
+    ) -> None:
         self.host = host.rstrip("/") if host else "http://127.0.0.1:11434"
         self.model = model
         self.provider = provider
+        self.client = client
+        # How long Ollama keeps the model (and its KV cache) loaded after a request, e.g. "30m"
+        self.keep_alive = keep_alive
+        self.last_context: Optional[List[int]] = None
+        self.last_stats: Dict[str, Any] = {}
+        self.priority = priority
 
-    async def _stream_ollama(self, prompt: str) -> AsyncGenerator[str, None]:
-        url = f"{self.host}/api/generate"
-        payload = {"model": self.model, "prompt": prompt, "stream": True}
-        async with httpx.AsyncClient() as client:
-            async with client.stream("POST", url, json=payload, timeout=None) as resp:
-                resp.raise_for_status()
-                async for line in resp.aiter_lines():
-                    if not line:
-                        continue
-                    try:
-                        data = json.loads(line)
-                    except json.JSONDecodeError:
-                        continue
-                    token = data.get("response")
-                    if token:
+    async def _stream_host(self, host: str, client: httpx.AsyncClient, payload: Dict[str, Any]) -> AsyncGenerator[str, None]:
+        url = f"{host}/api/generate"
+        async with schedulers.get("llm").slot(self.priority):
+            with UPSTREAM_INFLIGHT.track(upstream="llm"), llm_pool.track(host):
+                started = time.perf_counter()
+                first = True
+                decoder = OllamaStreamDecoder()
+                async with client.stream("POST", url, json=payload) as resp:
+                    resp.raise_for_status()
+                    async for token in decoder.tokens(resp.aiter_bytes()):
+                        if first:
+                            first = False
+                            llm_pool.record_ttft(host, time.perf_counter() - started)
                         yield token
-                    if data.get("done") is True:
-                        break
+                self.last_context = decoder.context
+                self.last_stats = decoder.stats
+
+    async def _stream_ollama(self, prompt: str, context: Optional[List[int]] = None) -> AsyncGenerator[str, None]:
+        payload: Dict[str, Any] = {"model": self.model, "prompt": prompt, "stream": True}
+        if context:
+            payload["context"] = context
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        self.last_context = None
+        self.last_stats = {}
+        client = self.client or http_clients.get("llm")
+        if not llm_pool.routes(self.host):
+            async for token in self._stream_host(self.host, client, payload):
+                yield token
+            return
+
+        tried: List[str] = []
+        while True:
+            host = llm_pool.pick(exclude=tried)
+            tried.append(host)
+            yielded = False
+            try:
+                async for token in self._stream_host(host, client, payload):
+                    yielded = True
+                    yield token
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500:
+                    raise
+                llm_pool.mark_failed(host, e)
+                if yielded or len(tried) >= len(llm_pool):
+                    raise
+                continue
+            llm_pool.mark_ok(host)
+            return
 
-    async def stream(self, prompt: str) -> AsyncGenerator[str, None]:
+    async def stream(self, prompt: str, context: Optional[List[int]] = None) -> AsyncGenerator[str, None]:
         if self.provider != "ollama":
             raise RuntimeError(f"Unsupported provider: {self.provider}")
         enable_logs = bool(int(os.getenv("LLM_DEBUG", "0")))
         if enable_logs:
             print("\n===== LLM REQUEST =====")
+            if context:
+                print(f"(continuing from {len(context)} cached context tokens)")
             print(prompt)
             print("===== STREAM START =====")
         buffer = []
-        async for tok in self._stream_ollama(prompt):
+        async for tok in self._stream_ollama(prompt, context=context):
             if tok:
                 buffer.append(tok)
                 yield tok
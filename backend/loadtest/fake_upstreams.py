@@ -0,0 +1,134 @@
+"""In-process stand-ins for Ollama's /api/generate and the TTS /v1/audio/speech endpoint.
+
+Only the parts of the APIs that server.py uses are implemented:
+- POST /api/generate: NDJSON stream (or one JSON object with "stream": false). Emotion
+  selector prompts (single or batched) get the first allowed emotion per item; everything
+  else gets `reply_tokens`
+  tokens after `first_token_ms`, paced at `tokens_per_sec`. The final line carries a
+  `context` array and eval stats like Ollama's.
+- POST /v1/audio/speech: `tts_bytes` of audio after `tts_latency_ms` (+/- jitter).
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import re
+from dataclasses import dataclass
+from typing import AsyncGenerator, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
+
+_ALLOWED_RE = re.compile(r"Allowed emotions \(choose exactly one, return only the word\): ([^\n]*)\.")
+# Batched classification prompts (emotion_batcher.py): one "Allowed: ..." line per item
+_BATCH_ALLOWED_RE = re.compile(r"^Allowed: ([^\n]*)$", re.MULTILINE)
+_WORDS = "sure thing I think that sounds like a lot of fun let's play a game tonight and see how far we get".split()
+
+
+@dataclass
+class FakeSettings:
+    first_token_ms: float = 150.0
+    tokens_per_sec: float = 40.0
+    reply_tokens: int = 60
+    tts_latency_ms: float = 250.0
+    tts_jitter_ms: float = 50.0
+    tts_bytes: int = 48 * 1024
+
+
+class FakeStats:
+    def __init__(self) -> None:
+        self.generate_requests = 0
+        self.speech_requests = 0
+        self.inflight = 0
+        self.max_inflight = 0
+
+    def enter(self) -> None:
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+
+    def leave(self) -> None:
+        self.inflight -= 1
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "generate_requests": self.generate_requests,
+            "speech_requests": self.speech_requests,
+            "max_inflight": self.max_inflight,
+        }
+
+
+def _reply_tokens(count: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    tokens: List[str] = []
+    for i in range(count):
+        tokens.append((" " if i else "") + rng.choice(_WORDS))
+        if i % 12 == 11:
+            tokens.append(".")
+    tokens.append("!")
+    return tokens
+
+
+def create_app(settings: FakeSettings, stats: FakeStats) -> FastAPI:
+    app = FastAPI()
+    audio = bytes(random.Random(0).getrandbits(8) for _ in range(min(settings.tts_bytes, 4096)))
+    audio = (audio * (settings.tts_bytes // max(1, len(audio)) + 1))[: settings.tts_bytes]
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        stats.generate_requests += 1
+        prompt = body.get("prompt") or ""
+        m = _ALLOWED_RE.search(prompt)
+        batch = _BATCH_ALLOWED_RE.findall(prompt)
+        if m:
+            tokens = [m.group(1).split(",")[0].strip() or "Happy"]
+        elif batch:
+            tokens = [f"{n}: {line.split(',')[0].strip() or 'Happy'}\n" for n, line in enumerate(batch, 1)]
+        else:
+            # Different text per request, so the TTS cache does not hide TTS load
+            tokens = _reply_tokens(settings.reply_tokens, stats.generate_requests)
+        context = list(range(len(prompt) // 4 + len(tokens)))
+        done = {
+            "response": "",
+            "done": True,
+            "context": context,
+            "eval_count": len(tokens),
+            "prompt_eval_count": len(prompt) // 4,
+        }
+
+        if body.get("stream") is False:
+            stats.enter()
+            try:
+                await asyncio.sleep(settings.first_token_ms / 1000.0 + len(tokens) / max(settings.tokens_per_sec, 1e-3))
+            finally:
+                stats.leave()
+            return dict(done, response="".join(tokens))
+
+        async def lines() -> AsyncGenerator[str, None]:
+            stats.enter()
+            try:
+                await asyncio.sleep(settings.first_token_ms / 1000.0)
+                interval = 1.0 / max(settings.tokens_per_sec, 1e-3)
+                for tok in tokens:
+                    yield json.dumps({"model": body.get("model"), "response": tok, "done": False}) + "\n"
+                    await asyncio.sleep(interval)
+                yield json.dumps(done) + "\n"
+            finally:
+                stats.leave()
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.post("/v1/audio/speech")
+    async def speech(request: Request):
+        await request.json()
+        stats.speech_requests += 1
+        stats.enter()
+        try:
+            jitter = random.uniform(-settings.tts_jitter_ms, settings.tts_jitter_ms)
+            await asyncio.sleep(max(0.0, settings.tts_latency_ms + jitter) / 1000.0)
+        finally:
+            stats.leave()
+        return Response(audio, media_type="audio/mpeg")
+
+    return app
@@ -0,0 +1,357 @@
+"""Load test: N concurrent WebSocket sessions against server.py backed by fake upstreams.
+
+Usage (from backend/):
+  python loadtest/run_load.py                                  # levels 1,4,16,64
+  python loadtest/run_load.py --levels 8,32 --turns 5 --json results/load.json
+  TTS_PIPELINE=1 python loadtest/run_load.py --tokens-per-sec 60 --tts-latency-ms 400
+
+The fake Ollama/TTS servers (fake_upstreams.py) run inside this process. server.py is started
+as a subprocess pointed at them (all other env vars pass through, so server options can be
+compared; TEXT_STREAM defaults to 1), unless --server-url targets a server that is already running.
+
+Per concurrency level every session runs --turns turns and the client side records, from
+sending the message:
+  ttft         time to first token: the first live text "chunk" (sessions negotiate text_stream)
+  emotion      first "emotion" frame
+  audio        first "audio" frame
+  turn         "end" frame
+p50/p95/p99 are reported for each, with server CPU (% of one core) and peak RSS from /proc.
+Without live text (pipelined mode, or a server without TEXT_STREAM=1) the first "chunk" only
+arrives with the first audio, so ttft is taken from the server's
+vtuber_turn_phase_seconds{phase="llm_ttft"} histogram for the level instead, interpolated within
+its buckets (coarse; "ttft_source" in the results says which was used, "*" marks it in the table).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+import uvicorn
+import websockets
+
+from fake_upstreams import FakeSettings, FakeStats, create_app
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+METRICS = ("ttft", "emotion", "audio", "turn")
+PROMPTS = [
+    "hi! how are you today?",
+    "what game should we play tonight?",
+    "tell me something fun about cats",
+    "do you like rhythm games?",
+    "good night, see you tomorrow",
+]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def _ttft_buckets(metrics_text: str) -> Dict[float, float]:
+    """Cumulative llm_ttft bucket counts by upper bound from a /metrics scrape."""
+    buckets: Dict[float, float] = {}
+    prefix = 'vtuber_turn_phase_seconds_bucket{phase="llm_ttft",le="'
+    for line in metrics_text.splitlines():
+        if line.startswith(prefix):
+            bound, _, count = line[len(prefix):].partition('"} ')
+            buckets[float("inf") if bound == "+Inf" else float(bound)] = float(count)
+    return buckets
+
+
+def _histogram_percentile(before: Dict[float, float], after: Dict[float, float], pct: float) -> float:
+    """Percentile of the observations between two scrapes, linear within a bucket (seconds)."""
+    bounds = sorted(after)
+    counts = [after[b] - before.get(b, 0.0) for b in bounds]
+    if not counts or counts[-1] <= 0:
+        return 0.0
+    rank = pct / 100.0 * counts[-1]
+    lower, prev = 0.0, 0.0
+    for bound, cumulative in zip(bounds, counts):
+        if cumulative >= rank:
+            if bound == float("inf"):
+                return lower
+            in_bucket = cumulative - prev
+            return lower + (bound - lower) * ((rank - prev) / in_bucket if in_bucket else 1.0)
+        lower, prev = bound, cumulative
+    return lower
+
+
+def _metrics_url(ws_url: str) -> str:
+    """http(s)://host:port/metrics for a ws(s)://host:port/path URL."""
+    scheme, _, rest = ws_url.partition("://")
+    return f"{'https' if scheme == 'wss' else 'http'}://{rest.split('/', 1)[0]}/metrics"
+
+
+async def _scrape_ttft(metrics_url: str) -> Dict[float, float]:
+    try:
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            resp = await client.get(metrics_url)
+            resp.raise_for_status()
+    except httpx.HTTPError:
+        return {}
+    return _ttft_buckets(resp.text)
+
+
+class ProcSampler:
+    """Samples CPU time and RSS of a process from /proc (Linux only)."""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.2) -> None:
+        self.pid = pid
+        self.interval = interval
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self.peak_rss = 0
+        self._task: Optional[asyncio.Task] = None
+        self._start_cpu = 0.0
+        self._start_wall = 0.0
+
+    def _cpu_seconds(self) -> float:
+        with open(f"/proc/{self.pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        # utime, stime are fields 14 and 15; fields[0] here is field 3 (state)
+        return (int(fields[11]) + int(fields[12])) / self._ticks
+
+    def _rss_bytes(self) -> int:
+        with open(f"/proc/{self.pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    async def _run(self) -> None:
+        while True:
+            self.peak_rss = max(self.peak_rss, self._rss_bytes())
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self.pid is None:
+            return
+        self.peak_rss = 0
+        self._start_cpu = self._cpu_seconds()
+        self._start_wall = time.perf_counter()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> Dict[str, float]:
+        if self.pid is None or self._task is None:
+            return {}
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        wall = time.perf_counter() - self._start_wall
+        cpu = self._cpu_seconds() - self._start_cpu
+        self.peak_rss = max(self.peak_rss, self._rss_bytes())
+        return {"cpu_percent": 100.0 * cpu / wall if wall > 0 else 0.0, "peak_rss_mb": self.peak_rss / 2**20}
+
+
+async def run_session(url: str, turns: int, think_time: float, binary: bool, index: int) -> Dict[str, Any]:
+    samples: Dict[str, List[float]] = {m: [] for m in METRICS}
+    errors = 0
+    audio_bytes = 0
+    live_text = False
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            await ws.send(json.dumps({"type": "hello", "audio": "binary" if binary else "base64", "text_stream": True}))
+            live_text = json.loads(await ws.recv()).get("text_stream") is True
+            for turn in range(turns):
+                seen: Dict[str, float] = {}
+                t0 = time.perf_counter()
+                await ws.send(json.dumps({"prompt": PROMPTS[(index + turn) % len(PROMPTS)]}))
+                while True:
+                    frame = await ws.recv()
+                    now = time.perf_counter() - t0
+                    if isinstance(frame, bytes):
+                        audio_bytes += len(frame)
+                        continue
+                    kind = json.loads(frame).get("type")
+                    if kind == "chunk" and live_text:
+                        seen.setdefault("ttft", now)
+                    elif kind in ("emotion", "audio"):
+                        seen.setdefault(kind, now)
+                    elif kind == "end":
+                        seen["turn"] = now
+                        break
+                    elif kind == "error":
+                        errors += 1
+                        break
+                for name, value in seen.items():
+                    samples[name].append(value)
+                if think_time > 0:
+                    await asyncio.sleep(think_time)
+    except Exception:
+        errors += 1
+    return {"samples": samples, "errors": errors, "audio_bytes": audio_bytes, "live_text": live_text}
+
+
+async def run_level(
+    url: str, sessions: int, turns: int, think_time: float, binary: bool, sampler: ProcSampler, metrics_url: str
+) -> Dict[str, Any]:
+    ttft_before = await _scrape_ttft(metrics_url)
+    sampler.start()
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(run_session(url, turns, think_time, binary, i) for i in range(sessions)))
+    wall = time.perf_counter() - t0
+    proc = await sampler.stop()
+    ttft_after = await _scrape_ttft(metrics_url)
+
+    merged: Dict[str, List[float]] = {m: [] for m in METRICS}
+    for res in results:
+        for name, values in res["samples"].items():
+            merged[name].extend(values)
+    out: Dict[str, Any] = {
+        "sessions": sessions,
+        "turns_completed": len(merged["turn"]),
+        "errors": sum(r["errors"] for r in results),
+        "wall_s": wall,
+        "turns_per_sec": len(merged["turn"]) / wall if wall > 0 else 0.0,
+        "audio_mb": sum(r["audio_bytes"] for r in results) / 2**20,
+    }
+    for name, values in merged.items():
+        out[name] = {f"p{p}": _percentile(values, p) * 1000.0 for p in (50, 95, 99)}
+    out["ttft_source"] = "client"
+    if not merged["ttft"]:
+        out["ttft_source"] = "server_histogram" if ttft_after else "unavailable"
+        out["ttft"] = {f"p{p}": _histogram_percentile(ttft_before, ttft_after, p) * 1000.0 for p in (50, 95, 99)}
+    out.update(proc)
+    return out
+
+
+async def _wait_for_port(host: str, port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Nothing listening on {host}:{port} after {timeout}s")
+            await asyncio.sleep(0.1)
+
+
+def _print_level(res: Dict[str, Any]) -> None:
+    line = f"{res['sessions']:>5} {res['turns_completed']:>6} {res['errors']:>4} {res['turns_per_sec']:>7.1f}"
+    for name in METRICS:
+        m = res[name]
+        mark = "*" if name == "ttft" and res.get("ttft_source") != "client" else " "
+        line += f" {mark}{m['p50']:>6.0f}/{m['p95']:>6.0f}/{m['p99']:>6.0f}"
+    if "cpu_percent" in res:
+        line += f"  {res['cpu_percent']:>5.0f}% {res['peak_rss_mb']:>7.1f}"
+    print(line)
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    settings = FakeSettings(
+        first_token_ms=args.first_token_ms,
+        tokens_per_sec=args.tokens_per_sec,
+        reply_tokens=args.reply_tokens,
+        tts_latency_ms=args.tts_latency_ms,
+        tts_jitter_ms=args.tts_jitter_ms,
+        tts_bytes=args.tts_bytes,
+    )
+    stats = FakeStats()
+    fake = uvicorn.Server(
+        uvicorn.Config(create_app(settings, stats), host="127.0.0.1", port=args.fake_port, log_level="warning")
+    )
+    fake_task = asyncio.create_task(fake.serve())
+    await _wait_for_port("127.0.0.1", args.fake_port, 10)
+
+    proc: Optional[subprocess.Popen] = None
+    url = args.server_url
+    pid = args.server_pid
+    if not url:
+        upstream = f"http://127.0.0.1:{args.fake_port}"
+        env = dict(os.environ, LLM_HOST=upstream, TTS_HOST=upstream, UVICORN_PORT=str(args.server_port))
+        # Live text lets the sessions see the first token (TEXT_STREAM=0 to measure without it)
+        env.setdefault("TEXT_STREAM", "1")
+        env.pop("OLLAMA_HOST", None)
+        proc = subprocess.Popen(
+            [sys.executable, "server.py"],
+            cwd=BACKEND_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL if not args.server_log else None,
+            stderr=subprocess.DEVNULL if not args.server_log else None,
+        )
+        pid = proc.pid
+        url = f"ws://127.0.0.1:{args.server_port}{args.ws_path}"
+        await _wait_for_port("127.0.0.1", args.server_port, 30)
+    metrics_url = args.metrics_url or _metrics_url(url)
+
+    sampler = ProcSampler(pid)
+    levels: List[Dict[str, Any]] = []
+    try:
+        header = f"{'conc':>5} {'turns':>6} {'err':>4} {'turns/s':>7}"
+        for name in METRICS:
+            header += f"  {name + ' p50/95/99 ms':>20}"
+        if pid is not None:
+            header += f"  {'cpu':>6} {'rss MB':>7}"
+        print(header)
+        for sessions in args.levels:
+            res = await run_level(url, sessions, args.turns, args.think_time, not args.base64, sampler, metrics_url)
+            levels.append(res)
+            _print_level(res)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        fake.should_exit = True
+        await fake_task
+
+    print(f"\nfake upstreams: {stats.as_dict()}")
+    if args.json:
+        out = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "fake": vars(settings),
+            "fake_stats": stats.as_dict(),
+            "turns_per_session": args.turns,
+            "binary_audio": not args.base64,
+            "server_env": {k: v for k, v in os.environ.items() if k.startswith(("TTS_", "LLM_", "EMOTION_", "HTTP"))},
+            "levels": levels,
+        }
+        path = Path(args.json)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(out, indent=2), encoding="utf-8")
+        print(f"Wrote {path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="1,4,16,64", help="Comma-separated session counts")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per session")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds between turns")
+    parser.add_argument("--base64", action="store_true", help="Receive base64 audio instead of binary frames")
+    parser.add_argument("--first-token-ms", type=float, default=150.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--tts-latency-ms", type=float, default=250.0)
+    parser.add_argument("--tts-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--tts-bytes", type=int, default=48 * 1024)
+    parser.add_argument("--fake-port", type=int, default=9300)
+    parser.add_argument("--server-port", type=int, default=9301)
+    parser.add_argument("--ws-path", default="/ws")
+    parser.add_argument("--server-url", default="", help="Use a running server (ws://...) instead of starting one")
+    parser.add_argument("--metrics-url", default="", help="Server /metrics URL (default: derived from the WebSocket URL)")
+    parser.add_argument("--server-pid", type=int, default=None, help="PID of --server-url's process for CPU/RSS")
+    parser.add_argument("--server-log", action="store_true", help="Show the server subprocess output")
+    parser.add_argument("--json", default="", help="Write results to this path")
+    args = parser.parse_args()
+    args.levels = [int(x) for x in args.levels.split(",") if x.strip()]
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
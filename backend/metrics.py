@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import contextvars
+import json
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+# Seconds; covers sub-millisecond prompt builds up to multi-second generations
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 50.0, 75.0, 100.0, 150.0, 200.0, 300.0)
+
+LabelKey = Tuple[str, ...]
+M = TypeVar("M", bound="_Metric")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, k)} {_format_value(v)}" for k, v in self._values.items()
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        """Count the enclosed block as in progress."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, k)} {_format_value(v)}" for k, v in self._values.items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket..., +Inf count], sum
+        self._series: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = ([0] * (len(self.buckets) + 1), [0.0])
+            self._series[key] = series
+        counts, total = series
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        total[0] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text exposition format (0.0.4).
+
+    Collectors are callables run at scrape time that return extra pre-rendered lines, for
+    values that live elsewhere (e.g. the TTS cache counters). They are keyed by name, so a
+    module that is imported twice (`python server.py` runs it as __main__ and as "server")
+    replaces its collector instead of adding a second one.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+        self._collectors: Dict[str, Callable[[], List[str]]] = {}
+
+    def register(self, metric: M) -> M:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, name: str, collector: Callable[[], List[str]]) -> None:
+        self._collectors[name] = collector
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors.values():
+            try:
+                lines.extend(collector())
+            except Exception:
+                continue
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+PHASE_SECONDS = registry.register(Histogram(
+    "vtuber_turn_phase_seconds",
+    "Duration of each phase of a chat turn.",
+    labelnames=("phase",),
+))
+LLM_TOKENS_PER_SECOND = registry.register(Histogram(
+    "vtuber_llm_tokens_per_second",
+    "Streamed chat tokens per second after the first token.",
+    buckets=RATE_BUCKETS,
+))
+TURNS_TOTAL = registry.register(Counter(
+    "vtuber_turns_total",
+    "Chat turns handled, by outcome.",
+    labelnames=("outcome",),
+))
+EMOTION_SOURCE = registry.register(Counter(
+    "vtuber_emotion_source_total",
+    "Emotions sent to the avatar, by where they came from (inline tag or classifier).",
+    labelnames=("source",),
+))
+ACTIVE_SESSIONS = registry.register(Gauge(
+    "vtuber_active_sessions",
+    "Open WebSocket chat sessions.",
+))
+UPSTREAM_INFLIGHT = registry.register(Gauge(
+    "vtuber_upstream_inflight_requests",
+    "Requests currently in flight to each upstream.",
+    labelnames=("upstream",),
+))
+ACTIVE_SESSIONS.set(0)
+UPSTREAM_INFLIGHT.set(0, upstream="llm")
+UPSTREAM_INFLIGHT.set(0, upstream="tts")
+
+
+class TurnTrace:
+    """Phase durations of one chat turn, collected from spans anywhere in the turn's tasks."""
+
+    __slots__ = ("started", "phases")
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.phases: Dict[str, List[float]] = {}
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases.setdefault(phase, []).append(seconds)
+
+    def as_dict(self) -> Dict[str, object]:
+        out: Dict[str, object] = {"turn_ms": round((time.perf_counter() - self.started) * 1000.0, 2)}
+        for phase, values in self.phases.items():
+            out[f"{phase}_ms"] = round(sum(values) * 1000.0, 2)
+            if len(values) > 1:
+                out[f"{phase}_count"] = len(values)
+        return out
+
+    def log_line(self) -> str:
+        return json.dumps({"event": "turn_trace", **self.as_dict()})
+
+
+# Tasks created during a turn copy the context, so spans in them land on the same trace
+current_trace: contextvars.ContextVar[Optional[TurnTrace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+def record_phase(phase: str, seconds: float) -> None:
+    PHASE_SECONDS.observe(seconds, phase=phase)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(phase, seconds)
+
+
+@contextmanager
+def span(phase: str) -> Iterator[None]:
+    """Time the enclosed block as one `phase` (histogram + the current turn's trace)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - t0)
+
+
+def finish_turn(trace: TurnTrace, outcome: str, log: bool = False) -> None:
+    """Close a turn's trace: record its total duration and outcome, optionally log it as JSON."""
+    record_phase("turn", time.perf_counter() - trace.started)
+    TURNS_TOTAL.inc(outcome=outcome)
+    if log:
+        print(trace.log_line(), flush=True)
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import json
+from typing import Any, AsyncGenerator, AsyncIterable, Dict, List, Optional
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    _loads = json.loads
+    JSON_BACKEND = "json"
+
+_scanstring = json.decoder.scanstring
+
+# Layout of a non-final line as Ollama writes it: {"model":..,"created_at":..,"response":"..","done":false}
+_RESPONSE_KEY = b'"response":"'
+_NOT_DONE_END = b'"done":false}'
+
+# Fields of the final line worth keeping (the context array is kept separately)
+STAT_FIELDS = (
+    "total_duration",
+    "load_duration",
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "eval_count",
+    "eval_duration",
+    "done_reason",
+)
+
+
+def _fast_token(line: bytes) -> Optional[str]:
+    """The token of a non-final line in Ollama's usual layout, or None to fall back to a full parse.
+
+    Quotes inside JSON strings are always escaped, so the unescaped markers can only be keys:
+    a line ending in "done":false} is a top-level non-final line, and the token is read
+    straight from the bytes (json's C string scanner only when it contains escapes).
+    """
+    if not line.endswith(_NOT_DONE_END):
+        return None
+    start = line.find(_RESPONSE_KEY)
+    if start < 0:
+        return None
+    start += len(_RESPONSE_KEY)
+    end = line.find(b'"', start)
+    if end < 0:
+        return None
+    try:
+        if line.find(b"\\", start, end) < 0:
+            return line[start:end].decode("utf-8")
+        return _scanstring(line[start:].decode("utf-8"), 0)[0]
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+class OllamaStreamDecoder:
+    """Incremental decoder for Ollama's streamed /api/generate NDJSON.
+
+    feed() takes raw body chunks (resp.aiter_bytes()) and returns the tokens completed by
+    them; lines are split on b"\\n" in place and only a line spanning two chunks is copied.
+    Token lines take a byte-level fast path; other lines are parsed with orjson when it is
+    installed (json otherwise). After the final line `done` is set, `context` holds Ollama's
+    context array (if any) and `stats` its counters and durations (nanoseconds).
+    Malformed lines are skipped, as before.
+    """
+
+    __slots__ = ("done", "context", "stats", "_partial")
+
+    def __init__(self) -> None:
+        self.done = False
+        self.context: Optional[List[int]] = None
+        self.stats: Dict[str, Any] = {}
+        self._partial = bytearray()
+
+    def _decode_line(self, line: bytes, tokens: List[str]) -> None:
+        if line.endswith(b"\r"):
+            line = line[:-1]
+        if not line:
+            return
+        token = _fast_token(line)
+        if token is not None:
+            if token:
+                tokens.append(token)
+            return
+        try:
+            data = _loads(line)
+        except ValueError:
+            return
+        if not isinstance(data, dict):
+            return
+        token = data.get("response")
+        if token and isinstance(token, str):
+            tokens.append(token)
+        if data.get("done") is True:
+            self.done = True
+            ctx = data.get("context")
+            self.context = ctx if isinstance(ctx, list) and ctx else None
+            self.stats = {k: data[k] for k in STAT_FIELDS if k in data}
+
+    def feed(self, chunk: bytes) -> List[str]:
+        tokens: List[str] = []
+        start = 0
+        while not self.done:
+            nl = chunk.find(b"\n", start)
+            if nl < 0:
+                break
+            if self._partial:
+                self._partial += memoryview(chunk)[start:nl]
+                line = bytes(self._partial)
+                self._partial.clear()
+            else:
+                line = chunk[start:nl]
+            start = nl + 1
+            self._decode_line(line, tokens)
+        if not self.done and start < len(chunk):
+            self._partial += memoryview(chunk)[start:]
+        return tokens
+
+    def flush(self) -> List[str]:
+        """Decode a last line that had no trailing newline."""
+        tokens: List[str] = []
+        if self._partial and not self.done:
+            line = bytes(self._partial)
+            self._partial.clear()
+            self._decode_line(line, tokens)
+        return tokens
+
+    async def tokens(self, chunks: AsyncIterable[bytes]) -> AsyncGenerator[str, None]:
+        """Tokens from a body chunk iterator, stopping at the final line."""
+        async for chunk in chunks:
+            for token in self.feed(chunk):
+                yield token
+            if self.done:
+                return
+        for token in self.flush():
+            yield token
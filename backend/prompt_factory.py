@@ -1,6 +1,10 @@
 from __future__ import annotations
 
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Union
+
+from conversation_store import ConversationStore
+
+History = Union[ConversationStore, List[Dict[str, str]], None]
 
 
 class PromptFactory:
@@ -10,17 +14,27 @@ class PromptFactory:
     - Dynamic list of allowed emotion names
     - Global style/behavior rules
     And composes a final prompt with the user text for streaming to the LLM.
+    With emotion_tags, the model is asked to open each reply with one [Emotion] tag from the
+    allowed list (parsed out of the stream by ChatStreamer).
     """
 
-    def __init__(self, persona_prompt: str, emotion_names: List[str]):
+    def __init__(self, persona_prompt: str, emotion_names: List[str], emotion_tags: bool = False):
         self.persona_prompt = (persona_prompt or "").strip()
         self.emotion_names = [e.strip() for e in (emotion_names or []) if isinstance(e, str) and e.strip()]
+        self.emotion_tags = bool(emotion_tags) and bool(self.emotion_names)
 
     def build_system_prompt(self) -> str:
         parts: List[str] = []
         if self.persona_prompt:
             parts.append(self.persona_prompt)
-        # No emotion-tag instruction. The assistant should reply in plain English, concise.
+        if self.emotion_tags:
+            tags = ", ".join(f"[{name}]" for name in self.emotion_names)
+            parts.append(
+                f"Start every reply with exactly one emotion tag that fits your reply, chosen from: {tags}. "
+                f"Write the tag first, then the reply (for example: [{self.emotion_names[0]}] Sure, let's do it!). "
+                "Do not use square brackets anywhere else."
+            )
+        # Otherwise no emotion-tag instruction. The assistant should reply in plain English, concise.
         parts.append(
             "Write only in plain English. "
             "Never use emojis or emoticons. "
@@ -32,10 +46,14 @@ class PromptFactory:
 
     def _format_history(
         self,
-        history: Optional[List[Dict[str, str]]],
+        history: History,
         max_turns: int,
         max_chars: int,
+        max_tokens: int = 0,
     ) -> str:
+        if isinstance(history, ConversationStore):
+            # Whole-turn windowing with cached per-turn text; the pending user turn is excluded
+            return history.format_window(max_turns=max_turns, max_chars=max_chars, max_tokens=max_tokens)
         if not history:
             return ""
 
@@ -81,13 +99,19 @@ class PromptFactory:
     def build_final_prompt(
         self,
         user_text: str,
-        history: Optional[List[Dict[str, str]]] = None,
+        history: History = None,
         max_turns: int = 8,
         max_chars: int = 4000,
+        max_tokens: int = 0,
     ) -> str:
         system = self.build_system_prompt()
-        history_block = self._format_history(history, max_turns=max_turns, max_chars=max_chars)
+        history_block = self._format_history(history, max_turns=max_turns, max_chars=max_chars, max_tokens=max_tokens)
         parts: List[str] = [system]
+        summary = history.summary if isinstance(history, ConversationStore) else ""
+        if summary:
+            # Rolling summary of turns that no longer fit the window (history_compactor.py)
+            parts.append("Summary of earlier conversation:")
+            parts.append(summary)
         if history_block:
             parts.append("Conversation so far:")
             parts.append(history_block)
@@ -95,4 +119,10 @@ class PromptFactory:
         parts.append("Assistant:")
         return "\n\n".join(parts)
 
+    def build_continuation_prompt(self, user_text: str) -> str:
+        """Prompt for a turn that continues from a cached Ollama context.
 
+        The system prompt and earlier turns already live in the model's KV state, so only
+        the new user turn is sent (and prefilled).
+        """
+        return f"User: {user_text or ''}\n\nAssistant:"
@@ -1,61 +1,33 @@
+import asyncio
 import json
-from typing import AsyncGenerator
+from typing import AsyncGenerator, AsyncIterator, Any, Dict, Optional, Tuple
 import os
 from pathlib import Path
-import re
-import base64
+from contextlib import asynccontextmanager
 
 import uvicorn
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 import httpx
+from conversation_store import ConversationStore
+from history_compactor import HistoryCompactor
 from prompt_factory import PromptFactory
 from chat_streamer import ChatStreamer
-from llm_transport import LLMTransport
+from http_clients import http_clients
+from deadline import TurnDeadline
+from llm_pool import llm_pool, normalize_hosts
+from emotion_classifier import EmotionClassifier, build_emotion_classifier, classify_emotion_llm
+from metrics import ACTIVE_SESSIONS, EMOTION_SOURCE, UPSTREAM_INFLIGHT, TurnTrace, current_trace, finish_turn, registry, span
+from tts_cache import TTSCache
+from tts_hosts import tts_pool
+from turn_cache import AudioRef, CachedTurn, TurnCache
+from warmup import Warmup, preload_ollama_model
+from upstream_scheduler import UpstreamBusy, current_session, schedulers
+from ws_protocol import ClientOptions, TextStreamWriter, is_hello, send_audio, send_audio_stream
+from tts_pipeline import SentenceSplitter, SpeechPipeline, is_speakable
 from typing import List
 
-async def classify_emotion_llm(
-    client: httpx.AsyncClient,
-    host: str,
-    model: str,
-    last_user: str,
-    assistant: str,
-    allowed: List[str],
-) -> str:
-    """Call the LLM to choose exactly one emotion from the allowed list.
-
-    The model must return only the emotion word, nothing else.
-    """
-    allowed_clean = [e for e in (allowed or []) if isinstance(e, str) and e.strip()]
-    allowed_line = ", ".join(allowed_clean) if allowed_clean else "Happy, Sad, Excited, Thinking, Annoyed"
-    prompt = (
-        "You are an emotion selector for a VTuber.\n"
-        "Given the user's message and the assistant's reply, pick exactly one emotion from the allowed list that best matches the assistant's tone.\n"
-        f"Allowed emotions (choose exactly one, return only the word): {allowed_line}.\n\n"
-        f"User: {last_user or ''}\n"
-        f"Assistant: {assistant or ''}\n\n"
-        "Answer with only the emotion word (must be exactly as listed in Allowed)."
-    )
-
-    # Use core LLM for logging and generation
-    core = LLMTransport(host, model, "ollama")
-    text = await core.generate(prompt)
-    # Keep ASCII letters and spaces only
-    text = re.sub(r"[^A-Za-z\s]", " ", text).strip()
-    # Try exact match first
-    allowed_map = {e.lower(): e for e in allowed_clean}
-    parts = [p for p in text.split() if p]
-    for p in parts:
-        key = p.lower()
-        if key in allowed_map:
-            return allowed_map[key]
-    # Fallback: scan full text for any allowed word
-    for e in allowed_clean:
-        if re.search(rf"(?i)(?<![A-Za-z]){re.escape(e)}(?![A-Za-z])", text):
-            return e
-    return allowed_clean[0] if allowed_clean else "Neutral"
-
-
 # Resolve project root config regardless of CWD (works for local and Docker)
 ROOT_CONFIG_PATH = str((Path(__file__).resolve().parent.parent / "vtuber.config.json").resolve())
 
@@ -71,8 +43,10 @@ def load_llm_config():
     llm = cfg.get("llm", {}) or {}
     provider = llm.get("provider", "ollama")
     model = llm.get("model", "qwen2.5")
-    # Allow overriding host via environment so containers can call host services
-    host = os.getenv("LLM_HOST") or os.getenv("OLLAMA_HOST") or llm.get("host", "http://127.0.0.1:11434")
+    # Allow overriding host via environment so containers can call host services.
+    # Several hosts (JSON list, or comma-separated) serving the same model form a routed pool.
+    hosts = normalize_hosts(os.getenv("LLM_HOST") or os.getenv("OLLAMA_HOST") or llm.get("host", "http://127.0.0.1:11434"))
+    host = hosts[0] if hosts else "http://127.0.0.1:11434"
     ws_path = llm.get("wsPath", "/ws")
 
     # Persona and emotions
@@ -96,49 +70,170 @@ def load_llm_config():
         tts_voice = None
 
     # TTS settings with env overrides
-    tts_host = os.getenv("TTS_HOST", "https://tts.tarunravi.com").rstrip("/")
+    # Several TTS endpoints (comma-separated) serving the same voices get hedged requests
+    tts_hosts = normalize_hosts(os.getenv("TTS_HOST", "https://tts.tarunravi.com"))
+    tts_host = tts_hosts[0] if tts_hosts else "https://tts.tarunravi.com"
     tts_model = os.getenv("TTS_MODEL", "kokoro")
     try:
         tts_speed = float(os.getenv("TTS_SPEED", "1"))
     except Exception:
         tts_speed = 1.0
     tts_lang = os.getenv("TTS_LANG_CODE", "en-US")
+    # Forward TTS audio to binary-audio clients as it is synthesized instead of buffering each clip
+    tts_stream = bool(int(os.getenv("TTS_STREAM", "0")))
+    try:
+        tts_stream_queue = max(1, int(os.getenv("TTS_STREAM_QUEUE", "32")))
+    except Exception:
+        tts_stream_queue = 32
+    # Live reply text for clients that ask for it (text-only / muted), coalesced into few frames
+    text_stream = bool(int(os.getenv("TEXT_STREAM", "0")))
+    try:
+        text_stream_window_ms = max(0.0, float(os.getenv("TEXT_STREAM_WINDOW_MS", "30")))
+        text_stream_max_chars = max(1, int(os.getenv("TEXT_STREAM_MAX_CHARS", "1024")))
+    except Exception:
+        text_stream_window_ms, text_stream_max_chars = 30.0, 1024
+    # Lip-sync: clients that ask for it get WAV from TTS and a mouth-opening envelope ahead of each clip
+    lipsync = bool(int(os.getenv("LIPSYNC", "0")))
+    try:
+        lipsync_frame_ms = max(5, int(os.getenv("LIPSYNC_FRAME_MS", "20")))
+    except Exception:
+        lipsync_frame_ms = 20
+    # Sentence-level pipelined TTS: synthesize segments while the LLM is still generating
+    tts_pipeline = bool(int(os.getenv("TTS_PIPELINE", "0")))
+    try:
+        tts_pipeline_concurrency = max(1, int(os.getenv("TTS_PIPELINE_CONCURRENCY", "2")))
+    except Exception:
+        tts_pipeline_concurrency = 2
+
+    # Emotion classification backend: llm (default), local (in-process lexicon) or hybrid
+    emotion_classifier = (os.getenv("EMOTION_CLASSIFIER") or "llm").strip().lower()
+    try:
+        emotion_threshold = float(os.getenv("EMOTION_CONFIDENCE_THRESHOLD", "0.5"))
+    except Exception:
+        emotion_threshold = 0.5
+    # Ask the chat model for a leading [Emotion] tag; classification only runs when none arrives
+    emotion_tags = bool(int(os.getenv("EMOTION_TAGS", "0")))
+    # Micro-batch concurrent LLM classifications within this window (0 = one request each)
+    try:
+        emotion_batch_ms = max(0.0, float(os.getenv("EMOTION_BATCH_MS", "0")))
+        emotion_batch_max = max(1, int(os.getenv("EMOTION_BATCH_MAX", "16")))
+    except Exception:
+        emotion_batch_ms = 0.0
+        emotion_batch_max = 16
+
+    # Exact-match cache of whole turns for repeated openers (opt-in)
+    turn_cache_enabled = bool(int(os.getenv("TURN_CACHE", "0")))
+    try:
+        turn_cache_size = int(os.getenv("TURN_CACHE_SIZE", "256"))
+        turn_cache_ttl = float(os.getenv("TURN_CACHE_TTL", "600"))
+        turn_cache_variants = int(os.getenv("TURN_CACHE_VARIANTS", "1"))
+    except Exception:
+        turn_cache_size, turn_cache_ttl, turn_cache_variants = 256, 600.0, 1
+
+    # Time budget per turn: emotion/audio not ready by then are dropped and the text sent (0 = off)
+    try:
+        turn_deadline_ms = max(0.0, float(os.getenv("TURN_DEADLINE_MS", "0")))
+    except Exception:
+        turn_deadline_ms = 0.0
+
+    # Startup warmup (model preload, TTS, caches) and keep-alive pings for the model; both opt-in
+    # since they send upstream requests the server did not make before
+    warmup_enabled = bool(int(os.getenv("WARMUP", "0")))
+    warmup_text = os.getenv("WARMUP_TEXT", "Hi!")
+    try:
+        llm_ping_interval = max(0.0, float(os.getenv("LLM_PING_INTERVAL", "0")))
+    except Exception:
+        llm_ping_interval = 0.0
+
+    # TTS audio cache: memory LRU always, disk tier when TTS_CACHE_DIR is set
+    tts_cache_enabled = bool(int(os.getenv("TTS_CACHE", "1")))
+    try:
+        tts_cache_memory_mb = float(os.getenv("TTS_CACHE_MEMORY_MB", "32"))
+        tts_cache_disk_mb = float(os.getenv("TTS_CACHE_DISK_MB", "512"))
+    except Exception:
+        tts_cache_memory_mb, tts_cache_disk_mb = 32.0, 512.0
+    tts_cache_dir = (os.getenv("TTS_CACHE_DIR") or "").strip()
+
+    # Session-aware transport: continue from Ollama's KV context instead of re-sending history
+    reuse_context = bool(int(os.getenv("LLM_REUSE_CONTEXT", "0")))
+    keep_alive = (os.getenv("LLM_KEEP_ALIVE") or "").strip() or None
+
+    # Background summarization of turns that fall out of the memory window
+    memory_summary = bool(int(os.getenv("LLM_MEMORY_SUMMARY", "0")))
+    try:
+        summary_chars = int(os.getenv("LLM_SUMMARY_CHARS", "1200"))
+    except Exception:
+        summary_chars = 1200
 
     return {
         "provider": provider,
         "model": model,
         "host": host.rstrip("/"),
+        "hosts": hosts or [host.rstrip("/")],
         "ws_path": ws_path,
+        "reuse_context": reuse_context,
+        "keep_alive": keep_alive,
+        "memory_summary": memory_summary,
+        "summary_chars": summary_chars,
         "persona_prompt": persona_prompt,
         "emotion_names": emotion_names,
         "tts_voice": tts_voice or "af_heart",
         "tts_host": tts_host,
+        "tts_hosts": tts_hosts or [tts_host],
         "tts_model": tts_model,
         "tts_speed": tts_speed,
         "tts_lang": tts_lang,
+        # Default format; lip-sync clients switch their connection to WAV (ClientOptions.tts_format)
+        "tts_format": "mp3",
+        "tts_stream": tts_stream,
+        "tts_stream_queue": tts_stream_queue,
+        # Pipelined mode already sends text sentence by sentence
+        "text_stream": text_stream and not tts_pipeline,
+        "text_stream_window_ms": text_stream_window_ms,
+        "text_stream_max_chars": text_stream_max_chars,
+        "lipsync_ms": lipsync_frame_ms if lipsync else 0,
+        "tts_pipeline": tts_pipeline,
+        "tts_pipeline_concurrency": tts_pipeline_concurrency,
+        "tts_cache": tts_cache_enabled,
+        "tts_cache_memory_bytes": int(tts_cache_memory_mb * 1024 * 1024),
+        "tts_cache_disk_bytes": int(tts_cache_disk_mb * 1024 * 1024),
+        "tts_cache_dir": tts_cache_dir,
+        "emotion_classifier": emotion_classifier,
+        "emotion_threshold": emotion_threshold,
+        "emotion_tags": emotion_tags,
+        "emotion_batch_ms": emotion_batch_ms,
+        "emotion_batch_max": emotion_batch_max,
+        "turn_cache": turn_cache_enabled,
+        "turn_cache_size": turn_cache_size,
+        "turn_cache_ttl": turn_cache_ttl,
+        "turn_cache_variants": turn_cache_variants,
+        "turn_deadline_ms": turn_deadline_ms,
+        "warmup": warmup_enabled,
+        "warmup_text": warmup_text,
+        "llm_ping_interval": llm_ping_interval,
+        "trace_turns": bool(int(os.getenv("TRACE_TURNS", "0"))),
+        "barge_in": bool(int(os.getenv("BARGE_IN", "0"))),
     }
 
 
-async def stream_ollama(client: httpx.AsyncClient, host: str, model: str, prompt: str) -> AsyncGenerator[str, None]:
-    url = f"{host}/api/generate"
-    payload = {"model": model, "prompt": prompt, "stream": True}
-    async with client.stream("POST", url, json=payload, timeout=None) as resp:
-        resp.raise_for_status()
-        async for line in resp.aiter_lines():
-            if not line:
-                continue
-            try:
-                data = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-            token = data.get("response")
-            if token:
-                yield token
-            if data.get("done") is True:
-                break
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled client per upstream for the whole process, shared by every WebSocket session
+    await http_clients.start(["llm", "tts"])
+    # Health probes for multi-host LLM pools
+    llm_pool.start()
+    # Warm the model, TTS and caches in the background; /ready reports when they are done
+    if CFG.get("warmup"):
+        warmup.start(ping=warm_llm, interval=CFG.get("llm_ping_interval") or 0.0)
+    try:
+        yield
+    finally:
+        await warmup.stop()
+        await llm_pool.stop()
+        await http_clients.aclose()
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Allow local dev origins
 app.add_middleware(
@@ -152,8 +247,136 @@ app.add_middleware(
 
 # Configure WebSocket route and prompt factory based on config
 CFG = load_llm_config()
+llm_pool.configure(CFG["hosts"])
+# Admission control covers the whole pool: OLLAMA_NUM_PARALLEL-sized share per host
+schedulers.set_default_inflight("llm", 4 * len(llm_pool))
+tts_pool.configure(CFG["tts_hosts"])
 WS_PATH = CFG["ws_path"] if CFG.get("ws_path") else "/ws"
-prompt_factory = PromptFactory(CFG.get("persona_prompt", ""), CFG.get("emotion_names", []))
+prompt_factory = PromptFactory(
+    CFG.get("persona_prompt", ""),
+    CFG.get("emotion_names", []),
+    emotion_tags=bool(CFG.get("emotion_tags")),
+)
+tts_cache = TTSCache(
+    max_memory_bytes=CFG["tts_cache_memory_bytes"],
+    disk_dir=CFG["tts_cache_dir"] or None,
+    max_disk_bytes=CFG["tts_cache_disk_bytes"],
+) if CFG.get("tts_cache") else None
+turn_cache = TurnCache(
+    max_entries=CFG["turn_cache_size"],
+    ttl_seconds=CFG["turn_cache_ttl"],
+    variants=CFG["turn_cache_variants"],
+) if CFG.get("turn_cache") else None
+emotion_classifier = build_emotion_classifier(
+    CFG.get("emotion_classifier", "llm"),
+    host=CFG["host"],
+    model=CFG["model"],
+    threshold=CFG.get("emotion_threshold", 0.5),
+    batch_window_ms=CFG.get("emotion_batch_ms", 0.0),
+    batch_max=CFG.get("emotion_batch_max", 16),
+)
+
+
+def _tts_cache_metrics() -> List[str]:
+    if tts_cache is None:
+        return []
+    stats = tts_cache.stats()
+    lines = [
+        "# HELP vtuber_tts_cache_events_total TTS cache lookups and evictions.",
+        "# TYPE vtuber_tts_cache_events_total counter",
+    ]
+    for event in ("memory_hits", "disk_hits", "misses", "deduplicated", "memory_evictions", "disk_evictions"):
+        lines.append(f'vtuber_tts_cache_events_total{{event="{event}"}} {stats.get(event, 0)}')
+    lines += [
+        "# HELP vtuber_tts_cache_bytes Bytes held by each TTS cache tier.",
+        "# TYPE vtuber_tts_cache_bytes gauge",
+        f'vtuber_tts_cache_bytes{{tier="memory"}} {stats.get("memory_bytes", 0)}',
+        f'vtuber_tts_cache_bytes{{tier="disk"}} {stats.get("disk_bytes", 0)}',
+    ]
+    return lines
+
+
+registry.add_collector("tts_cache", _tts_cache_metrics)
+
+
+async def warm_llm() -> None:
+    # Every pool host gets the model loaded (and kept loaded); one of them is enough to serve
+    results = await asyncio.gather(
+        *(preload_ollama_model(url, CFG["model"], keep_alive=CFG.get("keep_alive")) for url in llm_pool.urls()),
+        return_exceptions=True,
+    )
+    for url, result in zip(llm_pool.urls(), results):
+        if isinstance(result, Exception):
+            llm_pool.mark_failed(url, result)
+        else:
+            llm_pool.mark_ok(url)
+    errors = [r for r in results if isinstance(r, Exception)]
+    if len(errors) == len(results):
+        raise errors[0]
+
+
+async def warm_tts() -> None:
+    # A short real synthesis opens the pooled TTS connection and stores the clip in the TTS cache
+    params = build_tts_params(CFG)
+    text = CFG.get("warmup_text") or "Hi!"
+    audio = await synthesize_tts(http_clients.get("tts"), text=text, **params)
+    if not audio:
+        raise RuntimeError("TTS returned no audio")
+    # Hedged requests may land on any host: open a connection to each of them too
+    if len(tts_pool) > 1:
+        payload = tts_payload(params["model"], text, params["voice"], params["response_format"], params["speed"], params["lang_code"])
+        await asyncio.gather(*(post_tts(http_clients.get("tts"), h, payload) for h in tts_pool.hosts), return_exceptions=True)
+
+
+async def warm_local_caches() -> None:
+    # Builds the local classifier's weight matrix for this model's emotions (local/hybrid modes)
+    local = getattr(emotion_classifier, "local", emotion_classifier)
+    if getattr(local, "mode", "") == "local":
+        await local.classify("hi", "Hello! Nice to see you.", CFG.get("emotion_names", []))
+    prompt_factory.build_system_prompt()
+
+
+warmup = Warmup({"llm": warm_llm, "tts": warm_tts, "caches": warm_local_caches})
+
+
+@app.get("/ready")
+async def ready_endpoint() -> JSONResponse:
+    # Without warmup there is nothing to wait for
+    if not CFG.get("warmup"):
+        return JSONResponse({"ready": True, "steps": {}})
+    report = warmup.report()
+    if len(llm_pool) > 1:
+        report["llm_hosts"] = llm_pool.status()
+    return JSONResponse(report, status_code=200 if warmup.ready else 503)
+
+
+@app.get("/metrics")
+async def metrics_endpoint() -> PlainTextResponse:
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+TTS_HEADERS = {"Content-Type": "application/json"}
+
+
+def tts_payload(model: str, text: str, voice: str, response_format: str, speed: float, lang_code: str) -> Dict[str, Any]:
+    return {
+        "model": model,
+        "input": text,
+        "voice": voice,
+        "response_format": response_format,
+        "speed": speed,
+        "lang_code": lang_code,
+    }
+
+
+async def post_tts(client: httpx.AsyncClient, host: str, payload: Dict[str, Any]) -> bytes:
+    """One synthesis request to one TTS host, under the TTS scheduler."""
+    async with schedulers.get("tts").slot():
+        with UPSTREAM_INFLIGHT.track(upstream="tts"):
+            resp = await client.post(f"{host}/v1/audio/speech", json=payload, headers=TTS_HEADERS)
+    resp.raise_for_status()
+    return resp.content or b""
+
 
 async def synthesize_tts(
     client: httpx.AsyncClient,
@@ -165,169 +388,757 @@ async def synthesize_tts(
     response_format: str = "mp3",
     speed: float = 1.0,
     lang_code: str = "en-US",
+    cache: Optional[TTSCache] = None,
 ) -> bytes:
     """Call external TTS service to synthesize speech. Returns raw audio bytes.
 
-    Endpoint expects JSON and returns audio bytes directly.
+    Endpoint expects JSON and returns audio bytes directly. With a cache, repeated
+    (text, voice, model, speed, lang_code, format) requests are served without an upstream call.
+    When `host` is one of several configured TTS hosts, the request is hedged across them
+    (see tts_hosts.TTSHostPool).
     """
     if not text or not text.strip():
         return b""
+    payload = tts_payload(model, text, voice, response_format, speed, lang_code)
+
+    async def request() -> bytes:
+        if tts_pool.routes(host):
+            return await tts_pool.run(lambda h: post_tts(client, h, payload), chars=len(text))
+        return await post_tts(client, host, payload)
+
+    with span("tts"):
+        if cache is None:
+            return await request()
+        key = TTSCache.make_key(
+            text=text,
+            voice=voice,
+            model=model,
+            speed=speed,
+            lang_code=lang_code,
+            response_format=response_format,
+        )
+        return await cache.get_or_create(key, request)
+
+
+async def stream_tts(
+    client: httpx.AsyncClient,
+    *,
+    host: str,
+    model: str,
+    text: str,
+    voice: str,
+    response_format: str = "mp3",
+    speed: float = 1.0,
+    lang_code: str = "en-US",
+    cache: Optional[TTSCache] = None,
+) -> AsyncGenerator[bytes, None]:
+    """Like synthesize_tts, but yields the audio as the TTS service sends it.
+
+    A cached clip comes out as a single chunk. On a miss the response body is read with
+    client.stream (the TTS scheduler slot is held until it ends); with a cache the completed
+    clip is stored afterwards. Concurrent identical misses are not deduplicated here.
+    Streams are not hedged: with several TTS hosts the least busy one serves the request.
+    """
+    if not text or not text.strip():
+        return
+    key: Optional[str] = None
+    if cache is not None:
+        key = TTSCache.make_key(
+            text=text,
+            voice=voice,
+            model=model,
+            speed=speed,
+            lang_code=lang_code,
+            response_format=response_format,
+        )
+        cached = await cache.get(key)
+        if cached:
+            yield cached
+            return
+    if tts_pool.routes(host):
+        host = tts_pool.pick()
     url = f"{host}/v1/audio/speech"
-    payload = {
-        "model": model,
-        "input": text,
-        "voice": voice,
-        "response_format": response_format,
-        "speed": speed,
-        "lang_code": lang_code,
+    payload = tts_payload(model, text, voice, response_format, speed, lang_code)
+    kept: Optional[List[bytes]] = [] if cache is not None else None
+    with span("tts"):
+        async with schedulers.get("tts").slot():
+            with UPSTREAM_INFLIGHT.track(upstream="tts"), tts_pool.track(host):
+                async with client.stream("POST", url, json=payload, headers=TTS_HEADERS) as resp:
+                    resp.raise_for_status()
+                    async for chunk in resp.aiter_bytes():
+                        if kept is not None:
+                            kept.append(chunk)
+                        yield chunk
+    if cache is not None and key is not None and kept:
+        await cache.put(key, b"".join(kept))
+
+
+def prefetch(chunks: AsyncGenerator[bytes, None], maxsize: int) -> Tuple[asyncio.Task, AsyncIterator[bytes]]:
+    """Start consuming `chunks` in a task now, buffering at most `maxsize` chunks ahead.
+
+    Returns the task (cancel it to abandon the stream) and an iterator over the buffered
+    chunks that re-raises the producer's error at the point it happened.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    async def pump() -> None:
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+            return
+        finally:
+            # Cancelled while waiting on a full queue: close the upstream response now
+            await chunks.aclose()
+        await queue.put(None)
+
+    async def drain() -> AsyncIterator[bytes]:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    return asyncio.create_task(pump()), drain()
+
+
+async def classify_timed(classifier: EmotionClassifier, user_text: str, assistant_text: str, allowed: List[str]) -> str:
+    with span("emotion"):
+        emotion = await classifier.classify(user_text, assistant_text, allowed)
+    EMOTION_SOURCE.inc(source="classifier")
+    return emotion
+
+
+async def forward_audio_stream(websocket: WebSocket, chunks: AsyncIterator[bytes], *, fmt: str, keep: bool) -> bytes:
+    """send_audio_stream that tolerates TTS failures; returns the clip when `keep` and it completed."""
+    kept: Optional[List[bytes]] = [] if keep else None
+
+    async def tee() -> AsyncIterator[bytes]:
+        async for chunk in chunks:
+            if kept is not None:
+                kept.append(chunk)
+            yield chunk
+
+    try:
+        await send_audio_stream(websocket, tee(), fmt=fmt)
+    except WebSocketDisconnect:
+        raise
+    except Exception:
+        # As with buffered TTS, a failed synthesis only costs the audio
+        return b""
+    return b"".join(kept) if kept else b""
+
+
+async def deliver_turn_outputs(
+    websocket: WebSocket,
+    classifier: EmotionClassifier,
+    tts_client: httpx.AsyncClient,
+    user_text: str,
+    assistant_text: str,
+    *,
+    allowed_emotions: List[str],
+    tts: Dict[str, Any],
+    options: ClientOptions,
+    stream_queue: int = 0,
+    keep_audio: bool = True,
+    emotion: Optional[str] = None,
+    deadline: Optional[TurnDeadline] = None,
+    text_sent: bool = False,
+) -> Tuple[Optional[str], bytes]:
+    """Run emotion classification and TTS for a finished reply as one small task graph.
+
+    Both upstream calls start at once. Results are sent as soon as they are ready while
+    keeping the order the frontend relies on: emotion, then audio, then the text chunk.
+    A failed classification or synthesis only drops that event. Returns what was delivered
+    as (emotion, audio).
+
+    With stream_queue > 0 (client negotiated audio_stream) the audio is forwarded chunk by
+    chunk as it is synthesized, buffering at most that many chunks while the emotion is
+    pending; the returned audio is then only assembled when keep_audio is set.
+
+    An `emotion` already sent during the stream (inline tag) skips classification.
+    Past the turn's `deadline` whatever is still pending is dropped and the text sent without it.
+    With `text_sent` (text_stream clients got the text live) the closing text chunk is skipped.
+    """
+    deadline = deadline or TurnDeadline()
+    speech_text = assistant_text.strip()
+    audio_bytes = b""
+    emotion_task: Optional[asyncio.Task] = None
+    if emotion is None:
+        emotion_task = asyncio.create_task(classify_timed(classifier, user_text, assistant_text, allowed_emotions))
+    tts_task: Optional[asyncio.Task] = None
+    audio_chunks: Optional[AsyncIterator[bytes]] = None
+    if speech_text and stream_queue > 0:
+        tts_task, audio_chunks = prefetch(stream_tts(tts_client, text=speech_text, **tts), stream_queue)
+    elif speech_text:
+        tts_task = asyncio.create_task(synthesize_tts(tts_client, text=speech_text, **tts))
+    try:
+        try:
+            if emotion_task is not None:
+                emotion = await deadline.run(emotion_task, "emotion")
+                if emotion:
+                    await websocket.send_text(json.dumps({"type": "emotion", "emotion": emotion}))
+        except WebSocketDisconnect:
+            raise
+        except Exception:
+            emotion = None
+
+        if tts_task is None:
+            return emotion, audio_bytes
+        if audio_chunks is not None:
+            audio_bytes = await forward_audio_stream(
+                websocket, deadline.first_chunk(audio_chunks), fmt=tts.get("response_format", "mp3"), keep=keep_audio
+            )
+        else:
+            try:
+                audio_bytes = await deadline.run(tts_task, "audio")
+            except Exception:
+                # Don't fail the chat on TTS errors (or a missed deadline); the text is still delivered
+                audio_bytes = b""
+        if audio_bytes and audio_chunks is None:
+            await send_audio(
+                websocket,
+                audio_bytes,
+                fmt=tts.get("response_format", "mp3"),
+                binary=options.binary_audio,
+                envelope_ms=options.envelope_ms,
+            )
+        # After audio is ready, deliver the full text so UI shows synchronized with playback
+        if not text_sent:
+            await websocket.send_text(json.dumps({
+                "type": "chunk",
+                "data": speech_text,
+            }))
+        return emotion, audio_bytes
+    finally:
+        for task in (emotion_task, tts_task):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+async def stream_pipelined_turn(
+    websocket: WebSocket,
+    tts_client: httpx.AsyncClient,
+    llm: ChatStreamer,
+    classifier: EmotionClassifier,
+    user_text: str,
+    *,
+    history: ConversationStore,
+    max_turns: int,
+    max_chars: int,
+    max_tokens: int,
+    allowed_emotions: List[str],
+    tts: Dict[str, Any],
+    options: ClientOptions,
+    concurrency: int,
+    deadline: Optional[TurnDeadline] = None,
+) -> Tuple[str, Optional[str], List[Tuple[str, bytes]]]:
+    """Stream one turn with sentence-level pipelined TTS.
+
+    Segments are synthesized while the LLM is still generating and delivered in order as
+    an audio event with "seq": n (see ws_protocol.send_audio) followed by
+    {"type": "chunk", "seq": n, "data": str}.
+    The emotion is classified from the first segment and sent as soon as it is ready, unless
+    an inline emotion tag streamed in first (then it is sent at once and nothing is classified).
+    Segments whose audio is not ready by the turn's `deadline` are sent as text only.
+    Returns (full assistant text, emotion sent, [(segment text, audio), ...]).
+    """
+    deadline = deadline or TurnDeadline()
+    splitter = SentenceSplitter()
+    send_lock = asyncio.Lock()
+    assistant_accum: List[str] = []
+    delivered: List[Tuple[str, bytes]] = []
+    emotion_task: Optional[asyncio.Task] = None
+    inline_emotion: Optional[str] = None
+
+    async def send_json(obj: Dict[str, Any]) -> None:
+        async with send_lock:
+            await websocket.send_text(json.dumps(obj))
+
+    async def synth(text: str) -> bytes:
+        # A timeout counts as a failed synthesis: the pipeline delivers the segment without audio
+        return await deadline.run(synthesize_tts(tts_client, text=text, **tts), "audio")
+
+    async def classify_and_send(first_segment: str) -> Optional[str]:
+        try:
+            emotion = await classify_timed(classifier, user_text, first_segment, allowed_emotions)
+            if emotion:
+                await send_json({"type": "emotion", "emotion": emotion})
+            return emotion or None
+        except Exception:
+            return None
+
+    pipeline = SpeechPipeline(synth, concurrency=concurrency)
+
+    def submit(segment: str) -> None:
+        nonlocal emotion_task
+        if emotion_task is None and inline_emotion is None and is_speakable(segment):
+            emotion_task = asyncio.create_task(classify_and_send(segment))
+        pipeline.submit(segment)
+
+    async def produce() -> None:
+        nonlocal inline_emotion
+        try:
+            async for event in llm.stream(
+                user_text,
+                history=history,
+                max_turns=max_turns,
+                max_chars=max_chars,
+                max_tokens=max_tokens,
+            ):
+                if isinstance(event, dict) and event.get("type") == "emotion":
+                    # First source wins: a tag after classification started is ignored
+                    if emotion_task is None and inline_emotion is None:
+                        inline_emotion = event["emotion"]
+                        EMOTION_SOURCE.inc(source="tag")
+                        await send_json({"type": "emotion", "emotion": inline_emotion})
+                    continue
+                if isinstance(event, dict):
+                    data = event.get("data") if event.get("type") == "text" else json.dumps(event)
+                else:
+                    data = str(event)
+                if not data:
+                    continue
+                assistant_accum.append(data)
+                for segment in splitter.feed(data):
+                    submit(segment)
+            tail = splitter.flush()
+            if tail:
+                submit(tail)
+        finally:
+            pipeline.close()
+
+    producer = asyncio.create_task(produce())
+    try:
+        async for seq, text, audio_bytes in pipeline.results():
+            async with send_lock:
+                if audio_bytes:
+                    await send_audio(
+                        websocket,
+                        audio_bytes,
+                        fmt=tts.get("response_format", "mp3"),
+                        binary=options.binary_audio,
+                        envelope_ms=options.envelope_ms,
+                        seq=seq,
+                    )
+                await websocket.send_text(json.dumps({"type": "chunk", "seq": seq, "data": text}))
+            delivered.append((text, audio_bytes))
+        await producer
+        emotion = inline_emotion
+        if emotion_task is not None:
+            try:
+                emotion = await deadline.run(emotion_task, "emotion")
+            except asyncio.TimeoutError:
+                emotion = None
+    finally:
+        if not producer.done():
+            producer.cancel()
+        if emotion_task is not None and not emotion_task.done():
+            emotion_task.cancel()
+    return "".join(assistant_accum), emotion, delivered
+
+def build_tts_params(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """Keyword arguments for synthesize_tts from the loaded config."""
+    return {
+        "host": cfg.get("tts_host") or "https://tts.tarunravi.com",
+        "model": cfg.get("tts_model") or "kokoro",
+        "voice": cfg.get("tts_voice") or "af_heart",
+        "response_format": cfg.get("tts_format") or "mp3",
+        "speed": cfg.get("tts_speed") or 1.0,
+        "lang_code": cfg.get("tts_lang") or "en-US",
+        "cache": tts_cache,
     }
-    headers = {"Content-Type": "application/json"}
-    resp = await client.post(url, json=payload, headers=headers, timeout=None)
-    resp.raise_for_status()
-    return resp.content or b""
+
+
+def make_audio_ref(text: str, audio: bytes, tts: Dict[str, Any]) -> AudioRef:
+    """Reference a delivered clip by its TTS cache key when the cache holds it, else keep the bytes."""
+    cache: Optional[TTSCache] = tts.get("cache")
+    if cache is None or not audio:
+        return audio
+    # Same text synthesize_tts was called with (callers pass stripped text)
+    return TTSCache.make_key(
+        text=text.strip(),
+        voice=tts["voice"],
+        model=tts["model"],
+        speed=tts["speed"],
+        lang_code=tts["lang_code"],
+        response_format=tts.get("response_format", "mp3"),
+    )
+
+
+async def replay_cached_turn(
+    websocket: WebSocket,
+    turn: CachedTurn,
+    *,
+    tts: Dict[str, Any],
+    options: ClientOptions,
+    pipelined: bool,
+) -> bool:
+    """Send a cached turn's emotion, audio and text in the usual order, without upstream calls.
+
+    Returns False (having sent nothing) when a referenced clip is no longer in the TTS cache.
+    """
+    cache: Optional[TTSCache] = tts.get("cache")
+    clips: List[bytes] = []
+    for _, ref in turn.segments:
+        if isinstance(ref, bytes):
+            clips.append(ref)
+            continue
+        audio = await cache.get(ref) if cache is not None else None
+        if not audio:
+            return False
+        clips.append(audio)
+
+    if turn.emotion:
+        await websocket.send_text(json.dumps({"type": "emotion", "emotion": turn.emotion}))
+    for seq, ((text, _), audio) in enumerate(zip(turn.segments, clips)):
+        if audio:
+            await send_audio(
+                websocket,
+                audio,
+                fmt=tts.get("response_format", "mp3"),
+                binary=options.binary_audio,
+                envelope_ms=options.envelope_ms,
+                seq=seq if pipelined else None,
+            )
+        chunk: Dict[str, Any] = {"type": "chunk", "data": text}
+        if pipelined:
+            chunk["seq"] = seq
+        await websocket.send_text(json.dumps(chunk))
+    return True
+
 
 async def ws_chat(websocket: WebSocket):
     await websocket.accept()
+    ACTIVE_SESSIONS.inc()
+    # Upstream schedulers take turns between sessions by this key; the LLM pool pins it to a host
+    session_key = f"ws-{id(websocket)}"
+    current_session.set(session_key)
     cfg = CFG
     provider = cfg["provider"]
     model = cfg["model"]
     host = cfg["host"]
     allowed_emotions = cfg.get("emotion_names", [])
-    tts_voice = cfg.get("tts_voice") or "af_heart"
-    tts_host = cfg.get("tts_host") or "https://tts.tarunravi.com"
-    tts_model = cfg.get("tts_model") or "kokoro"
-    tts_speed = cfg.get("tts_speed") or 1.0
-    tts_lang = cfg.get("tts_lang") or "en-US"
+    tts_pipeline = bool(cfg.get("tts_pipeline"))
+    tts_pipeline_concurrency = cfg.get("tts_pipeline_concurrency") or 2
     llm = ChatStreamer(
         host=host,
         model=model,
         provider=provider,
         allowed_emotions=allowed_emotions,
         prompt_factory=prompt_factory,
+        client=http_clients.get("llm"),
+        reuse_context=bool(cfg.get("reuse_context")),
+        keep_alive=cfg.get("keep_alive"),
+        emotion_tags=bool(cfg.get("emotion_tags")),
     )
+    tts_client = http_clients.get("tts")
+    tts_params = build_tts_params(cfg)
 
-    # Maintain per-connection conversation history
-    # Each item: {"role": "user"|"assistant", "content": str}
-    history = []
+    # Protocol options (binary audio frames, barge-in, ...) negotiated by an optional hello message
+    barge_in = bool(cfg.get("barge_in"))
+    options = ClientOptions(
+        barge_in_supported=barge_in,
+        lipsync_ms=cfg.get("lipsync_ms") or 0,
+        audio_stream_supported=bool(cfg.get("tts_stream")),
+        text_stream_supported=bool(cfg.get("text_stream")),
+    )
+    # Started when a client negotiates text_stream; shared by all of its turns
+    text_writer: Optional[TextStreamWriter] = None
 
     # Memory controls (env overrides for quick tuning)
     max_turns = int(os.getenv("LLM_MEMORY_TURNS", "8"))
     max_chars = int(os.getenv("LLM_MEMORY_CHARS", "4000"))
+    max_tokens = int(os.getenv("LLM_MEMORY_TOKENS", "0"))
+
+    # Maintain per-connection conversation history: a bounded ring buffer of completed turns
+    history = ConversationStore(
+        capacity=int(os.getenv("LLM_HISTORY_CAPACITY", str(max(16, 2 * max_turns)))),
+        max_content_chars=max_chars,
+    )
+    compactor = HistoryCompactor(
+        history,
+        host=host,
+        model=model,
+        client=http_clients.get("llm"),
+        max_turns=max_turns,
+        max_chars=max_chars,
+        max_tokens=max_tokens,
+        max_summary_chars=cfg.get("summary_chars") or 1200,
+    ) if cfg.get("memory_summary") else None
+
+    trace_turns = bool(cfg.get("trace_turns"))
 
-    async with httpx.AsyncClient() as client:
+    async def run_turn(user_text: str) -> None:
+        # Spans from this turn (and the tasks it starts) are collected on one trace
+        trace = TurnTrace()
+        current_trace.set(trace)
+        deadline = TurnDeadline((cfg.get("turn_deadline_ms") or 0.0) / 1000.0)
+        outcome = "error"
         try:
-            while True:
-                msg = await websocket.receive_text()
-                try:
-                    payload = json.loads(msg)
-                    user_text = payload.get("prompt") or payload.get("message") or ""
-                except Exception:
-                    user_text = msg
-
-                if not user_text.strip():
-                    await websocket.send_text(json.dumps({"type": "error", "message": "Empty prompt"}))
-                    continue
+            await websocket.send_text(json.dumps({"type": "start"}))
 
-                await websocket.send_text(json.dumps({"type": "start"}))
-
-                if provider == "ollama":
-                    # Append user turn to history
-                    history.append({"role": "user", "content": user_text})
-                    # Buffer assistant text to store after stream completes
-                    assistant_accum = []
-
-                    async for event in llm.stream(
-                        user_text,
-                        history=history,
-                        max_turns=max_turns,
-                        max_chars=max_chars,
-                    ):
-                        try:
-                            if isinstance(event, dict):
-                                et = event.get("type")
-                                if et == "text":
-                                    data = event.get("data")
-                                    if data:
-                                        # Buffer text for TTS sync; do not stream to frontend yet
-                                        assistant_accum.append(data)
-                                else:
-                                    # Fallback: treat unknown dict as chunk
-                                    # In sync mode, we also buffer unknown dicts as text
-                                    assistant_accum.append(json.dumps(event))
-                            else:
-                                # Backward-compatible: raw text
-                                text_event = str(event)
-                                assistant_accum.append(text_event)
-                        except Exception:
-                            # Do not break the stream on send errors; try to continue
-                            pass
+            # Repeated opener with the same visible history: replay the stored turn
+            cache_key: Optional[str] = None
+            if turn_cache is not None and provider == "ollama":
+                cache_key = TurnCache.make_key(
+                    persona=prompt_factory.build_system_prompt(),
+                    model=model,
+                    mode=("pipeline" if tts_pipeline else "sync") + "/" + tts_params["response_format"],
+                    user_text=user_text,
+                    history_window=history.summary + "\n" + history.format_window(max_turns, max_chars, max_tokens),
+                )
+                cached = turn_cache.get(cache_key)
+                if cached is not None:
+                    with span("turn_cache_replay"):
+                        replayed = await replay_cached_turn(
+                            websocket, cached, tts=tts_params, options=options, pipelined=tts_pipeline
+                        )
+                    if replayed:
+                        await websocket.send_text(json.dumps({"type": "end"}))
+                        history.add_user(user_text)
+                        history.add_assistant(cached.reply)
+                        if compactor is not None:
+                            compactor.schedule()
+                        outcome = "ok"
+                        return
+                    turn_cache.discard(cache_key)
+
+            if provider == "ollama" and tts_pipeline:
+                history.add_user(user_text)
+                # Text and audio go out segment by segment; no post-processing stage needed
+                assistant_text, emotion, segments = await stream_pipelined_turn(
+                    websocket,
+                    tts_client,
+                    llm,
+                    emotion_classifier,
+                    user_text,
+                    history=history,
+                    max_turns=max_turns,
+                    max_chars=max_chars,
+                    max_tokens=max_tokens,
+                    allowed_emotions=allowed_emotions,
+                    tts=tts_params,
+                    options=options,
+                    concurrency=tts_pipeline_concurrency,
+                    deadline=deadline,
+                )
+                await websocket.send_text(json.dumps({"type": "end"}))
+                # A turn that lost audio to the deadline is not worth replaying
+                if cache_key is not None and emotion and not deadline.missed and any(audio for _, audio in segments):
+                    turn_cache.put(cache_key, CachedTurn(
+                        assistant_text,
+                        emotion,
+                        [(text, make_audio_ref(text, audio, tts_params)) for text, audio in segments],
+                    ))
+                if assistant_text.strip():
+                    history.add_assistant(assistant_text)
                 else:
-                    await websocket.send_text(json.dumps({"type": "error", "message": f"Unsupported provider: {provider}"}))
+                    history.discard_pending()
+                if compactor is not None:
+                    compactor.schedule()
+                outcome = "ok"
+                return
 
-                # Post-process: classify emotion from last user input + assistant response using LLM
-                try:
-                    assistant_text = "".join(assistant_accum)
-                    emotion = await classify_emotion_llm(
-                        client,
-                        host,
-                        model,
-                        last_user=user_text,
-                        assistant=assistant_text,
-                        allowed=allowed_emotions,
-                    )
-                    if emotion:
-                        await websocket.send_text(json.dumps({"type": "emotion", "emotion": emotion}))
-                except Exception:
-                    pass
-
-                # Synthesize TTS audio for the assistant's response and send as base64
-                try:
-                    if assistant_accum:
-                        assistant_text = "".join(assistant_accum).strip()
-                        if assistant_text:
-                            audio_bytes = await synthesize_tts(
-                                client,
-                                host=tts_host,
-                                model=tts_model,
-                                text=assistant_text,
-                                voice=tts_voice,
-                                response_format="mp3",
-                                speed=tts_speed,
-                                lang_code=tts_lang,
-                            )
-                            if audio_bytes:
-                                b64 = base64.b64encode(audio_bytes).decode("ascii")
-                                await websocket.send_text(json.dumps({
-                                    "type": "audio",
-                                    "format": "mp3",
-                                    "data": b64,
-                                }))
-                            # After audio is ready, deliver the full text so UI shows synchronized with playback
-                            await websocket.send_text(json.dumps({
-                                "type": "chunk",
-                                "data": assistant_text,
-                            }))
-                except Exception:
-                    # Don't fail the chat on TTS errors
-                    pass
+            if provider == "ollama":
+                # Hold the user turn as pending until the reply completes it
+                history.add_user(user_text)
+                # Buffer assistant text to store after stream completes
+                assistant_accum = []
+                inline_emotion: Optional[str] = None
+                # text_stream clients get the text now; everyone else when the audio is ready
+                live_text = text_writer if options.text_stream else None
 
-                await websocket.send_text(json.dumps({"type": "end"}))
-                # Store assistant message in history
-                try:
-                    if 'assistant_accum' in locals():
-                        assistant_text = "".join(assistant_accum)
-                        if assistant_text.strip():
-                            history.append({"role": "assistant", "content": assistant_text})
-                except Exception:
-                    pass
+                async for event in llm.stream(
+                    user_text,
+                    history=history,
+                    max_turns=max_turns,
+                    max_chars=max_chars,
+                    max_tokens=max_tokens,
+                ):
+                    try:
+                        if isinstance(event, dict):
+                            et = event.get("type")
+                            if et == "text":
+                                data = event.get("data")
+                                if data:
+                                    # Buffer text for TTS sync; do not stream to frontend yet
+                                    assistant_accum.append(data)
+                                    if live_text is not None:
+                                        await live_text.write(data)
+                            elif et == "emotion":
+                                # Inline tag: the avatar reacts now, classification is skipped
+                                if inline_emotion is None:
+                                    inline_emotion = event.get("emotion")
+                                    EMOTION_SOURCE.inc(source="tag")
+                                    if live_text is not None:
+                                        await live_text.flush()
+                                    await websocket.send_text(json.dumps({"type": "emotion", "emotion": inline_emotion}))
+                            else:
+                                # Fallback: treat unknown dict as chunk
+                                # In sync mode, we also buffer unknown dicts as text
+                                assistant_accum.append(json.dumps(event))
+                        else:
+                            # Backward-compatible: raw text
+                            text_event = str(event)
+                            assistant_accum.append(text_event)
+                            if live_text is not None:
+                                await live_text.write(text_event)
+                    except Exception:
+                        # Do not break the stream on send errors; try to continue
+                        pass
+                if live_text is not None:
+                    await live_text.flush()
+            else:
+                await websocket.send_text(json.dumps({"type": "error", "message": f"Unsupported provider: {provider}"}))
+
+            # Post-process: classify the emotion and synthesize speech concurrently
+            if 'assistant_accum' in locals():
+                emotion, audio_bytes = await deliver_turn_outputs(
+                    websocket,
+                    emotion_classifier,
+                    tts_client,
+                    user_text,
+                    "".join(assistant_accum),
+                    allowed_emotions=allowed_emotions,
+                    tts=tts_params,
+                    options=options,
+                    stream_queue=(cfg.get("tts_stream_queue") or 32) if options.audio_stream else 0,
+                    keep_audio=cache_key is not None,
+                    emotion=inline_emotion,
+                    deadline=deadline,
+                    text_sent=live_text is not None,
+                )
+                if cache_key is not None and emotion and audio_bytes and not deadline.missed:
+                    speech_text = "".join(assistant_accum).strip()
+                    turn_cache.put(cache_key, CachedTurn(
+                        speech_text,
+                        emotion,
+                        [(speech_text, make_audio_ref(speech_text, audio_bytes, tts_params))],
+                    ))
+
+            await websocket.send_text(json.dumps({"type": "end"}))
+            # Store assistant message in history
+            try:
+                if 'assistant_accum' in locals():
+                    assistant_text = "".join(assistant_accum)
+                    if assistant_text.strip():
+                        history.add_assistant(assistant_text)
+                    else:
+                        history.discard_pending()
+            except Exception:
+                pass
+            # Summarize turns that just left the window, in the background between turns
+            if compactor is not None:
+                compactor.schedule()
+            outcome = "ok"
+        except asyncio.CancelledError:
+            # Barge-in or disconnect: the interrupted exchange is not kept in history
+            outcome = "cancelled"
+            history.discard_pending()
+            raise
+        except UpstreamBusy as e:
+            # Queues are full: answer at once instead of piling on; the session stays open
+            outcome = "busy"
+            history.discard_pending()
+            await websocket.send_text(json.dumps({
+                "type": "error",
+                "code": "busy",
+                "upstream": e.upstream,
+                "message": "The server is busy, please try again in a moment.",
+            }))
         except WebSocketDisconnect:
-            return
+            outcome = "disconnect"
+            raise
+        finally:
+            finish_turn(trace, outcome, log=trace_turns)
+
+    async def run_turn_guarded(user_text: str) -> None:
+        try:
+            await run_turn(user_text)
+        except (asyncio.CancelledError, WebSocketDisconnect):
+            raise
         except Exception as e:
             try:
+                if text_writer is not None:
+                    await text_writer.flush()
                 await websocket.send_text(json.dumps({"type": "error", "message": str(e)}))
             except Exception:
                 pass
 
+    async def cancel_turn(task: asyncio.Task) -> None:
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+    # In barge-in mode the turn runs as its own task and this loop keeps reading, so a new
+    # message (from clients that negotiated it) or a disconnect cancels the turn right away.
+    # Cancelling closes the upstream Ollama/TTS streams, which frees the model slot.
+    turn_task: Optional[asyncio.Task] = None
+    try:
+        while True:
+            msg = await websocket.receive_text()
+            try:
+                payload = json.loads(msg)
+                if is_hello(payload):
+                    await websocket.send_text(json.dumps(options.update(payload)))
+                    tts_params["response_format"] = options.tts_format
+                    if options.text_stream and text_writer is None:
+                        text_writer = TextStreamWriter(
+                            websocket,
+                            window_ms=cfg.get("text_stream_window_ms") or 0.0,
+                            max_chars=cfg.get("text_stream_max_chars") or 1024,
+                        )
+                        text_writer.start()
+                    continue
+                user_text = payload.get("prompt") or payload.get("message") or ""
+            except Exception:
+                user_text = msg
+
+            if not user_text.strip():
+                await websocket.send_text(json.dumps({"type": "error", "message": "Empty prompt"}))
+                continue
+
+            # A failed turn is reported as an error event and the session stays open, in both modes
+            if not barge_in:
+                await run_turn_guarded(user_text)
+                continue
+
+            if turn_task is not None:
+                if options.barge_in and not turn_task.done():
+                    await cancel_turn(turn_task)
+                    if text_writer is not None:
+                        # Text of the interrupted reply that has not gone out yet is dropped
+                        await text_writer.discard()
+                    await websocket.send_text(json.dumps({"type": "end", "cancelled": True}))
+                else:
+                    # Clients that did not opt in keep one-turn-at-a-time semantics; for a finished
+                    # turn this collects its outcome (a disconnect ends the session here)
+                    await turn_task
+            turn_task = asyncio.create_task(run_turn_guarded(user_text))
+    except WebSocketDisconnect:
+        return
+    except Exception as e:
+        try:
+            await websocket.send_text(json.dumps({"type": "error", "message": str(e)}))
+        except Exception:
+            pass
+    finally:
+        if turn_task is not None:
+            # Also awaits a turn that already finished, so its exception is always retrieved
+            await cancel_turn(turn_task)
+        if text_writer is not None:
+            await text_writer.close()
+        ACTIVE_SESSIONS.dec()
+        llm_pool.unpin(session_key)
+        if compactor is not None:
+            compactor.close()
+
 # Register the websocket route dynamically
 app.add_api_websocket_route(WS_PATH, ws_chat)
 
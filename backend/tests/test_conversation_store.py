@@ -0,0 +1,47 @@
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from conversation_store import ConversationStore  # noqa: E402
+
+
+def _store(*turns):
+    store = ConversationStore(capacity=8)
+    for user, assistant in turns:
+        store.add_user(user)
+        store.add_assistant(assistant)
+    return store
+
+
+class WindowTest(unittest.TestCase):
+    def test_drops_whole_older_turns(self) -> None:
+        store = _store(("first", "a" * 50), ("second", "ok"))
+        window = store.window(max_turns=8, max_chars=40)
+        self.assertEqual([r.user for r in window], ["second"])
+        self.assertEqual(window[0].assistant, "ok")
+
+    def test_newest_turn_over_char_budget_is_clipped(self) -> None:
+        store = _store(("old", "fine"), ("tell me a story", "word " * 200))
+        window = store.window(max_turns=8, max_chars=100)
+        self.assertEqual(len(window), 1)
+        record = window[0]
+        self.assertEqual(record.user, "tell me a story")
+        self.assertTrue(record.assistant.startswith("word word"))
+        self.assertTrue(record.assistant.endswith("..."))
+        self.assertLessEqual(record.chars, 100)
+        self.assertEqual(record.seq, 1)
+        self.assertEqual(store.format_window(8, 100), record.text)
+
+    def test_newest_turn_over_token_budget_is_clipped(self) -> None:
+        store = _store(("q " * 100, "a " * 100))
+        window = store.window(max_turns=8, max_chars=0, max_tokens=20)
+        self.assertEqual(len(window), 1)
+        self.assertLessEqual(window[0].tokens, 20)
+        self.assertTrue(window[0].user.startswith("q q"))
+        self.assertTrue(window[0].assistant.startswith("a a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
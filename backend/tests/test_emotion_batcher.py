@@ -0,0 +1,49 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import emotion_batcher  # noqa: E402
+from emotion_batcher import BATCH_SESSION, EmotionBatcher  # noqa: E402
+from upstream_scheduler import current_session  # noqa: E402
+
+
+class _FakeTransport:
+    sessions = []
+
+    def __init__(self, *args, **kwargs) -> None:
+        pass
+
+    async def generate(self, prompt: str) -> str:
+        self.sessions.append(current_session.get())
+        # Answers only the first item, so the second one is retried alone
+        return "1: Happy"
+
+
+class BatchSessionTest(unittest.IsolatedAsyncioTestCase):
+    async def test_batch_runs_under_neutral_session(self) -> None:
+        batcher = EmotionBatcher("http://llm", "model", window_ms=5.0)
+        retried = []
+
+        async def classify_one(client, host, model, last_user, assistant, allowed):
+            retried.append(current_session.get())
+            return "Sad"
+
+        async def caller(session: str) -> str:
+            current_session.set(session)
+            return await batcher.classify("hi", "hello", ["Happy", "Sad"])
+
+        _FakeTransport.sessions = []
+        with mock.patch.object(emotion_batcher, "LLMTransport", _FakeTransport), \
+                mock.patch.object(emotion_batcher, "classify_emotion_llm", classify_one):
+            results = await asyncio.gather(asyncio.create_task(caller("a")), asyncio.create_task(caller("b")))
+        self.assertEqual(results, ["Happy", "Sad"])
+        self.assertEqual(_FakeTransport.sessions, [BATCH_SESSION])
+        self.assertEqual(retried, ["b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import sys
+import unittest
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from emotion_classifier import EmotionClassifier, LexiconEmotionClassifier, lexicon_key  # noqa: E402
+
+
+class LexiconKeyTest(unittest.TestCase):
+    def test_configured_names_find_their_entry(self) -> None:
+        self.assertEqual(lexicon_key(" Happy "), "happy")
+        # Spelling as in vtuber.config.json
+        self.assertEqual(lexicon_key("Embarassed"), "embarrassed")
+        self.assertEqual(lexicon_key("Embarrassed"), "embarrassed")
+        self.assertIsNone(lexicon_key("Sleepy"))
+
+    def test_misspelled_name_uses_lexicon_cues(self) -> None:
+        emotion, confidence = LexiconEmotionClassifier().score("", "Oops, my bad.", ["Happy", "Embarassed"])
+        self.assertEqual(emotion, "Embarassed")
+        self.assertGreater(confidence, 0.5)
+
+    def test_unknown_names_warn_and_match_on_their_name(self) -> None:
+        classifier = LexiconEmotionClassifier()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            emotion, _ = classifier.score("", "I'm so sleepy today.", ["Happy", "Sleepy"])
+        self.assertEqual(emotion, "Sleepy")
+        self.assertTrue(any("Sleepy" in str(w.message) for w in caught))
+
+
+class InterfaceTest(unittest.TestCase):
+    def test_subclass_without_classify_cannot_be_constructed(self) -> None:
+        class Incomplete(EmotionClassifier):
+            mode = "incomplete"
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import io
+import struct
+import sys
+import unittest
+import wave
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lipsync import compute_envelope, read_wav_pcm  # noqa: E402
+
+RATE = 16000
+
+
+def _wav(samples: np.ndarray, channels: int = 1) -> bytes:
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(2)
+        wf.setframerate(RATE)
+        wf.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+
+def _sine_then_silence(ms: int = 200) -> np.ndarray:
+    n = RATE * ms // 1000
+    t = np.arange(n) / RATE
+    return np.concatenate([0.5 * np.sin(2 * np.pi * 220 * t), np.zeros(n)]).astype(np.float32)
+
+
+class EnvelopeTest(unittest.TestCase):
+    def test_sine_then_silence(self) -> None:
+        envelope = compute_envelope(_wav(_sine_then_silence()), "wav", 20)
+        self.assertEqual(envelope.frame_ms, 20)
+        # 400 ms of audio in 20 ms frames
+        self.assertEqual(len(envelope), 20)
+        values = list(envelope.values)
+        self.assertTrue(all(0 <= v <= 255 for v in values))
+        self.assertTrue(all(v > 200 for v in values[:10]))
+        self.assertEqual(values[10:], [0] * 10)
+
+    def test_streamed_header_with_placeholder_sizes(self) -> None:
+        audio = bytearray(_wav(_sine_then_silence()))
+        # Streaming TTS writes the header before the length is known
+        struct.pack_into("<I", audio, 4, 0xFFFFFFFF)
+        struct.pack_into("<I", audio, 40, 0)
+        envelope = compute_envelope(bytes(audio), "wav", 20)
+        self.assertEqual(len(envelope), 20)
+        self.assertEqual(envelope.values, compute_envelope(_wav(_sine_then_silence()), "wav", 20).values)
+
+    def test_stereo_is_mixed_to_mono(self) -> None:
+        mono = _sine_then_silence()
+        stereo = np.stack([mono, np.zeros_like(mono)], axis=1).reshape(-1)
+        samples, rate = read_wav_pcm(_wav(stereo, channels=2))
+        self.assertEqual(rate, RATE)
+        self.assertEqual(samples.size, mono.size)
+        envelope = compute_envelope(_wav(stereo, channels=2), "wav", 20)
+        self.assertEqual(len(envelope), 20)
+        self.assertTrue(all(v > 200 for v in envelope.values[:10]))
+
+    def test_silence_and_empty_audio(self) -> None:
+        self.assertEqual(compute_envelope(_wav(np.zeros(RATE // 10)), "wav", 20).values, bytes(5))
+        self.assertIsNone(compute_envelope(b"", "wav", 20))
+        self.assertIsNone(compute_envelope(_wav(np.zeros(0)), "wav", 20))
+        self.assertIsNone(compute_envelope(b"ID3\x04", "mp3", 20))
+
+
+if __name__ == "__main__":
+    unittest.main()
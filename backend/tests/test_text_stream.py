@@ -0,0 +1,91 @@
+import asyncio
+import json
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ws_protocol import TextStreamWriter  # noqa: E402
+
+
+class _FakeSocket:
+    def __init__(self, delay: float = 0.0, fail: bool = False) -> None:
+        self.delay = delay
+        self.fail = fail
+        self.frames = []
+
+    async def send_text(self, text: str) -> None:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("socket closed")
+        self.frames.append(json.loads(text))
+
+
+class TextStreamWriterTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.writers = []
+
+    async def asyncTearDown(self) -> None:
+        for writer in self.writers:
+            await writer.close()
+
+    def _writer(self, socket: _FakeSocket, **kwargs) -> TextStreamWriter:
+        writer = TextStreamWriter(socket, **kwargs)
+        writer.start()
+        self.writers.append(writer)
+        return writer
+
+    async def test_deltas_are_merged_in_order(self) -> None:
+        socket = _FakeSocket(delay=0.005)
+        writer = self._writer(socket, window_ms=20)
+        pieces = [f"w{i} " for i in range(50)]
+        for piece in pieces:
+            await writer.write(piece)
+            await asyncio.sleep(0.001)
+        await writer.flush()
+        self.assertTrue(all(f["type"] == "chunk" for f in socket.frames))
+        self.assertEqual("".join(f["data"] for f in socket.frames), "".join(pieces))
+        self.assertLess(len(socket.frames), len(pieces))
+
+    async def test_flush_sends_the_rest_without_waiting_for_the_window(self) -> None:
+        socket = _FakeSocket()
+        writer = self._writer(socket, window_ms=10_000)
+        await writer.write("Hello")
+        await asyncio.sleep(0)
+        await writer.write(", world")
+        await writer.write("!")
+        await asyncio.wait_for(writer.flush(), 1.0)
+        self.assertEqual("".join(f["data"] for f in socket.frames), "Hello, world!")
+        self.assertEqual(socket.frames[-1]["data"], ", world!")
+
+    async def test_max_chars_sends_before_the_window(self) -> None:
+        socket = _FakeSocket()
+        writer = self._writer(socket, window_ms=10_000, max_chars=8)
+        await writer.write("x")
+        await asyncio.sleep(0)
+        await writer.write("abcdefgh")
+        await asyncio.sleep(0.05)
+        self.assertEqual([f["data"] for f in socket.frames], ["x", "abcdefgh"])
+
+    async def test_discard_drops_unsent_text(self) -> None:
+        socket = _FakeSocket()
+        writer = self._writer(socket, window_ms=10_000)
+        await writer.write("sent")
+        await asyncio.sleep(0)
+        await writer.write(" dropped")
+        await writer.discard()
+        await writer.write("next")
+        await writer.flush()
+        self.assertEqual([f["data"] for f in socket.frames], ["sent", "next"])
+
+    async def test_send_error_is_raised_from_flush(self) -> None:
+        writer = self._writer(_FakeSocket(fail=True), window_ms=0)
+        await writer.write("lost")
+        with self.assertRaises(ConnectionError):
+            await asyncio.wait_for(writer.flush(), 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
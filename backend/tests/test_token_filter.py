@@ -0,0 +1,35 @@
+import random
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.token_filter_fuzz import (  # noqa: E402
+    ALLOWED,
+    check_chat_path,
+    check_emotion_path,
+    random_chunks,
+    random_text,
+)
+from chat_streamer import ChatStreamer  # noqa: E402
+from prompt_factory import PromptFactory  # noqa: E402
+
+# Bounded, seeded run of the differential fuzz check; use the script for long runs
+CASES = 2000
+SEED = 1
+
+
+class FusedTokenFilterTest(unittest.TestCase):
+    def test_matches_previous_parsers(self) -> None:
+        rng = random.Random(SEED)
+        streamer = ChatStreamer("", "", "ollama", ALLOWED, PromptFactory("", ALLOWED))
+        for case in range(CASES):
+            chunks = random_chunks(rng, random_text(rng))
+            with self.subTest(case=case, chunks=chunks):
+                self.assertEqual(check_chat_path(streamer, chunks), "")
+                self.assertEqual(check_emotion_path(chunks), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
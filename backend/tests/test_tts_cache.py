@@ -0,0 +1,25 @@
+import asyncio
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tts_cache import TTSCache  # noqa: E402
+
+
+class DiskPutTest(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_puts_of_same_key_count_once(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = TTSCache(max_memory_bytes=0, disk_dir=tmp, max_disk_bytes=1024)
+            data = b"x" * 100
+            await asyncio.gather(*(cache.put("clip", data) for _ in range(4)))
+            stats = cache.stats()
+            self.assertEqual(stats["disk_entries"], 1)
+            self.assertEqual(stats["disk_bytes"], len(data))
+            self.assertEqual(await cache.get("clip"), data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from turn_cache import CachedTurn, TurnCache  # noqa: E402
+
+BASE = {"persona": "You are Mao.", "model": "llama3", "mode": "sync", "user_text": "Hi!", "history_window": ""}
+
+
+def _key(**changes) -> str:
+    return TurnCache.make_key(**{**BASE, **changes})
+
+
+def _turn(reply: str = "Hello there!") -> CachedTurn:
+    return CachedTurn(reply, "Happy", [(reply, "tts-key")])
+
+
+class TurnCacheTest(unittest.TestCase):
+    def test_hit_for_same_request_and_normalized_opener(self) -> None:
+        cache = TurnCache()
+        turn = _turn()
+        cache.put(_key(), turn)
+        self.assertIs(cache.get(_key()), turn)
+        self.assertIs(cache.get(_key(user_text="  hi  ")), turn)
+
+    def test_miss_after_config_or_history_change(self) -> None:
+        cache = TurnCache()
+        cache.put(_key(), _turn())
+        for change in (
+            {"persona": "You are Ellot."},
+            {"model": "mistral"},
+            {"mode": "pipeline"},
+            {"user_text": "hello"},
+            {"history_window": "User: hi\nAssistant: Hello there!"},
+        ):
+            with self.subTest(change=change):
+                self.assertIsNone(cache.get(_key(**change)))
+
+    def test_entries_expire(self) -> None:
+        with mock.patch("turn_cache.time.monotonic", return_value=1000.0) as clock:
+            cache = TurnCache(ttl_seconds=60)
+            cache.put(_key(), _turn())
+            clock.return_value = 1059.0
+            self.assertIsNotNone(cache.get(_key()))
+            clock.return_value = 1060.0
+            self.assertIsNone(cache.get(_key()))
+            self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_entry_is_evicted(self) -> None:
+        cache = TurnCache(max_entries=2)
+        cache.put(_key(user_text="a"), _turn())
+        cache.put(_key(user_text="b"), _turn())
+        cache.get(_key(user_text="a"))
+        cache.put(_key(user_text="c"), _turn())
+        self.assertIsNotNone(cache.get(_key(user_text="a")))
+        self.assertIsNone(cache.get(_key(user_text="b")))
+
+    def test_variants_are_collected_then_rotated(self) -> None:
+        cache = TurnCache(variants=2)
+        first, second = _turn("One."), _turn("Two.")
+        cache.put(_key(), first)
+        self.assertIsNone(cache.get(_key()))
+        cache.put(_key(), second)
+        self.assertEqual([cache.get(_key()) for _ in range(3)], [first, second, first])
+
+    def test_empty_replies_are_not_stored(self) -> None:
+        cache = TurnCache()
+        cache.put(_key(), CachedTurn("  ", None, [("", "tts-key")]))
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from upstream_scheduler import UpstreamScheduler  # noqa: E402
+
+
+class CancelledWaiterTest(unittest.IsolatedAsyncioTestCase):
+    async def test_release_skips_waiter_cancelled_in_same_tick(self) -> None:
+        scheduler = UpstreamScheduler("test", max_inflight=1)
+        await scheduler.acquire(session="a")
+        waiter = asyncio.create_task(scheduler.acquire(session="b"))
+        await asyncio.sleep(0)
+        self.assertEqual(scheduler.stats(), {"inflight": 1, "waiting": 1})
+
+        # Cancel the queued acquire and release before it gets to run its cleanup
+        waiter.cancel()
+        scheduler.release()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(scheduler.stats(), {"inflight": 0, "waiting": 0})
+
+        # The slot is still usable
+        await asyncio.wait_for(scheduler.acquire(session="c"), 1.0)
+        self.assertEqual(scheduler.stats(), {"inflight": 1, "waiting": 0})
+
+    async def test_next_live_waiter_is_granted(self) -> None:
+        scheduler = UpstreamScheduler("test", max_inflight=1)
+        await scheduler.acquire(session="a")
+        cancelled = asyncio.create_task(scheduler.acquire(session="b"))
+        live = asyncio.create_task(scheduler.acquire(session="c"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        scheduler.release()
+        await asyncio.wait_for(live, 1.0)
+        with self.assertRaises(asyncio.CancelledError):
+            await cancelled
+        self.assertEqual(scheduler.stats(), {"inflight": 1, "waiting": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
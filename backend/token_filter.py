@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+
+# Same ranges as ChatStreamer's emoji regex
+EMOJI_RANGES = (
+    (0x1F600, 0x1F64F),  # emoticons
+    (0x1F300, 0x1F5FF),  # symbols & pictographs
+    (0x1F680, 0x1F6FF),  # transport & map symbols
+    (0x1F1E0, 0x1F1FF),  # flags
+    (0x2700, 0x27BF),  # Dingbats
+    (0x1F900, 0x1F9FF),  # Supplemental Symbols and Pictographs
+    (0x2600, 0x26FF),  # Misc symbols
+    (0x2B00, 0x2BFF),  # arrows
+    (0x2300, 0x23FF),  # technical
+)
+
+# ASCII control characters other than \t \n \r (what StreamTextParser's non-English filter drops)
+_CONTROL_TABLE: Dict[int, None] = {cp: None for cp in list(range(0x00, 0x20)) + [0x7F] if cp not in (0x09, 0x0A, 0x0D)}
+_EMOJI_TABLE: Dict[int, None] = {cp: None for lo, hi in EMOJI_RANGES for cp in range(lo, hi + 1)}
+
+
+class FusedTokenFilter:
+    """Single-pass incremental filter for streamed LLM tokens.
+
+    Replaces ChatStreamer._remove_emojis + StreamTextParser (or EmotionTagParser) with one
+    state machine:
+    - Character filtering uses precomputed translation tables (ASCII-only fast path)
+    - Brackets are tracked as state instead of re-joining a carry string with every chunk;
+      tokens without '[' (the common case) pass straight through
+    Output matches the parsers it replaces for the same chunking, including their handling
+    of unclosed '[' at chunk ends. It does not implement StreamTextParser's bare leading-tag
+    detection, which only applies when allowed_tags are given.
+
+    Modes:
+      FusedTokenFilter()  ==  _remove_emojis + StreamTextParser(allowed_tags=None, strip_non_english=True)
+      FusedTokenFilter(allowed, strip_non_english=False, strip_emojis=False, keep_unknown_brackets=True)
+                          ==  EmotionTagParser(allowed, default)
+    """
+
+    __slots__ = ("allowed_set", "strip_non_english", "strip_emojis", "keep_unknown", "_pending", "_in_bracket", "_last_tag")
+
+    def __init__(
+        self,
+        allowed_tags: Optional[List[str]] = None,
+        strip_non_english: bool = True,
+        strip_emojis: bool = True,
+        keep_unknown_brackets: bool = False,
+    ) -> None:
+        self.allowed_set = set(allowed_tags or [])
+        self.strip_non_english = strip_non_english
+        self.strip_emojis = strip_emojis
+        self.keep_unknown = keep_unknown_brackets
+        # Text since the currently open '[' (always starts with '[' while _in_bracket)
+        self._pending = ""
+        self._in_bracket = False
+        self._last_tag: Optional[str] = None
+
+    def _filter_chars(self, chunk: str) -> str:
+        if self.strip_non_english:
+            if not chunk.isascii():
+                # Drops emojis too, since they are all non-ASCII
+                chunk = chunk.encode("ascii", "ignore").decode("ascii")
+            return chunk.translate(_CONTROL_TABLE)
+        if self.strip_emojis and not chunk.isascii():
+            return chunk.translate(_EMOJI_TABLE)
+        return chunk
+
+    def process_chunk(self, chunk: str) -> Tuple[str, List[str]]:
+        if not chunk:
+            return "", []
+        chunk = self._filter_chars(chunk)
+        if not chunk:
+            return "", []
+
+        if not self._in_bracket:
+            open_idx = chunk.find("[")
+            if open_idx == -1:
+                return chunk, []
+            out: List[str] = [chunk[:open_idx]] if open_idx else []
+            i = open_idx
+            self._in_bracket = True
+            self._pending = ""
+        else:
+            out = []
+            i = 0
+
+        tags: List[str] = []
+        allowed = self.allowed_set
+        while True:
+            close_idx = chunk.find("]", i)
+            if close_idx == -1:
+                pending = self._pending + chunk[i:]
+                # Only the segment from the last '[' can still become a tag; emit the rest
+                last_open = pending.rfind("[")
+                if last_open > 0:
+                    out.append(pending[:last_open])
+                    pending = pending[last_open:]
+                self._pending = pending
+                break
+
+            segment = self._pending + chunk[i:close_idx]
+            self._pending = ""
+            self._in_bracket = False
+            inner = segment[1:].strip()
+            if not allowed or inner in allowed:
+                self._last_tag = inner
+                tags.append(inner)
+            elif self.keep_unknown:
+                out.append(segment)
+                out.append("]")
+            i = close_idx + 1
+
+            open_idx = chunk.find("[", i)
+            if open_idx == -1:
+                if i < len(chunk):
+                    out.append(chunk[i:])
+                break
+            if open_idx > i:
+                out.append(chunk[i:open_idx])
+            i = open_idx
+            self._in_bracket = True
+
+        return "".join(out), tags
+
+    def finish(self) -> Tuple[str, Optional[str]]:
+        residual = self._pending
+        self._pending = ""
+        self._in_bracket = False
+        return residual, self._last_tag
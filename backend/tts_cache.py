@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+
+class TTSCache:
+    """Content-addressed cache for synthesized audio.
+
+    - Key: SHA-256 of (text, voice, model, speed, lang_code, format)
+    - Memory tier: LRU bounded by total bytes
+    - Disk tier (optional): one file per key under disk_dir, bounded by total bytes, LRU by access
+    - get_or_create() deduplicates concurrent misses so one upstream call serves every waiter
+    Empty audio and failed syntheses are never cached.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 32 * 1024 * 1024,
+        disk_dir: Optional[str] = None,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ) -> None:
+        self.max_memory_bytes = max(0, int(max_memory_bytes))
+        self.max_disk_bytes = max(0, int(max_disk_bytes))
+        self.disk_dir = disk_dir or None
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._mem_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        # Keys whose file is being written (not yet in _disk)
+        self._disk_writing: Set[str] = set()
+        # key -> [fill task, number of waiters]
+        self._inflight: Dict[str, list] = {}
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "deduplicated": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+        if self.disk_dir:
+            self._load_disk_index()
+
+    @staticmethod
+    def make_key(
+        *,
+        text: str,
+        voice: str,
+        model: str,
+        speed: float,
+        lang_code: str,
+        response_format: str,
+    ) -> str:
+        raw = json.dumps([text, voice, model, float(speed), lang_code, response_format], separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # ---- memory tier ----
+
+    def _mem_get(self, key: str) -> Optional[bytes]:
+        data = self._mem.get(key)
+        if data is not None:
+            self._mem.move_to_end(key)
+        return data
+
+    def _mem_put(self, key: str, data: bytes) -> None:
+        size = len(data)
+        if size > self.max_memory_bytes:
+            return
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._mem_bytes -= len(old)
+        self._mem[key] = data
+        self._mem_bytes += size
+        while self._mem_bytes > self.max_memory_bytes and self._mem:
+            _, evicted = self._mem.popitem(last=False)
+            self._mem_bytes -= len(evicted)
+            self.counters["memory_evictions"] += 1
+
+    # ---- disk tier ----
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir or "", f"{key}.audio")
+
+    def _load_disk_index(self) -> None:
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            entries = []
+            for name in os.listdir(self.disk_dir):
+                if not name.endswith(".audio"):
+                    continue
+                st = os.stat(os.path.join(self.disk_dir, name))
+                entries.append((st.st_mtime, name[: -len(".audio")], st.st_size))
+            for _, key, size in sorted(entries):
+                self._disk[key] = size
+                self._disk_bytes += size
+        except Exception:
+            # A broken cache directory only disables the disk tier
+            self.disk_dir = None
+            self._disk.clear()
+            self._disk_bytes = 0
+
+    def _read_file(self, key: str) -> Optional[bytes]:
+        try:
+            path = self._path(key)
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except Exception:
+            return None
+
+    def _write_file(self, key: str, data: bytes) -> bool:
+        try:
+            path = self._path(key)
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            return True
+        except Exception:
+            return False
+
+    def _remove_file(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except Exception:
+            pass
+
+    async def _disk_get(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir or key not in self._disk:
+            return None
+        data = await asyncio.to_thread(self._read_file, key)
+        if data is None:
+            self._disk_bytes -= self._disk.pop(key, 0)
+            return None
+        self._disk.move_to_end(key)
+        return data
+
+    async def _disk_put(self, key: str, data: bytes) -> None:
+        size = len(data)
+        if not self.disk_dir or size > self.max_disk_bytes or key in self._disk or key in self._disk_writing:
+            return
+        # Reserved until the write is indexed: a concurrent put of the same clip must neither
+        # count its bytes twice nor write the same temp file
+        self._disk_writing.add(key)
+        try:
+            if not await asyncio.to_thread(self._write_file, key, data):
+                return
+        finally:
+            self._disk_writing.discard(key)
+        self._disk[key] = size
+        self._disk_bytes += size
+        evicted = []
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            old_key, old_size = self._disk.popitem(last=False)
+            self._disk_bytes -= old_size
+            evicted.append(old_key)
+            self.counters["disk_evictions"] += 1
+        for old_key in evicted:
+            await asyncio.to_thread(self._remove_file, old_key)
+
+    # ---- public API ----
+
+    async def get(self, key: str) -> Optional[bytes]:
+        data = self._mem_get(key)
+        if data is not None:
+            self.counters["memory_hits"] += 1
+            return data
+        data = await self._disk_get(key)
+        if data is not None:
+            self.counters["disk_hits"] += 1
+            self._mem_put(key, data)
+            return data
+        return None
+
+    async def put(self, key: str, data: bytes) -> None:
+        if not data:
+            return
+        self._mem_put(key, data)
+        await self._disk_put(key, data)
+
+    async def _fill(self, key: str, factory: Callable[[], Awaitable[bytes]]) -> bytes:
+        try:
+            data = await factory()
+            await self.put(key, data)
+            return data
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get_or_create(self, key: str, factory: Callable[[], Awaitable[bytes]]) -> bytes:
+        data = await self.get(key)
+        if data is not None:
+            return data
+        entry = self._inflight.get(key)
+        if entry is None:
+            self.counters["misses"] += 1
+            # The upstream call runs as its own task so one cancelled waiter does not fail the others
+            entry = [asyncio.create_task(self._fill(key, factory)), 0]
+            self._inflight[key] = entry
+        else:
+            self.counters["deduplicated"] += 1
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                # Nobody is waiting any more; release the upstream request
+                task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **self.counters,
+            "memory_bytes": self._mem_bytes,
+            "memory_entries": len(self._mem),
+            "disk_bytes": self._disk_bytes,
+            "disk_entries": len(self._disk),
+        }
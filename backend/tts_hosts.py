@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Sequence
+
+from metrics import Counter, registry
+from upstream_scheduler import schedulers
+
+TTS_HEDGES = registry.register(Counter(
+    "vtuber_tts_hedge_total",
+    "Hedged TTS requests: backups sent, and how many of those answered first.",
+    labelnames=("event",),
+))
+
+# Latency is tracked per character of input (with this floor) so short and long texts share
+# one distribution: a one-word clip should not wait as long as a paragraph before hedging
+_MIN_CHARS = 20
+# Observations needed before the measured quantile replaces TTS_HEDGE_DEFAULT_MS
+_MIN_SAMPLES = 20
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class LatencyWindow:
+    """Recent observations with quantile lookup (small window, sorted on demand)."""
+
+    def __init__(self, size: int = 256) -> None:
+        self._values: Deque[float] = deque(maxlen=max(1, int(size)))
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def observe(self, value: float) -> None:
+        self._values.append(value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self._values:
+            return None
+        ordered = sorted(self._values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class TTSHostPool:
+    """Hedged requests across TTS endpoints that serve the same voices.
+
+    run() sends the request to the host with the fewest requests in flight (then the lowest
+    median latency). If it has not answered after the hedge delay, the same request goes to
+    the next host as well; the first successful answer wins and the other request is
+    cancelled. A primary that fails before the delay triggers the backup at once.
+    - Hedge delay: the `quantile` (default p95) of recent latency per character, times this
+      request's length, clamped to [min_delay, max_delay]; `default_delay` until enough samples
+    - No backup is sent while the "tts" upstream scheduler has requests waiting: hedging is
+      only worth it with spare capacity
+    Tuning (env): TTS_HEDGE_QUANTILE (0.95), TTS_HEDGE_MIN_MS (50), TTS_HEDGE_MAX_MS (3000),
+    TTS_HEDGE_DEFAULT_MS (1000); TTS_HEDGE=0 disables hedging (requests still spread).
+    """
+
+    def __init__(self, hosts: Sequence[str] = ()) -> None:
+        self.enabled = bool(int(os.getenv("TTS_HEDGE", "1")))
+        self.quantile = min(0.999, max(0.5, _env_float("TTS_HEDGE_QUANTILE", 0.95)))
+        self.min_delay = max(0.0, _env_float("TTS_HEDGE_MIN_MS", 50.0) / 1000.0)
+        self.max_delay = max(self.min_delay, _env_float("TTS_HEDGE_MAX_MS", 3000.0) / 1000.0)
+        self.default_delay = _env_float("TTS_HEDGE_DEFAULT_MS", 1000.0) / 1000.0
+        self.hosts: List[str] = []
+        self._latency = LatencyWindow()
+        self._host_latency: Dict[str, LatencyWindow] = {}
+        self._inflight: Dict[str, int] = {}
+        self.configure(hosts)
+
+    def configure(self, hosts: Sequence[str]) -> None:
+        self.hosts = []
+        for host in hosts:
+            host = str(host or "").strip().rstrip("/")
+            if host and host not in self.hosts:
+                self.hosts.append(host)
+        self._host_latency = {h: self._host_latency.get(h) or LatencyWindow(64) for h in self.hosts}
+        self._inflight = {h: self._inflight.get(h, 0) for h in self.hosts}
+
+    def __len__(self) -> int:
+        return len(self.hosts)
+
+    def routes(self, host: str) -> bool:
+        """True when requests for `host` are spread/hedged by this pool (more than one host)."""
+        return len(self.hosts) > 1 and bool(host) and host.rstrip("/") in self.hosts
+
+    def hedge_delay(self, chars: int) -> float:
+        if len(self._latency) < _MIN_SAMPLES:
+            delay = self.default_delay
+        else:
+            delay = (self._latency.quantile(self.quantile) or 0.0) * max(chars, _MIN_CHARS)
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def _ranked(self) -> List[str]:
+        def key(host: str):
+            median = self._host_latency[host].quantile(0.5)
+            return (self._inflight.get(host, 0), median if median is not None else 0.0)
+
+        return sorted(self.hosts, key=key)
+
+    def pick(self) -> str:
+        return self._ranked()[0]
+
+    @contextmanager
+    def track(self, host: str) -> Iterator[None]:
+        self._inflight[host] = self._inflight.get(host, 0) + 1
+        try:
+            yield
+        finally:
+            self._inflight[host] = max(0, self._inflight.get(host, 0) - 1)
+
+    async def _attempt(self, host: str, call: Callable[[str], Awaitable[bytes]], chars: int) -> bytes:
+        started = time.perf_counter()
+
+        def per_char() -> float:
+            return (time.perf_counter() - started) / max(chars, _MIN_CHARS)
+
+        try:
+            with self.track(host):
+                audio = await call(host)
+        except asyncio.CancelledError:
+            # Lost the race: its latency is at least this much, so a host that keeps losing
+            # stops ranking first instead of never being measured
+            window = self._host_latency.get(host)
+            if window is not None:
+                window.observe(per_char())
+            raise
+        if audio:
+            self._latency.observe(per_char())
+            window = self._host_latency.get(host)
+            if window is not None:
+                window.observe(per_char())
+        return audio
+
+    async def run(self, call: Callable[[str], Awaitable[bytes]], chars: int) -> bytes:
+        """call(host) performs one synthesis against `host`; returns the first audio to arrive."""
+        ranked = self._ranked()
+        primary = asyncio.create_task(self._attempt(ranked[0], call, chars))
+        if not self.enabled or len(ranked) < 2:
+            return await primary
+        tasks = {primary}
+        backup: Optional[asyncio.Task] = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(chars))
+            if done and not primary.exception() and primary.result():
+                return primary.result()
+            if done or not schedulers.get("tts").waiting:
+                backup = asyncio.create_task(self._attempt(ranked[1], call, chars))
+                TTS_HEDGES.inc(event="sent")
+                tasks.add(backup)
+            error: Optional[BaseException] = None
+            pending = {t for t in tasks if not t.done()}
+            finished = [t for t in tasks if t.done()]
+            while True:
+                for task in finished:
+                    if task.exception() is None and task.result():
+                        if task is backup:
+                            TTS_HEDGES.inc(event="backup_won")
+                        return task.result()
+                    error = task.exception() or error
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                finished = list(done)
+            if error is not None:
+                raise error
+            return b""
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+
+# Configured by server.py from TTS_HOST (comma-separated for several endpoints)
+tts_pool = TTSHostPool()
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import asyncio
+from typing import AsyncGenerator, Awaitable, Callable, List, Optional, Tuple
+
+
+class SentenceSplitter:
+    """Incremental splitter that turns cleaned stream text into speakable segments.
+
+    - feed(text) returns the segments completed by this piece of text
+    - flush() returns whatever is left once the stream ends
+    Segments keep their trailing whitespace so that "".join(segments) is the original text.
+    """
+
+    _TERMINATORS = ".!?"
+    _CLOSERS = ".!?\"')"
+    _CLAUSE_BREAKS = ",;:"
+    _ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "vs", "etc", "e.g", "i.e", "jr", "sr"}
+
+    def __init__(self, min_chars: int = 12, max_chars: int = 240) -> None:
+        self.min_chars = max(1, int(min_chars))
+        self.max_chars = max(self.min_chars, int(max_chars))
+        self._buf = ""
+        # Index where scanning for a boundary resumes; everything before it has been checked
+        self._scan = 0
+
+    def _is_abbreviation(self, end: int) -> bool:
+        start = end
+        while start > 0 and (self._buf[start - 1].isalpha() or self._buf[start - 1] == "."):
+            start -= 1
+        return self._buf[start:end].lower() in self._ABBREVIATIONS
+
+    def _find_boundary(self) -> int:
+        """Return the end index (exclusive) of the first complete segment, or -1."""
+        buf = self._buf
+        i = self._scan
+        n = len(buf)
+        while i < n:
+            ch = buf[i]
+            if ch == "\n":
+                # The persona prompts ask for short separate lines, so a newline always ends a segment
+                end = i + 1
+                while end < n and buf[end].isspace():
+                    end += 1
+                return end
+            if ch in self._TERMINATORS:
+                j = i + 1
+                while j < n and buf[j] in self._CLOSERS:
+                    j += 1
+                if j >= n:
+                    # Cannot tell yet whether whitespace follows; wait for the next token
+                    self._scan = i
+                    return -1
+                # Require trailing whitespace so decimals and URLs do not split
+                if buf[j].isspace() and not (ch == "." and self._is_abbreviation(i)):
+                    while j < n and buf[j].isspace():
+                        j += 1
+                    return j
+                i = j
+                continue
+            i += 1
+        self._scan = n
+        return -1
+
+    def _split_long(self) -> int:
+        """Pick a clause or word break once the buffer grows past max_chars."""
+        window = self._buf[: self.max_chars]
+        for breaks in (self._CLAUSE_BREAKS, " "):
+            idx = max(window.rfind(b) for b in breaks)
+            if idx >= self.min_chars:
+                end = idx + 1
+                while end < len(self._buf) and self._buf[end].isspace():
+                    end += 1
+                return end
+        return self.max_chars
+
+    def feed(self, text: str) -> List[str]:
+        if not text:
+            return []
+        self._buf += text
+        out: List[str] = []
+        while True:
+            end = self._find_boundary()
+            if end == -1:
+                if len(self._buf) > self.max_chars:
+                    end = self._split_long()
+                else:
+                    break
+            if len(self._buf[:end].strip()) < self.min_chars:
+                # Too short to be worth a separate TTS request; merge with what follows
+                self._scan = end
+                if end >= len(self._buf):
+                    break
+                continue
+            out.append(self._buf[:end])
+            self._buf = self._buf[end:]
+            self._scan = 0
+        return out
+
+    def flush(self) -> Optional[str]:
+        rest = self._buf
+        self._buf = ""
+        self._scan = 0
+        return rest or None
+
+
+def is_speakable(text: str) -> bool:
+    return any(ch.isalnum() for ch in text or "")
+
+
+class SpeechPipeline:
+    """Synthesizes text segments concurrently and yields them back in submission order.
+
+    Usage:
+      pipeline = SpeechPipeline(synthesize, concurrency=2)
+      pipeline.submit(segment)         # from the producer, as segments complete
+      pipeline.close()                 # once the producer is done
+      async for seq, text, audio in pipeline.results(): ...
+    Synthesis failures yield empty audio so the text can still be delivered.
+    """
+
+    def __init__(self, synthesize: Callable[[str], Awaitable[bytes]], concurrency: int = 2) -> None:
+        self._synthesize = synthesize
+        self._sem = asyncio.Semaphore(max(1, int(concurrency)))
+        self._queue: "asyncio.Queue[Optional[Tuple[int, str, Optional[asyncio.Task]]]]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._next_seq = 0
+
+    async def _run(self, text: str) -> bytes:
+        async with self._sem:
+            try:
+                return await self._synthesize(text.strip())
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                return b""
+
+    def submit(self, text: str) -> int:
+        seq = self._next_seq
+        self._next_seq += 1
+        task: Optional[asyncio.Task] = None
+        if is_speakable(text):
+            task = asyncio.create_task(self._run(text))
+            self._tasks.append(task)
+        self._queue.put_nowait((seq, text, task))
+        return seq
+
+    def close(self) -> None:
+        self._queue.put_nowait(None)
+
+    def cancel(self) -> None:
+        for task in self._tasks:
+            if not task.done():
+                task.cancel()
+
+    async def results(self) -> AsyncGenerator[Tuple[int, str, bytes], None]:
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is None:
+                    return
+                seq, text, task = item
+                audio = (await task) if task is not None else b""
+                yield seq, text, audio or b""
+        finally:
+            self.cancel()
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
+
+from metrics import Counter, registry
+
+# A segment's audio is either a TTSCache key (preferred, audio bytes live once) or the bytes
+AudioRef = Union[str, bytes]
+
+_EDGE_PUNCT = re.compile(r"^[\s\"'`~.,!?;:()\-]+|[\s\"'`~.,!?;:()\-]+$")
+
+TURN_CACHE_EVENTS = registry.register(Counter(
+    "vtuber_turn_cache_events_total",
+    "Turn cache lookups and stores.",
+    labelnames=("event",),
+))
+
+
+def normalize_user_text(text: str) -> str:
+    """Case, whitespace and edge punctuation insensitive: "Hi!!" and " hi " are the same opener."""
+    text = " ".join((text or "").lower().split())
+    return _EDGE_PUNCT.sub("", text)
+
+
+class CachedTurn:
+    """One complete reply: cleaned text, emotion and the audio of each delivered segment."""
+
+    __slots__ = ("reply", "emotion", "segments")
+
+    def __init__(self, reply: str, emotion: Optional[str], segments: List[Tuple[str, AudioRef]]) -> None:
+        self.reply = reply
+        self.emotion = emotion
+        self.segments = segments
+
+
+class _Entry:
+    __slots__ = ("variants", "next", "expires")
+
+    def __init__(self, expires: float) -> None:
+        self.variants: List[CachedTurn] = []
+        self.next = 0
+        self.expires = expires
+
+
+class TurnCache:
+    """Exact-match cache of whole turns for repeated openers.
+
+    - Key: SHA-256 of (persona prompt, model, delivery mode, normalized user text, history
+      window text). Any earlier conversation that reaches the prompt changes the key, so only
+      genuinely identical requests share a reply.
+    - Entries expire `ttl_seconds` after they were created; at most `max_entries` are kept (LRU)
+    - With `variants` > 1 the first N requests for a key are generated and stored, later hits
+      rotate through them so repeated openers do not always get the same answer
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 600.0, variants: int = 1) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = max(1.0, float(ttl_seconds))
+        self.variants = max(1, int(variants))
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    @staticmethod
+    def make_key(*, persona: str, model: str, mode: str, user_text: str, history_window: str) -> str:
+        raw = json.dumps([persona, model, mode, normalize_user_text(user_text), history_window], separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _live(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key: str) -> Optional[CachedTurn]:
+        entry = self._live(key)
+        # Still collecting variants: let this request generate another one
+        if entry is None or len(entry.variants) < self.variants:
+            TURN_CACHE_EVENTS.inc(event="miss")
+            return None
+        turn = entry.variants[entry.next % len(entry.variants)]
+        entry.next += 1
+        TURN_CACHE_EVENTS.inc(event="hit")
+        return turn
+
+    def put(self, key: str, turn: CachedTurn) -> None:
+        if not turn.reply.strip() or not turn.segments:
+            return
+        entry = self._live(key)
+        if entry is None:
+            entry = _Entry(time.monotonic() + self.ttl)
+            self._entries[key] = entry
+        if len(entry.variants) >= self.variants:
+            return
+        entry.variants.append(turn)
+        TURN_CACHE_EVENTS.inc(event="store")
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        self._entries.pop(key, None)
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+from metrics import Counter, Gauge, registry
+
+
+class Priority(IntEnum):
+    """Lower value is served first."""
+
+    CHAT = 0  # interactive replies and their speech
+    CLASSIFY = 1  # one-word emotion selection
+    BACKGROUND = 2  # history summaries and other deferred work
+
+
+class UpstreamBusy(Exception):
+    """Raised when an upstream's wait queue is full; callers should answer "busy" quickly."""
+
+    def __init__(self, upstream: str) -> None:
+        super().__init__(f"{upstream} upstream is busy")
+        self.upstream = upstream
+
+
+# Session the current task works for (set per WebSocket connection; tasks inherit it)
+current_session: contextvars.ContextVar[str] = contextvars.ContextVar("current_session", default="")
+
+UPSTREAM_QUEUED = registry.register(Gauge(
+    "vtuber_upstream_queued_requests",
+    "Requests waiting for an upstream slot, by priority class.",
+    labelnames=("upstream", "priority"),
+))
+UPSTREAM_REJECTED = registry.register(Counter(
+    "vtuber_upstream_rejected_total",
+    "Requests rejected because an upstream queue was full.",
+    labelnames=("upstream",),
+))
+
+
+class UpstreamScheduler:
+    """Admission control for one upstream (Ollama or TTS), shared by every session.
+
+    - At most `max_inflight` requests run at once (0 = unlimited, no queueing)
+    - Waiters are served by priority class first; within a class, sessions take turns
+      round-robin, so one chatty session cannot starve the others
+    - When `max_queue` requests are already waiting, acquire fails at once with UpstreamBusy
+    A slot is held for the whole request, including a streamed response body.
+    """
+
+    def __init__(self, name: str, max_inflight: int, max_queue: int = 64) -> None:
+        self.name = name
+        self.max_inflight = max(0, int(max_inflight))
+        self.max_queue = max(0, int(max_queue))
+        self.inflight = 0
+        self.waiting = 0
+        # priority -> session -> FIFO of waiters; OrderedDict order is the round-robin order
+        self._queues: Dict[int, "OrderedDict[str, Deque[asyncio.Future]]"] = {p: OrderedDict() for p in Priority}
+
+    def _grant(self) -> None:
+        while self.waiting and self.inflight < self.max_inflight:
+            for priority, sessions in self._queues.items():
+                if sessions:
+                    break
+            else:
+                return
+            session, waiters = next(iter(sessions.items()))
+            fut = waiters.popleft()
+            if waiters:
+                sessions.move_to_end(session)
+            else:
+                del sessions[session]
+            self.waiting -= 1
+            UPSTREAM_QUEUED.dec(upstream=self.name, priority=priority.name.lower())
+            if fut.done():
+                # Cancelled while queued (barge-in, deadline, losing hedge) but not yet removed
+                continue
+            self.inflight += 1
+            fut.set_result(None)
+
+    def _remove(self, priority: Priority, session: str, fut: asyncio.Future) -> None:
+        waiters = self._queues[priority].get(session)
+        if waiters is None or fut not in waiters:
+            return
+        waiters.remove(fut)
+        if not waiters:
+            del self._queues[priority][session]
+        self.waiting -= 1
+        UPSTREAM_QUEUED.dec(upstream=self.name, priority=priority.name.lower())
+
+    async def acquire(self, priority: Priority = Priority.CHAT, session: Optional[str] = None) -> None:
+        if self.max_inflight == 0 or (self.inflight < self.max_inflight and not self.waiting):
+            self.inflight += 1
+            return
+        if self.waiting >= self.max_queue:
+            UPSTREAM_REJECTED.inc(upstream=self.name)
+            raise UpstreamBusy(self.name)
+
+        key = current_session.get() if session is None else session
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(key, deque()).append(fut)
+        self.waiting += 1
+        UPSTREAM_QUEUED.inc(upstream=self.name, priority=priority.name.lower())
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Granted and cancelled in the same tick: hand the slot on
+                self.release()
+            else:
+                self._remove(priority, key, fut)
+            raise
+
+    def release(self) -> None:
+        self.inflight = max(0, self.inflight - 1)
+        self._grant()
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.CHAT, session: Optional[str] = None) -> AsyncIterator[None]:
+        await self.acquire(priority, session)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {"inflight": self.inflight, "waiting": self.waiting}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class SchedulerRegistry:
+    """One UpstreamScheduler per upstream name, configured from the environment.
+
+    Tuning (env): LLM_MAX_INFLIGHT (default 4 per LLM host, match OLLAMA_NUM_PARALLEL),
+    TTS_MAX_INFLIGHT (default 8), UPSTREAM_MAX_QUEUE (default 64); 0 disables a limit.
+    """
+
+    def __init__(self) -> None:
+        self._schedulers: Dict[str, UpstreamScheduler] = {}
+        self._default_inflight: Dict[str, int] = {"llm": 4, "tts": 8}
+
+    def set_default_inflight(self, name: str, max_inflight: int) -> None:
+        """Default cap for `name` when its {NAME}_MAX_INFLIGHT env var is not set."""
+        self._default_inflight[name] = max(0, int(max_inflight))
+        scheduler = self._schedulers.get(name)
+        if scheduler is not None and os.getenv(f"{name.upper()}_MAX_INFLIGHT") is None:
+            scheduler.max_inflight = self._default_inflight[name]
+            scheduler._grant()
+
+    def get(self, name: str) -> UpstreamScheduler:
+        scheduler = self._schedulers.get(name)
+        if scheduler is None:
+            scheduler = UpstreamScheduler(
+                name,
+                max_inflight=_env_int(f"{name.upper()}_MAX_INFLIGHT", self._default_inflight.get(name, 0)),
+                max_queue=_env_int("UPSTREAM_MAX_QUEUE", 64),
+            )
+            self._schedulers[name] = scheduler
+        return scheduler
+
+    def names(self) -> List[str]:
+        return list(self._schedulers)
+
+
+schedulers = SchedulerRegistry()
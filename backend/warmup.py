@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from http_clients import http_clients
+from upstream_scheduler import Priority, schedulers
+
+WarmupStep = Callable[[], Awaitable[None]]
+
+
+async def preload_ollama_model(
+    host: str,
+    model: str,
+    keep_alive: Optional[str] = None,
+    client: Optional[httpx.AsyncClient] = None,
+) -> None:
+    """Load the model into Ollama's memory without generating (empty prompt).
+
+    Also refreshes the model's keep_alive timer, so the same call serves as a keep-alive ping.
+    """
+    payload: Dict[str, object] = {"model": model, "prompt": "", "stream": False}
+    if keep_alive:
+        payload["keep_alive"] = keep_alive
+    client = client or http_clients.get("llm")
+    async with schedulers.get("llm").slot(Priority.BACKGROUND):
+        resp = await client.post(f"{host.rstrip('/')}/api/generate", json=payload)
+        resp.raise_for_status()
+
+
+class Warmup:
+    """Startup warmup steps plus the readiness they gate.
+
+    run() executes every step concurrently and retries failed ones with backoff (up to
+    `max_backoff` seconds) until all have succeeded once; `ready` turns true at that point.
+    keep_warm() repeats the given ping every `interval` seconds for the life of the process,
+    so the model is not unloaded during quiet periods.
+    """
+
+    def __init__(self, steps: Dict[str, WarmupStep], max_backoff: float = 30.0) -> None:
+        self.steps = steps
+        self.max_backoff = max(1.0, float(max_backoff))
+        self.status: Dict[str, str] = {name: "pending" for name in steps}
+        self.durations_ms: Dict[str, float] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def ready(self) -> bool:
+        return all(state == "ok" for state in self.status.values())
+
+    async def _run_step(self, name: str, step: WarmupStep) -> None:
+        delay = 1.0
+        while True:
+            t0 = time.perf_counter()
+            try:
+                await step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.status[name] = f"error: {type(e).__name__}: {e}"[:200]
+                await asyncio.sleep(delay)
+                delay = min(self.max_backoff, delay * 2)
+                continue
+            self.durations_ms[name] = round((time.perf_counter() - t0) * 1000.0, 1)
+            self.status[name] = "ok"
+            return
+
+    async def run(self) -> None:
+        await asyncio.gather(*(self._run_step(name, step) for name, step in self.steps.items()))
+
+    async def _keep_warm(self, ping: WarmupStep, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await ping()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Next ping retries; a cold model only costs the next user a load
+                continue
+
+    def start(self, ping: Optional[WarmupStep] = None, interval: float = 0.0) -> None:
+        self._tasks.append(asyncio.create_task(self.run()))
+        if ping is not None and interval > 0:
+            self._tasks.append(asyncio.create_task(self._keep_warm(ping, interval)))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._tasks = []
+
+    def report(self) -> Dict[str, object]:
+        return {"ready": self.ready, "steps": dict(self.status), "durations_ms": dict(self.durations_ms)}
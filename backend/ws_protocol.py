@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from lipsync import compute_envelope
+from metrics import Counter, registry, span
+
+TEXT_STREAM_EVENTS = registry.register(Counter(
+    "vtuber_text_stream_events_total",
+    "Live text streaming: text pieces written and WebSocket frames they were coalesced into.",
+    labelnames=("event",),
+))
+
+
+class ClientOptions:
+    """Per-connection protocol options negotiated from the client's hello message.
+
+    Client -> Server: { "type": "hello", "audio": "binary", "barge_in": true, "lipsync": true,
+                        "audio_stream": true, "text_stream": true }
+    Server -> Client: { "type": "hello", "audio": "binary" | "base64", "barge_in": bool,
+                        "lipsync": bool, "audio_stream": bool, "text_stream": bool }
+    Clients that never send a hello get the original base64-in-JSON audio events and
+    one-turn-at-a-time handling. barge_in is only granted when the server runs with BARGE_IN=1,
+    lipsync (a "mouth" envelope before each clip) when it runs with LIPSYNC=1, audio_stream
+    (see send_audio_stream) to binary-audio clients without lipsync when it runs with TTS_STREAM=1,
+    text_stream (reply text as it is generated, see TextStreamWriter) with TEXT_STREAM=1.
+    """
+
+    __slots__ = (
+        "binary_audio",
+        "barge_in",
+        "barge_in_supported",
+        "lipsync",
+        "lipsync_ms",
+        "audio_stream",
+        "audio_stream_supported",
+        "text_stream",
+        "text_stream_supported",
+    )
+
+    def __init__(
+        self,
+        barge_in_supported: bool = False,
+        lipsync_ms: int = 0,
+        audio_stream_supported: bool = False,
+        text_stream_supported: bool = False,
+    ) -> None:
+        self.binary_audio = False
+        self.barge_in = False
+        self.barge_in_supported = barge_in_supported
+        self.lipsync = False
+        self.audio_stream = False
+        self.audio_stream_supported = audio_stream_supported
+        self.text_stream = False
+        self.text_stream_supported = text_stream_supported
+        # Envelope frame length offered by the server; 0 = lip-sync disabled
+        self.lipsync_ms = max(0, int(lipsync_ms))
+
+    @property
+    def tts_format(self) -> str:
+        """Audio format to request from TTS: WAV for the lip-sync envelope, MP3 otherwise."""
+        return "wav" if self.lipsync else "mp3"
+
+    @property
+    def envelope_ms(self) -> int:
+        """Frame length for send_audio's mouth envelope (0 = do not send one)."""
+        return self.lipsync_ms if self.lipsync else 0
+
+    def update(self, hello: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply a hello payload and return the server's acknowledgement."""
+        self.binary_audio = str(hello.get("audio") or "").lower() == "binary"
+        self.barge_in = self.barge_in_supported and bool(hello.get("barge_in"))
+        self.lipsync = self.lipsync_ms > 0 and bool(hello.get("lipsync"))
+        # WAV (needed for the envelope) cannot be played progressively through MediaSource
+        self.audio_stream = (
+            self.audio_stream_supported and self.binary_audio and not self.lipsync and bool(hello.get("audio_stream"))
+        )
+        self.text_stream = self.text_stream_supported and bool(hello.get("text_stream"))
+        return {
+            "type": "hello",
+            "audio": "binary" if self.binary_audio else "base64",
+            "barge_in": self.barge_in,
+            "lipsync": self.lipsync,
+            "audio_stream": self.audio_stream,
+            "text_stream": self.text_stream,
+        }
+
+
+def is_hello(payload: Any) -> bool:
+    return isinstance(payload, dict) and payload.get("type") == "hello"
+
+
+async def send_json(websocket: WebSocket, obj: Dict[str, Any]) -> None:
+    await websocket.send_text(json.dumps(obj))
+
+
+async def send_audio(
+    websocket: WebSocket,
+    audio: bytes,
+    *,
+    fmt: str,
+    binary: bool,
+    seq: Optional[int] = None,
+    envelope_ms: int = 0,
+) -> None:
+    """Send one audio clip.
+
+    binary: a JSON header { "type": "audio", "encoding": "binary", "bytes": n, ... }
+            followed by one binary frame holding the raw audio (no base64, no copy).
+    base64: the original { "type": "audio", "format": ..., "data": "<base64>" } text frame.
+    With envelope_ms > 0 and WAV audio, a { "type": "mouth", ... } frame (see
+    lipsync.MouthEnvelope) with the clip's mouth-opening envelope goes out first.
+    Callers that send from several tasks must hold their send lock around this call so the
+    header and its binary frame stay adjacent.
+    """
+    header: Dict[str, Any] = {"type": "audio", "format": fmt}
+    if seq is not None:
+        header["seq"] = seq
+    if envelope_ms > 0:
+        with span("lipsync"):
+            envelope = compute_envelope(audio, fmt, envelope_ms)
+        if envelope is not None:
+            await websocket.send_text(json.dumps(envelope.to_message(seq)))
+    with span("audio_send"):
+        if binary:
+            header["encoding"] = "binary"
+            header["bytes"] = len(audio)
+            await websocket.send_text(json.dumps(header))
+            await websocket.send_bytes(audio)
+            return
+        header["data"] = base64.b64encode(audio).decode("ascii")
+        await websocket.send_text(json.dumps(header))
+
+
+async def send_audio_stream(
+    websocket: WebSocket,
+    chunks: AsyncIterator[bytes],
+    *,
+    fmt: str,
+    seq: Optional[int] = None,
+) -> int:
+    """Forward one clip chunk by chunk while it is still being synthesized.
+
+    The header { "type": "audio", "format": ..., "encoding": "binary", "stream": true } goes
+    out with the first chunk, every chunk follows as its own binary frame, and
+    { "type": "audio_end", "bytes": n } closes the clip. If the upstream fails midway the
+    closing event carries "error": true (the client keeps what it got) and the error is
+    re-raised; if it fails before the first chunk nothing is sent. Returns the bytes sent.
+    """
+    sent = 0
+    header: Dict[str, Any] = {"type": "audio", "format": fmt, "encoding": "binary", "stream": True}
+    end: Dict[str, Any] = {"type": "audio_end"}
+    if seq is not None:
+        header["seq"] = seq
+        end["seq"] = seq
+    iterator = chunks.__aiter__()
+    while True:
+        try:
+            chunk = await iterator.__anext__()
+        except StopAsyncIteration:
+            break
+        except (asyncio.CancelledError, WebSocketDisconnect):
+            raise
+        except Exception:
+            if sent:
+                await websocket.send_text(json.dumps({**end, "bytes": sent, "error": True}))
+            raise
+        if not chunk:
+            continue
+        with span("audio_send"):
+            if not sent:
+                await websocket.send_text(json.dumps(header))
+            await websocket.send_bytes(chunk)
+        sent += len(chunk)
+    if sent:
+        await websocket.send_text(json.dumps({**end, "bytes": sent}))
+    return sent
+
+
+class TextStreamWriter:
+    """Per-connection writer that streams reply text in a few coalesced frames.
+
+    write() buffers a piece of text; the writer task sends everything buffered as one
+    { "type": "chunk", "data": str } frame, at most once per `window_ms` (a piece arriving
+    after a quiet period goes out at once) or as soon as `max_chars` are buffered.
+    - While a send is slow, new text keeps collecting into the next frame; once
+      `max_pending` characters are waiting, write() blocks until the socket catches up,
+      which in turn pauses reading the LLM stream
+    - flush() returns when everything written so far has been sent; call it before sending
+      other frames on the socket so they stay in order
+    - discard() drops unsent text (cancelled turn) and waits for an in-flight frame
+    A failed send (disconnect) is re-raised from the next write()/flush().
+    """
+
+    def __init__(self, websocket: WebSocket, window_ms: float = 30.0, max_chars: int = 1024, max_pending: int = 65536) -> None:
+        self.websocket = websocket
+        self.window = max(0.0, float(window_ms)) / 1000.0
+        self.max_chars = max(1, int(max_chars))
+        self.max_pending = max(self.max_chars, int(max_pending))
+        self._parts: List[str] = []
+        self._size = 0
+        self._sending = False
+        self._last_sent = 0.0
+        self._error: Optional[BaseException] = None
+        self._has_data = asyncio.Event()
+        self._full = asyncio.Event()
+        self._room = asyncio.Event()
+        self._room.set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def _check(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    async def write(self, text: str) -> None:
+        self._check()
+        if not text:
+            return
+        while self._size >= self.max_pending:
+            await self._room.wait()
+            self._check()
+        self._parts.append(text)
+        self._size += len(text)
+        TEXT_STREAM_EVENTS.inc(event="write")
+        self._idle.clear()
+        self._has_data.set()
+        if self._size >= self.max_chars:
+            self._full.set()
+        if self._size >= self.max_pending:
+            self._room.clear()
+
+    async def flush(self) -> None:
+        if self._parts:
+            self._full.set()
+        await self._idle.wait()
+        self._check()
+
+    async def discard(self) -> None:
+        self._parts = []
+        self._size = 0
+        self._has_data.clear()
+        self._room.set()
+        if not self._sending:
+            self._idle.set()
+        await self._idle.wait()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                await self._has_data.wait()
+                delay = self._last_sent + self.window - loop.time()
+                if delay > 0 and not self._full.is_set():
+                    try:
+                        await asyncio.wait_for(self._full.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                parts, self._parts = self._parts, []
+                self._size = 0
+                self._has_data.clear()
+                self._full.clear()
+                self._room.set()
+                if parts:
+                    self._sending = True
+                    try:
+                        await self.websocket.send_text(json.dumps({"type": "chunk", "data": "".join(parts)}))
+                    finally:
+                        self._sending = False
+                    self._last_sent = loop.time()
+                    TEXT_STREAM_EVENTS.inc(event="frame")
+                if not self._parts:
+                    self._idle.set()
+        except Exception as e:
+            self._error = e
+            self._room.set()
+            self._idle.set()
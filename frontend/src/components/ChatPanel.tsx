@@ -1,19 +1,71 @@
 import { useEffect, useMemo, useRef, useState } from 'react'
-import { appEvents } from '../events'
+import { appEvents, type MouthEnvelope } from '../events'
 
 type StreamMessage =
   | { type: 'start' }
-  | { type: 'chunk'; data: string }
-  | { type: 'end' }
+  | { type: 'chunk'; data: string; seq?: number }
+  | { type: 'end'; cancelled?: boolean }
   | { type: 'error'; message: string }
   | { type: 'emotion'; emotion: string }
-  | { type: 'audio'; format?: 'mp3' | 'wav' | string; data: string }
+  | { type: 'audio'; format?: 'mp3' | 'wav' | string; data?: string; seq?: number; encoding?: 'binary'; bytes?: number; stream?: boolean }
+  | { type: 'audio_end'; bytes: number; error?: boolean; seq?: number }
+  | { type: 'hello'; audio: 'binary' | 'base64'; barge_in?: boolean; lipsync?: boolean; audio_stream?: boolean }
+  | { type: 'mouth'; frame_ms: number; encoding: 'u8'; data: string; seq?: number }
 
 type ConversationItem = {
   role: 'user' | 'assistant'
   content: string
 }
 
+type AudioStreamSink = { push: (chunk: ArrayBuffer) => void; end: () => void }
+
+// Progressive playback of a streamed clip: MediaSource when the browser can decode the format
+// incrementally (playback starts with the first chunks), otherwise one Blob once the clip is complete
+const createStreamedAudio = (format: string, enqueue: (audio: HTMLAudioElement) => void): AudioStreamSink => {
+  const mime = format === 'wav' ? 'audio/wav' : 'audio/mpeg'
+  const Source: typeof MediaSource | undefined = (window as any).ManagedMediaSource || window.MediaSource
+  if (!Source || !Source.isTypeSupported(mime)) {
+    const parts: ArrayBuffer[] = []
+    return {
+      push: (chunk) => { parts.push(chunk) },
+      end: () => {
+        if (parts.length) enqueue(new Audio(URL.createObjectURL(new Blob(parts, { type: mime }))))
+      },
+    }
+  }
+  const source = new Source()
+  const audio = new Audio()
+  // Required by Safari's ManagedMediaSource, harmless elsewhere
+  audio.disableRemotePlayback = true
+  audio.src = URL.createObjectURL(source)
+  const pending: ArrayBuffer[] = []
+  let buffer: SourceBuffer | null = null
+  let ended = false
+  const flush = () => {
+    try {
+      if (!buffer || buffer.updating) return
+      const next = pending.shift()
+      if (next) {
+        buffer.appendBuffer(next)
+        return
+      }
+      if (ended && source.readyState === 'open') source.endOfStream()
+    } catch {}
+  }
+  source.addEventListener('sourceopen', () => {
+    try {
+      buffer = source.addSourceBuffer(mime)
+      buffer.addEventListener('updateend', flush)
+      flush()
+    } catch {}
+  })
+  enqueue(audio)
+  return {
+    push: (chunk) => { pending.push(chunk); flush() },
+    end: () => { ended = true; flush() },
+  }
+}
+
 export default function ChatPanel() {
   const [wsUrl, setWsUrl] = useState<string>('')
   const [connecting, setConnecting] = useState<boolean>(false)
@@ -23,6 +75,42 @@ export default function ChatPanel() {
   const [streaming, setStreaming] = useState<boolean>(false)
   const pendingAssistantRef = useRef<string>('')
   const transcriptEndRef = useRef<HTMLDivElement | null>(null)
+  // Pipelined mode sends one audio clip per sentence; play them back to back
+  const audioQueueRef = useRef<HTMLAudioElement[]>([])
+  const audioPlayingRef = useRef<boolean>(false)
+  const currentAudioRef = useRef<HTMLAudioElement | null>(null)
+  // Barge-in: the server cancels the running turn when a new message arrives
+  const bargeInRef = useRef<boolean>(false)
+  // Set after interrupting a turn; its remaining events are dropped until the next 'start'
+  const dropUntilStartRef = useRef<boolean>(false)
+  // Lip-sync envelopes arrive just before their clip and travel with it to playback
+  const envelopesRef = useRef<WeakMap<HTMLAudioElement, MouthEnvelope>>(new WeakMap())
+
+  const decodeEnvelope = (frameMs: number, data: string): MouthEnvelope => {
+    const raw = atob(data)
+    const values = new Float32Array(raw.length)
+    for (let i = 0; i < raw.length; i++) values[i] = raw.charCodeAt(i) / 255
+    return { frameMs, values }
+  }
+
+  const releaseAudio = (audio: HTMLAudioElement) => {
+    if (audio.src.startsWith('blob:')) URL.revokeObjectURL(audio.src)
+  }
+
+  const stopAudio = () => {
+    const current = currentAudioRef.current
+    currentAudioRef.current = null
+    if (current) {
+      current.onended = null
+      current.onerror = null
+      current.pause()
+      releaseAudio(current)
+    }
+    audioQueueRef.current.forEach(releaseAudio)
+    audioQueueRef.current = []
+    audioPlayingRef.current = false
+    if (current) appEvents.dispatchEvent(new CustomEvent('mouth', { detail: { label: 'Mouth Move', stop: true } }))
+  }
 
   useEffect(() => {
     let cancelled = false
@@ -53,38 +141,108 @@ export default function ChatPanel() {
     setConnecting(true)
     const ws = new WebSocket(wsUrl)
     wsRef.current = ws
-    ws.onopen = () => setConnecting(false)
+    // Raw audio arrives as ArrayBuffer frames right after their JSON header
+    ws.binaryType = 'arraybuffer'
+    let pendingAudioFormat: string | null = null
+    let pendingEnvelope: MouthEnvelope | null = null
+    // Clip currently arriving chunk by chunk (audio_stream)
+    let audioSink: AudioStreamSink | null = null
+    ws.onopen = () => {
+      setConnecting(false)
+      // Ask for binary audio frames, barge-in, lip-sync and streamed audio; servers that ignore this keep the old behavior
+      ws.send(JSON.stringify({ type: 'hello', audio: 'binary', barge_in: true, lipsync: true, audio_stream: true }))
+    }
     ws.onerror = () => setConnecting(false)
     ws.onclose = () => { setConnecting(false); wsRef.current = null }
+    const playNextAudio = () => {
+      const audio = audioQueueRef.current.shift()
+      currentAudioRef.current = audio || null
+      if (!audio) {
+        audioPlayingRef.current = false
+        return
+      }
+      audioPlayingRef.current = true
+      audio.onplay = () => {
+        // Metadata is loaded by the time playback starts, so the duration is known here
+        const durationMs = Number.isFinite(audio.duration) && audio.duration > 0 ? Math.round(audio.duration * 1000) : 0
+        const detail = { label: 'Mouth Move', durationMs: durationMs > 0 ? durationMs : undefined, envelope: envelopesRef.current.get(audio) }
+        appEvents.dispatchEvent(new CustomEvent('mouth', { detail }))
+      }
+      // A streamed clip's duration is only known once its last chunk is in; re-time the mouth then
+      audio.ondurationchange = () => {
+        if (audio.paused || !Number.isFinite(audio.duration)) return
+        const remainingMs = Math.round((audio.duration - audio.currentTime) * 1000)
+        if (remainingMs > 0) appEvents.dispatchEvent(new CustomEvent('mouth', { detail: { label: 'Mouth Move', durationMs: remainingMs } }))
+      }
+      const release = () => {
+        releaseAudio(audio)
+        playNextAudio()
+      }
+      audio.onended = release
+      audio.onerror = release
+      audio.play().catch(release)
+    }
+    const enqueueAudio = (audio: HTMLAudioElement) => {
+      if (pendingEnvelope) envelopesRef.current.set(audio, pendingEnvelope)
+      pendingEnvelope = null
+      audioQueueRef.current.push(audio)
+      if (!audioPlayingRef.current) playNextAudio()
+    }
     ws.onmessage = (evt) => {
+      if (evt.data instanceof ArrayBuffer) {
+        if (dropUntilStartRef.current) return
+        if (audioSink) {
+          audioSink.push(evt.data)
+          return
+        }
+        const mime = pendingAudioFormat === 'wav' ? 'audio/wav' : 'audio/mpeg'
+        pendingAudioFormat = null
+        enqueueAudio(new Audio(URL.createObjectURL(new Blob([evt.data], { type: mime }))))
+        return
+      }
       try {
         const msg: StreamMessage = JSON.parse(evt.data)
+        if (msg.type === 'hello') {
+          bargeInRef.current = msg.barge_in === true
+          return
+        }
+        if (dropUntilStartRef.current) {
+          if (msg.type !== 'start') return
+          dropUntilStartRef.current = false
+        }
         if (msg.type === 'start') {
+          audioSink = null
           setStreaming(true)
           pendingAssistantRef.current = ''
           setMessages((prev) => [...prev, { role: 'assistant', content: '' }])
           return
         }
+        if (msg.type === 'mouth') {
+          try { pendingEnvelope = decodeEnvelope(msg.frame_ms, msg.data) } catch { pendingEnvelope = null }
+          return
+        }
         if (msg.type === 'audio') {
+          if (msg.encoding === 'binary' && msg.stream) {
+            audioSink = createStreamedAudio(msg.format || 'mp3', enqueueAudio)
+            return
+          }
+          if (msg.encoding === 'binary') {
+            pendingAudioFormat = msg.format || 'mp3'
+            return
+          }
           try {
             if (msg.data) {
               const mime = msg.format === 'wav' ? 'audio/wav' : 'audio/mpeg'
-              const audio = new Audio(`data:${mime};base64,${msg.data}`)
-              let durationMs = 0
-              audio.onloadedmetadata = () => {
-                if (Number.isFinite(audio.duration) && audio.duration > 0) {
-                  durationMs = Math.round(audio.duration * 1000)
-                }
-              }
-              audio.onplay = () => {
-                const detail = { label: 'Mouth Move', durationMs: durationMs > 0 ? durationMs : undefined }
-                appEvents.dispatchEvent(new CustomEvent('mouth', { detail }))
-              }
-              audio.play().catch(() => {})
+              enqueueAudio(new Audio(`data:${mime};base64,${msg.data}`))
             }
           } catch {}
           return
         }
+        if (msg.type === 'audio_end') {
+          audioSink?.end()
+          audioSink = null
+          return
+        }
         if (msg.type === 'emotion') {
           // Broadcast emotion to Live2D component
           if (msg.emotion && typeof msg.emotion === 'string') {
@@ -116,7 +274,7 @@ export default function ChatPanel() {
         }
       } catch {}
     }
-    return () => { ws.close() }
+    return () => { ws.close(); stopAudio() }
   }, [wsUrl])
 
   useEffect(() => {
@@ -124,14 +282,25 @@ export default function ChatPanel() {
   }, [messages])
 
   const canSend = useMemo(() => {
-    return !!wsRef.current && wsRef.current.readyState === WebSocket.OPEN && !streaming && input.trim().length > 0
+    return !!wsRef.current && wsRef.current.readyState === WebSocket.OPEN && (!streaming || bargeInRef.current) && input.trim().length > 0
   }, [input, streaming])
 
   const onSubmit = (e: React.FormEvent) => {
     e.preventDefault()
     const text = input.trim()
     if (!text || !wsRef.current) return
-    setMessages((prev) => [...prev, { role: 'user', content: text }])
+    if (streaming || audioPlayingRef.current) {
+      if (streaming && !bargeInRef.current) return
+      // Interrupt: stop speaking now and ignore what is still in flight for the old turn
+      stopAudio()
+      if (streaming) dropUntilStartRef.current = true
+    }
+    setMessages((prev) => {
+      const next = prev.slice()
+      // Drop the placeholder of an interrupted reply that never got any text
+      if (streaming && next.length && next[next.length - 1].role === 'assistant' && !next[next.length - 1].content) next.pop()
+      return [...next, { role: 'user', content: text }]
+    })
     wsRef.current.send(JSON.stringify({ prompt: text }))
     setInput('')
   }
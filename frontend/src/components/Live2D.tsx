@@ -1,7 +1,7 @@
 import { useEffect, useRef, useState } from 'react'
-import { Application, Ticker } from 'pixi.js'
+import { Application, Ticker, UPDATE_PRIORITY } from 'pixi.js'
 import { Live2DSprite } from 'easy-live2d'
-import { appEvents } from '../events'
+import { appEvents, type MouthEnvelope, type MouthEventDetail } from '../events'
 
 export default function Live2D() {
   const canvasRef = useRef<HTMLCanvasElement | null>(null)
@@ -12,6 +12,10 @@ export default function Live2D() {
   const [emotionOptions, setEmotionOptions] = useState<{ label: string; value: string }[]>([])
   const emotionResetTimerRef = useRef<number | null>(null)
   const mouthTimerRef = useRef<number | null>(null)
+  // Envelope being played back (lip-sync), the model's LipSync parameters and their indices
+  const mouthEnvelopeRef = useRef<{ envelope: MouthEnvelope; startedAt: number } | null>(null)
+  const lipSyncIdsRef = useRef<string[]>(['ParamMouthOpenY'])
+  const lipSyncIndicesRef = useRef<number[] | null>(null)
   const defaultEmotionRef = useRef<string>('Happy')
   const emotionOptionsRef = useRef<{ label: string; value: string }[]>([])
   const pendingEmotionRef = useRef<string | null>(null)
@@ -161,6 +165,17 @@ export default function Live2D() {
           exprFileMapRef.current = {}
         }
 
+        // Parameters the model declares for lip-sync (ParamMouthOpenY on ellot, ParamA on mao)
+        try {
+          const modelRes = await fetch(cfg.entry)
+          const modelJson = await modelRes.json()
+          const groups = Array.isArray(modelJson?.Groups) ? modelJson.Groups : []
+          const lipSync = groups.find((g: any) => g?.Name === 'LipSync' && Array.isArray(g?.Ids))
+          const ids = (lipSync?.Ids || []).filter((id: unknown) => typeof id === 'string')
+          if (ids.length > 0) lipSyncIdsRef.current = ids
+          lipSyncIndicesRef.current = null
+        } catch {}
+
         // Build emotion options from cfg.emotions mapping if present
         try {
           const mapping = cfg.emotions && typeof cfg.emotions === 'object' ? cfg.emotions as Record<string, string> : {}
@@ -289,16 +304,66 @@ export default function Live2D() {
       }, 5000)
     }
 
+    const setMouthOpen = (value: number) => {
+      try {
+        const modelAny: any = spriteRef.current
+        const core = modelAny?._model?._model
+        if (!core) return
+        if (lipSyncIndicesRef.current === null) {
+          const ids = Array.from((core.getModel?.()?.parameters?.ids || []) as ArrayLike<string>)
+          lipSyncIndicesRef.current = lipSyncIdsRef.current.map((id) => ids.indexOf(id)).filter((i) => i >= 0)
+        }
+        if (lipSyncIndicesRef.current.length === 0) return
+        for (const index of lipSyncIndicesRef.current) core.setParameterValueByIndex(index, value)
+        core.update()
+      } catch {}
+    }
+
+    const driveMouth = () => {
+      const active = mouthEnvelopeRef.current
+      if (!active) return
+      const { values, frameMs } = active.envelope
+      const pos = (performance.now() - active.startedAt) / frameMs
+      const i = Math.floor(pos)
+      if (i >= values.length) {
+        mouthEnvelopeRef.current = null
+        setMouthOpen(0)
+        return
+      }
+      // Interpolate between frames so the mouth moves smoothly at display rate
+      const next = values[Math.min(i + 1, values.length - 1)]
+      setMouthOpen(values[i] + (next - values[i]) * (pos - i))
+    }
+    // After the model's own update (NORMAL) and before the app renders (LOW)
+    Ticker.shared.add(driveMouth, undefined, UPDATE_PRIORITY.LOW + 1)
+
     const onMouth = async (evt: Event) => {
-      const detail = (evt as CustomEvent).detail as { label?: string; durationMs?: number } | undefined
+      const detail = (evt as CustomEvent).detail as Partial<MouthEventDetail> | undefined
       const label = (detail?.label || 'Mouth Move').trim()
       const durationMs = typeof detail?.durationMs === 'number' && detail!.durationMs! > 0 ? detail!.durationMs! : 3000
       if (!spriteRef.current) return
 
+      if (detail?.stop) {
+        mouthEnvelopeRef.current = null
+        setMouthOpen(0)
+        if (mouthTimerRef.current) {
+          window.clearTimeout(mouthTimerRef.current)
+          mouthTimerRef.current = null
+          await applyExpressionByLabel(defaultEmotionRef.current)
+        }
+        return
+      }
+      if (detail?.envelope && detail.envelope.values.length > 0) {
+        // Server-computed lip-sync: follow the clip's energy instead of the mouth expression
+        mouthEnvelopeRef.current = { envelope: detail.envelope, startedAt: performance.now() }
+        return
+      }
+
       await applyExpressionByLabel(label)
 
       if (mouthTimerRef.current) window.clearTimeout(mouthTimerRef.current)
       mouthTimerRef.current = window.setTimeout(async () => {
+        mouthTimerRef.current = null
         const defLabel = defaultEmotionRef.current
         await applyExpressionByLabel(defLabel)
       }, durationMs)
@@ -309,6 +374,8 @@ export default function Live2D() {
     return () => {
       appEvents.removeEventListener('emotion', onEmotion as EventListener)
       appEvents.removeEventListener('mouth', onMouth as EventListener)
+      Ticker.shared.remove(driveMouth)
+      mouthEnvelopeRef.current = null
     }
   }, [])
 
@@ -3,6 +3,11 @@ export const appEvents = new EventTarget()
 
 export type EmotionEventDetail = { label: string }
 
-export type MouthEventDetail = { label: string; durationMs?: number }
+// Mouth opening (0..1) per fixed-length frame, computed by the server from the clip's audio
+export type MouthEnvelope = { frameMs: number; values: Float32Array }
+
+// envelope: drive the mouth from it instead of toggling the label's expression
+// stop: playback was interrupted; close the mouth now
+export type MouthEventDetail = { label: string; durationMs?: number; envelope?: MouthEnvelope; stop?: boolean }
 
 